@@ -1,16 +1,16 @@
 from collections import namedtuple
 
 
-AeroplanStatus = namedtuple("AeroplanStatus", ("name,bonus_factor,min_earning_value"))
+AeroplanStatus = namedtuple("AeroplanStatus", ("name,bonus_factor,min_earning_value,qualifying_sqm,qualifying_sqs"))
 FareBrand = namedtuple("FareBrand", ("name", "basis_codes", "fare_classes", "status_factor", "redeemable_factor"))
 
 
-NoStatus = AeroplanStatus("None", 0.0, 0)
-Prestige25K = AeroplanStatus("Prestige 25K", 0.25, 250)
-Elite35K = AeroplanStatus("Elite 35K", 0.35, 250)
-Elite50K = AeroplanStatus("Elite 50K", 0.50, 250)
-Elite75K = AeroplanStatus("Elite 75K", 0.75, 250)
-SuperElite100K = AeroplanStatus("Super Elite 100K", 1.0, 250)
+NoStatus = AeroplanStatus("None", 0.0, 0, 0, 0)
+Prestige25K = AeroplanStatus("Prestige 25K", 0.25, 250, 25000, 25)
+Elite35K = AeroplanStatus("Elite 35K", 0.35, 250, 35000, 35)
+Elite50K = AeroplanStatus("Elite 50K", 0.50, 250, 50000, 50)
+Elite75K = AeroplanStatus("Elite 75K", 0.75, 250, 75000, 75)
+SuperElite100K = AeroplanStatus("Super Elite 100K", 1.0, 250, 100000, 95)
 
 
 AEROPLAN_STATUSES = (
@@ -23,6 +23,7 @@ AEROPLAN_STATUSES = (
 )
 
 
+AEROPLAN_STATUSES_BY_NAME = {status.name: status for status in AEROPLAN_STATUSES}
 DEFAULT_AEROPLAN_STATUS = NoStatus
 
 
@@ -52,6 +53,8 @@ FARE_BRANDS = (
 )
 
 
+FARE_BRANDS_BY_NAME = {fare_brand.name: fare_brand for fare_brand in FARE_BRANDS}
+FARE_BRANDS_BY_BASIS_CODE = {code: fare_brand for fare_brand in FARE_BRANDS for code in fare_brand.basis_codes}
 DEFAULT_FARE_BRAND = Flex
 DEFAULT_FARE_BRAND_INDEX = 3
 DEFAULT_FARE_CLASS = "M"
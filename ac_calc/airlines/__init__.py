@@ -1,9 +1,9 @@
 from collections import namedtuple
 from dataclasses import dataclass, field
-from functools import cache
-from importlib import resources
 import json
 from math import asin, cos, pow, radians, sin, sqrt
+from types import MappingProxyType
+from typing import Mapping
 
 from ..aeroplan import AeroplanStatus, FareBrand
 from ..locations import Airport
@@ -19,13 +19,68 @@ EarthRadiusMi = 3959.0
 
 FULL_BONUS_AIRLINES = {"air-canada", "copa-airlines", "united"}
 FIXED25_BONUS_AIRLINES = {"austrian-airlines", "brussels-airlines", "lufthansa", "swiss"}
+LISBON_PORTO_CODES = frozenset(("LIS", "OPO", "PXO", "FNC"))
 
 
-@dataclass
+def haversine_distance(origin, destination):
+    """Return the great-circle distance in miles between two airports."""
+
+    d_lat = radians(destination.latitude - origin.latitude)
+    d_lon = radians(destination.longitude - origin.longitude)
+    origin_lat = radians(origin.latitude)
+    destination_lat = radians(destination.latitude)
+
+    a = pow(sin(d_lat / 2), 2) + pow(sin(d_lon / 2), 2) * cos(origin_lat) * cos(destination_lat)
+    c = 2 * asin(sqrt(a))
+
+    return EarthRadiusMi * c
+
+
+def _freeze(value):
+    """Recursively convert dicts to read-only mapping views and lists to tuples."""
+
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    elif isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    else:
+        return value
+
+
+def _thaw(value):
+    """Recursively convert read-only mapping views back to dicts."""
+
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    else:
+        return value
+
+
+def _compile_earning_rates(earning_rates):
+    """Flatten earning rates to region -> booking class or fare brand -> (service index,
+    service, rate), keeping the first service with a non-zero rate for each key.
+    """
+
+    compiled = {}
+    for region, services in (earning_rates or {}).items():
+        region_rates = {}
+        for index, (service, fare_classes) in enumerate(services.items()):
+            for key, rate in fare_classes.items():
+                if rate and key not in region_rates:
+                    region_rates[key] = (index, service, rate)
+        compiled[region] = MappingProxyType(region_rates)
+
+    return MappingProxyType(compiled)
+
+
+@dataclass(frozen=True, eq=False)
 class Airline:
+    """Immutable earning rules for an airline. Airlines compare and hash by id, so they can be
+    shared between threads and sessions, and used directly as cache keys.
+    """
 
     id: str
-    codes: list[str]
+    codes: tuple[str, ...]
     name: str
     region: str
     website: str
@@ -34,11 +89,41 @@ class Airline:
     codeshare_partner: bool
     earns_pts: bool
     earns_sqm: bool
-    earning_rates: dict
+    earning_rates: Mapping
+    compiled_earning_rates: Mapping = field(init=False, repr=False)
+    _hash: int = field(init=False, repr=False)
+
+    def __post_init__(self):
+        codes = (self.codes,) if isinstance(self.codes, str) else tuple(self.codes)
+        earning_rates = _freeze(self.earning_rates)
+
+        object.__setattr__(self, "codes", codes)
+        object.__setattr__(self, "earning_rates", earning_rates)
+        object.__setattr__(self, "compiled_earning_rates", _compile_earning_rates(earning_rates))
+        object.__setattr__(self, "_hash", hash(self.id))
 
     def __eq__(self, other):
+        if not isinstance(other, Airline):
+            return NotImplemented
         return self.id == other.id
 
+    def __hash__(self):
+        return self._hash
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # Mapping views can't be pickled, so rebuild the airline from plain values.
+        return type(self), (
+            self.id, self.codes, self.name, self.region, self.website, self.logo,
+            self.star_alliance_member, self.codeshare_partner, self.earns_pts, self.earns_sqm,
+            _thaw(self.earning_rates),
+        )
+
     def _distance(self, origin: Airport, destination: Airport):
         """Calculate the distance from origin to destination. If there isn't a pre-recorded
         Aeroplan distance, calculate the haversine distance.
@@ -47,15 +132,7 @@ class Airline:
         if distance := origin.distances.get(destination.airport_code):
             return distance.distance or distance.old_distance
         else:
-            d_lat = radians(destination.latitude - origin.latitude)
-            d_lon = radians(destination.longitude - origin.longitude)
-            origin_lat = radians(origin.latitude)
-            destination_lat = radians(destination.latitude)
-
-            a = pow(sin(d_lat / 2), 2) + pow(sin(d_lon / 2), 2) * cos(origin_lat) * cos(destination_lat)
-            c = 2 * asin(sqrt(a))
-
-            return EarthRadiusMi * c
+            return haversine_distance(origin, destination)
 
     def _earning_rate(
         self,
@@ -65,14 +142,32 @@ class Airline:
         fare_class: str,
     ):
         region = self._region_for_segment(origin, destination)
-        region_services = self.earning_rates.get(region, {})
+        return self._rate_for_region(region, fare_brand, fare_class)
+
+    def _rate_for_region(
+        self,
+        region: str,
+        fare_brand: FareBrand,
+        fare_class: str,
+    ):
+        region_rates = self.compiled_earning_rates.get(region, {})
 
-        for service, fare_classes in region_services.items():
-            if rate := fare_classes.get(fare_class) or fare_classes.get(fare_brand.name):
-                return region, service, rate
+        # The booking class takes precedence over the fare brand within the same service.
+        matches = filter(None, (region_rates.get(fare_class), region_rates.get(fare_brand.name)))
+        if match := min(matches, key=lambda match: match[0], default=None):
+            _, service, rate = match
+            return region, service, rate
 
         return None, None, 0
 
+    def _pts_bonus_factor(self, aeroplan_status: AeroplanStatus):
+        if self.id in FULL_BONUS_AIRLINES:
+            return aeroplan_status.bonus_factor
+        elif self.id in FIXED25_BONUS_AIRLINES:
+            return max(0, min(aeroplan_status.bonus_factor, 0.25))
+        else:
+            return 0
+
     def _region_for_segment(
         self,
         origin: Airport,
@@ -105,8 +200,7 @@ class Airline:
         elif self.id == "swiss":
             return "Intra-European flights" if origin.continent == destination.continent == "Europe" else "Rest of the world"
         elif self.id == "tap-air-portugal":
-            lisbon_porto_codes = set(("LIS", "OPO", "PXO", "FNC"))
-            return "Flights between Lisbon and Porto" if origin.airport_code in lisbon_porto_codes and destination.airport_code in lisbon_porto_codes else "All destinations"
+            return "Flights between Lisbon and Porto" if origin.airport_code in LISBON_PORTO_CODES and destination.airport_code in LISBON_PORTO_CODES else "All destinations"
         elif self.id == "asiana":
             return "Domestic South Korea" if origin.country == destination.country == "South Korea" else "International"
         elif self.id == "air-new-zealand":
@@ -121,6 +215,19 @@ class Airline:
         else:
             return "*"
 
+    def _regions_for_segments(self, origin: Airport, destinations):
+        """Return the region for the segments from origin to each of the destinations. Regions only
+        depend on the destination's country, continent and whether it's a Lisbon or Porto
+        airport, so each combination is only looked up once.
+        """
+
+        regions = {}
+        return [
+            regions[key] if (key := (destination.country, destination.continent, destination.airport_code in LISBON_PORTO_CODES)) in regions
+            else regions.setdefault(key, self._region_for_segment(origin, destination))
+            for destination in destinations
+        ]
+
     def calculate(
         self,
         origin: Airport,
@@ -132,15 +239,10 @@ class Airline:
     ):
         distance = self._distance(origin, destination)
         if not distance:
-            return SegmentCalculation(distance, 0, 0, 0, 0, 0, 0)
+            return SegmentCalculation(distance, 0, 0, 0, 0, 0, 0, None, None)
 
         region, service, pts_earning_rate = self._earning_rate(origin, destination, fare_brand, fare_class)
-        if self.id in FULL_BONUS_AIRLINES:
-            pts_bonus_factor = aeroplan_status.bonus_factor
-        elif self.id in FIXED25_BONUS_AIRLINES:
-            pts_bonus_factor = max(0, min(aeroplan_status.bonus_factor, 0.25))
-        else:
-            pts_bonus_factor = 0
+        pts_bonus_factor = self._pts_bonus_factor(aeroplan_status)
         app = max(distance * pts_earning_rate, aeroplan_status.min_earning_value) if self.earns_pts else 0
         pts_bonus = min(app, distance) * pts_bonus_factor
 
@@ -164,10 +266,8 @@ class AirCanadaAirline(Airline):
     pass
 
 
-@cache
-def _load_airline_partners():
-    with resources.open_text("ac_calc.airlines", "partners.json") as f:
-        partners = json.load(f)
+def _parse_airline_partners(partners_json):
+    partners = json.loads(partners_json)
 
     return tuple(sorted((
         Airline(**partner)
@@ -230,4 +330,11 @@ AirCanada = AirCanadaAirline(
 )
 
 
-AIRLINES = (AirCanada,) + _load_airline_partners()
+def __getattr__(name):
+    # AIRLINES and its lookups come from the current rules snapshot, so that importing them
+    # picks up reloaded partner data.
+    if name in ("AIRLINES", "AIRLINES_BY_ID", "AIRLINES_BY_CODE"):
+        from ..snapshot import current_snapshot
+        return getattr(current_snapshot(), name.lower())
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
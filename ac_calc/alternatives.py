@@ -0,0 +1,164 @@
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+import heapq
+from itertools import count
+
+import numpy as np
+
+from .aeroplan import FARE_BRANDS_BY_NAME
+from .batch import calculate_from_origin
+from .routes import ROUTING_METRICS
+from .snapshot import current_snapshot
+
+
+Alternative = namedtuple("Alternative", ("airports", "distance", "pts", "pts_bonus", "sqm"))
+LegEarnings = namedtuple("LegEarnings", ("distance", "pts", "pts_bonus", "sqm"))
+
+
+@lru_cache(maxsize=2)
+def _city_airports(snapshot):
+    city_airports = defaultdict(list)
+    for airport in snapshot.airports:
+        if airport.city_code:
+            city_airports[airport.city_code].append(airport.airport_code)
+    return {city_code: tuple(codes) for city_code, codes in city_airports.items()}
+
+
+def alternative_airports(airport, nearby=True, snapshot=None):
+    """Return the codes of the airport and the other airports it could be swapped for: those
+    sharing its city code and, with nearby, its nearby airports. The airport comes first.
+    """
+
+    snapshot = snapshot or current_snapshot()
+    codes = {airport.airport_code: None}
+    for code in _city_airports(snapshot).get(airport.city_code, ()):
+        codes.setdefault(code)
+    for code in (airport.nearby or ()) if nearby else ():
+        if code in snapshot.airports_by_code:
+            codes.setdefault(code)
+    return tuple(codes)
+
+
+# Airlines compare by id, so the snapshot is part of the key.
+@lru_cache(maxsize=1024)
+def _leg_earnings(snapshot, airline, origin_codes, destination_codes, fare_brand_name, fare_class, aeroplan_status):
+    destinations = [snapshot.airports_by_code[code] for code in destination_codes]
+    batches = [
+        calculate_from_origin(
+            airline,
+            snapshot.airports_by_code[origin_code],
+            destinations,
+            FARE_BRANDS_BY_NAME[fare_brand_name],
+            fare_class,
+            "",
+            aeroplan_status,
+        )
+        for origin_code in origin_codes
+    ]
+    return LegEarnings(*(
+        np.stack([batch.columns[field] for batch in batches])
+        for field in LegEarnings._fields
+    ))
+
+
+def explore_alternatives(
+    itinerary,
+    aeroplan_status,
+    metric="sqm",
+    k=5,
+    nearby=True,
+    snapshot=None,
+):
+    """Find the k variants of an itinerary that earn the most SQM or points (including bonus
+    points) when its airports are swapped for co-terminal or nearby ones.
+
+    The itinerary is a sequence of segments with airline, origin, destination, fare_brand and
+    fare_class attributes. A connecting airport is swapped on both of its segments, while
+    the ends of a surface gap are swapped independently. Each segment's earnings are
+    calculated once for every pair of its origin and destination alternatives, and cached
+    across itineraries. Variants are found with a best-first search over the airports in
+    order, ranked by earnings so far plus the most the remaining segments can earn, so the
+    search stops after the k-th complete variant instead of scoring every combination.
+    Segments that would start and end at the same airport aren't allowed.
+    """
+
+    if metric not in ROUTING_METRICS:
+        raise ValueError(f"Unknown alternatives metric {metric}, expected one of {ROUTING_METRICS}.")
+
+    snapshot = snapshot or current_snapshot()
+    if not itinerary or any(segment.origin is None or segment.destination is None for segment in itinerary):
+        return []
+
+    # The itinerary's airports in order, with the segment flown between each pair of them, or
+    # None for a surface gap.
+    points = [itinerary[0].origin]
+    legs = []
+    for segment in itinerary:
+        if segment.origin.airport_code != points[-1].airport_code:
+            points.append(segment.origin)
+            legs.append(None)
+        points.append(segment.destination)
+        legs.append(segment)
+
+    alternatives = [alternative_airports(point, nearby, snapshot) for point in points]
+
+    earnings = []
+    for index, segment in enumerate(legs):
+        shape = (len(alternatives[index]), len(alternatives[index + 1]))
+        if segment is None:
+            leg = LegEarnings(np.zeros(shape), *(np.zeros(shape, dtype=np.int64) for _ in LegEarnings._fields[1:]))
+        else:
+            leg = _leg_earnings(
+                snapshot,
+                segment.airline,
+                alternatives[index],
+                alternatives[index + 1],
+                segment.fare_brand.name,
+                segment.fare_class,
+                aeroplan_status,
+            )
+        value = leg.sqm if metric == "sqm" else leg.pts + leg.pts_bonus
+        value = np.where(np.equal.outer(alternatives[index], alternatives[index + 1]), -np.inf, value) if segment else value
+        earnings.append((leg, value))
+
+    # bounds[index][alternative] is the most the legs after that airport can earn.
+    bounds = [np.zeros(len(alternatives[-1]))]
+    for leg, value in reversed(earnings):
+        bounds.insert(0, (value + bounds[0]).max(axis=1))
+
+    variants = []
+    tie_breaker = count()
+    queue = [(-bound, next(tie_breaker), 0.0, (alternative,)) for alternative, bound in enumerate(bounds[0]) if bound > -np.inf]
+    heapq.heapify(queue)
+    while queue and len(variants) < k:
+        _, _, earned, path = heapq.heappop(queue)
+        index = len(path) - 1
+
+        if index == len(legs):
+            variants.append(_alternative(alternatives, earnings, path))
+            continue
+
+        value = earnings[index][1][path[-1]]
+        for alternative, bound in enumerate(bounds[index + 1]):
+            if value[alternative] == -np.inf or bound == -np.inf:
+                continue
+            next_earned = earned + value[alternative]
+            heapq.heappush(queue, (
+                -(next_earned + bound),
+                next(tie_breaker),
+                next_earned,
+                path + (alternative,),
+            ))
+
+    return variants
+
+
+def _alternative(alternatives, earnings, path):
+    totals = [
+        sum(getattr(leg, field)[path[index], path[index + 1]].item() for index, (leg, _) in enumerate(earnings))
+        for field in LegEarnings._fields
+    ]
+    return Alternative(
+        tuple(codes[alternative] for codes, alternative in zip(alternatives, path)),
+        *totals,
+    )
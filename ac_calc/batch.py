@@ -0,0 +1,227 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .airlines import SegmentCalculation
+
+
+CalculationTotals = namedtuple("CalculationTotals", ("distance", "pts", "pts_bonus", "sqm"))
+
+
+NUMERIC_DTYPES = {
+    "distance": np.float64,
+    "pts": np.int64,
+    "pts_earning_rate": np.float64,
+    "pts_bonus_factor": np.float64,
+    "pts_bonus": np.int64,
+    "sqm": np.int64,
+    "sqm_earning_rate": np.float64,
+}
+CATEGORICAL_FIELDS = ("region", "service")
+CATEGORY_CODE_DTYPE = np.int32
+ARROW_SCHEMA = pa.schema([
+    *(pa.field(field, pa.from_numpy_dtype(dtype)) for field, dtype in NUMERIC_DTYPES.items()),
+    *(pa.field(field, pa.dictionary(pa.from_numpy_dtype(CATEGORY_CODE_DTYPE), pa.string())) for field in CATEGORICAL_FIELDS),
+])
+
+
+def _miles(distance):
+    # Published Aeroplan distances are whole miles.
+    distance = distance.item()
+    return int(distance) if distance.is_integer() else distance
+
+
+def calculate_earnings(distance, earning_rate, earns_pts, earns_sqm, pts_bonus_factor, min_earning_value):
+    """Vectorized form of the points, bonus and SQM arithmetic in Airline.calculate, including
+    the minimum earning value and the int() truncation. The arguments broadcast against each
+    other, and segments without a distance earn nothing.
+    """
+
+    has_distance = distance != 0
+    app = np.where(earns_pts & has_distance, np.maximum(distance * earning_rate, min_earning_value), 0.0)
+    pts_bonus = np.minimum(app, distance) * pts_bonus_factor
+    sqm = np.where(earns_sqm & has_distance, np.maximum(distance * earning_rate, min_earning_value), 0.0)
+
+    return app.astype(np.int64), pts_bonus.astype(np.int64), sqm.astype(np.int64)
+
+
+class CalculationBatch:
+    """Segment calculations stored as typed column arrays. The region and service columns are
+    categorical: int32 codes into a tuple of names, with -1 for segments without a rate.
+    """
+
+    __slots__ = ("columns", "categories")
+
+    def __init__(self, columns, categories):
+        self.columns = columns
+        self.categories = categories
+
+    @classmethod
+    def from_calculations(cls, calculations):
+        calculations = tuple(calculations)
+        count = len(calculations)
+
+        columns = {
+            field: np.fromiter((getattr(calc, field) for calc in calculations), dtype, count)
+            for field, dtype in NUMERIC_DTYPES.items()
+        }
+
+        categories = {}
+        for field in CATEGORICAL_FIELDS:
+            codes = {}
+            columns[field] = np.fromiter((
+                -1 if (value := getattr(calc, field)) is None else codes.setdefault(value, len(codes))
+                for calc in calculations
+            ), CATEGORY_CODE_DTYPE, count)
+            categories[field] = tuple(codes)
+
+        return cls(columns, categories)
+
+    @classmethod
+    def concatenate(cls, batches):
+        batches = tuple(batches)
+        columns = {
+            field: np.concatenate([batch.columns[field] for batch in batches] or [np.empty(0, dtype)])
+            for field, dtype in NUMERIC_DTYPES.items()
+        }
+
+        # Remap each batch's category codes onto the combined categories.
+        categories = {}
+        for field in CATEGORICAL_FIELDS:
+            names = {}
+            parts = [np.empty(0, CATEGORY_CODE_DTYPE)]
+            for batch in batches:
+                remap = np.array([
+                    names.setdefault(name, len(names))
+                    for name in batch.categories[field]
+                ] + [-1], dtype=CATEGORY_CODE_DTYPE)
+                parts.append(remap[batch.columns[field]])
+            columns[field] = np.concatenate(parts)
+            categories[field] = tuple(names)
+
+        return cls(columns, categories)
+
+    def __len__(self):
+        return len(self.columns["distance"])
+
+    def __getitem__(self, index):
+        """Return a SegmentCalculation view of a row."""
+
+        values = [self.columns[field][index].item() for field in NUMERIC_DTYPES]
+        values[0] = _miles(self.columns["distance"][index])
+
+        for field in CATEGORICAL_FIELDS:
+            code = self.columns[field][index]
+            values.append(self.categories[field][code] if code >= 0 else None)
+
+        return SegmentCalculation._make(values)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def take(self, indexes):
+        """Return a batch with the rows at indexes, which may repeat, sharing the categories."""
+
+        return type(self)({field: values[indexes] for field, values in self.columns.items()}, self.categories)
+
+    def totals(self):
+        return CalculationTotals(
+            _miles(self.columns["distance"].sum()),
+            int(self.columns["pts"].sum()),
+            int(self.columns["pts_bonus"].sum()),
+            int(self.columns["sqm"].sum()),
+        )
+
+    def to_pandas(self):
+        """Return the calculations as a DataFrame, with categorical region and service columns.
+        The numeric columns share memory with the batch where pandas allows it.
+        """
+
+        data = {field: self.columns[field] for field in NUMERIC_DTYPES}
+        for field in CATEGORICAL_FIELDS:
+            data[field] = pd.Categorical.from_codes(self.columns[field], self.categories[field])
+
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        """Return the calculations as an Arrow table, with dictionary encoded region and service
+        columns. The numeric columns and category codes are not copied.
+        """
+
+        arrays = [pa.array(self.columns[field]) for field in NUMERIC_DTYPES]
+        for field in CATEGORICAL_FIELDS:
+            codes = self.columns[field]
+            missing = codes < 0
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=missing if missing.any() else None),
+                pa.array(self.categories[field], type=pa.string()),
+            ))
+
+        return pa.Table.from_arrays(arrays, schema=ARROW_SCHEMA)
+
+
+def calculate_from_origin(
+    airline,
+    origin,
+    destinations,
+    fare_brand,
+    fare_class,
+    ticket_number,
+    aeroplan_status,
+):
+    """Calculate the segments from origin to each of the destinations in one pass, with the same
+    results as calling airline.calculate for each. Distances are computed per destination, while
+    regions and rates are looked up once per distinct region.
+    """
+
+    destinations = tuple(destinations)
+    distance = np.fromiter((airline._distance(origin, destination) for destination in destinations), np.float64, len(destinations))
+
+    # Look up the rate for each distinct region, and index them by region code.
+    regions = {}
+    region_codes = np.fromiter((
+        regions.setdefault(region, len(regions))
+        for region in airline._regions_for_segments(origin, destinations)
+    ), CATEGORY_CODE_DTYPE, len(destinations))
+
+    services = {}
+    earning_rates = np.zeros(len(regions) + 1)
+    rate_region_codes = np.full(len(regions) + 1, -1, CATEGORY_CODE_DTYPE)
+    rate_service_codes = np.full(len(regions) + 1, -1, CATEGORY_CODE_DTYPE)
+    rate_regions = {}
+    for region, code in regions.items():
+        rate_region, service, earning_rates[code] = airline._rate_for_region(region, fare_brand, fare_class)
+        if rate_region is not None:
+            rate_region_codes[code] = rate_regions.setdefault(rate_region, len(rate_regions))
+            rate_service_codes[code] = services.setdefault(service, len(services))
+
+    # Segments without a distance don't have a rate, region or service.
+    region_codes[distance == 0] = len(regions)
+    earning_rate = earning_rates[region_codes]
+
+    pts_bonus_factor = np.where(distance != 0, airline._pts_bonus_factor(aeroplan_status), 0.0)
+    pts, pts_bonus, sqm = calculate_earnings(
+        distance,
+        earning_rate,
+        airline.earns_pts,
+        airline.earns_sqm,
+        pts_bonus_factor,
+        aeroplan_status.min_earning_value,
+    )
+
+    return CalculationBatch({
+        "distance": distance,
+        "pts": pts,
+        "pts_earning_rate": earning_rate,
+        "pts_bonus_factor": pts_bonus_factor,
+        "pts_bonus": pts_bonus,
+        "sqm": sqm,
+        "sqm_earning_rate": earning_rate,
+        "region": rate_region_codes[region_codes],
+        "service": rate_service_codes[region_codes],
+    }, {
+        "region": tuple(rate_regions),
+        "service": tuple(services),
+    })
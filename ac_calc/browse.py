@@ -0,0 +1,442 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+import html
+from itertools import groupby
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pydeck as pdk
+from pydeck.types import String
+from streamlit.elements.map import _get_zoom_level
+
+from .snapshot import current_snapshot
+
+
+# The browse pages are rendered here, for the app and for a static export that the app and
+# any web server can serve without rendering them again.
+MARKET_COLOURS = {
+    "DOM": (202, 42, 54),
+    "TNB": (34, 132, 161),
+    "SUN": (253, 192, 68),
+    "INT": (100, 100, 100),
+}
+DISTANCES_TABLE_STYLES = (
+    {
+        "selector": "",  # table
+        "props": "width: 100%; border-collapse: collapse",
+    },
+    {
+        "selector": "th",
+        "props": "border-color: #a8afb8; padding: .25rem .5rem",
+    },
+    {
+        "selector": "td",
+        "props": "border-color: #dbdfe5; padding: .25rem .5rem; color: #333",
+    },
+    {
+        "selector": "thead th",
+        "props": "background-color: #4a4f55; color: #f8fafd; font-weight: 500",
+    },
+)
+MAP_TOOLTIP = {"html": "{tooltip}"}
+EXPORT_MANIFEST = "manifest.json"
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8" />
+<title>{title}</title>
+<style>
+    body {{ margin: 2rem; font-family: "Source Sans Pro", sans-serif; color: #262730 }}
+    table {{ border-collapse: collapse }}
+    th, td {{ border: 1px solid #dbdfe5 }}
+    iframe {{ width: 100%; height: 540px; border: 0 }}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+def earning_rates_tables(airline):
+    """Return the region and HTML table of each of an airline's earning rates tables."""
+
+    tables = []
+    for region, services in airline.earning_rates.items():
+        rates = []
+        for service, fare_classes in services.items():
+            rates.extend([
+                (service, ", ".join(code[0] for code in codes), f"{int(rate * 100)}%")
+                for rate, codes in groupby(fare_classes.items(), key=lambda item: item[1])
+            ])
+
+        rates_df = pd.DataFrame(rates, columns=(
+            "Class of service", "Eligible booking classes", "Rate",
+        ))
+        rates_df = rates_df.set_index(["Class of service"])
+        rates_df.index.rename(None, inplace=True)
+        rates_df = rates_df.rename_axis("Class of Service", axis=1)
+        rates_df = rates_df.style.set_table_styles((
+            {
+                "selector": "",  # table
+                "props": "width: 100%",
+            },
+            {
+                "selector": "th",
+                "props": "border-color: #a8afb8; padding: .25rem .5rem",
+            },
+            {
+                "selector": "td",
+                "props": "border-color: #dbdfe5; padding: .25rem .5rem; color: #333",
+            },
+            {
+                "selector": "thead th.level0",
+                "props": "background-color: #4a4f55; color: #f8fafd; font-weight: 500; border-right: 1px solid #6f767f; padding: 1rem .5rem .25rem .5rem",
+            },
+            {
+                "selector": "tbody th",
+                "props": "background-color: #6f767f; color: #f8fafd; font-weight: 500",
+            },
+            {
+                "selector": "tbody td.col1",
+                "props": "text-align: right",
+            }
+        ))
+
+        tables.append((region, rates_df.to_html()))
+
+    return tuple(tables)
+
+
+def earning_rates_html(airline):
+    """Return the earning rates tables of an airline side by side, as an HTML fragment."""
+
+    return '<div style="display: flex; gap: 1rem">' + "".join(
+        f'<div style="flex: 1">\n<h4>{"All Regions" if region == "*" else region}</h4>\n{table_html}</div>'
+        for region, table_html in earning_rates_tables(airline)
+    ) + "</div>"
+
+
+def published_distances(origin, rules):
+    """Return the published distances from an origin as a DataFrame indexed by market."""
+
+    distances_data = []
+    for _, distance in origin.distances.items():
+        destination_airport = rules.airports_by_code[distance.destination]
+        distances_data.append((
+            destination_airport.market,
+            destination_airport.airport,
+            destination_airport.airport_code,
+            destination_airport.country,
+            distance.old_distance,
+            distance.distance,
+            distance.distance or distance.old_distance,
+        ))
+
+    distances_df = pd.DataFrame(distances_data, columns=(
+        "Market", "Airport", "Code", "Country", "Distance (Old)", "Distance (New)", "Distance (Combined)",
+    ))
+    distances_df["Market"] = distances_df["Market"].astype(pd.CategoricalDtype(("DOM", "TNB", "SUN", "INT"), ordered=True))
+    distances_df = distances_df.sort_values(["Market", "Distance (Combined)"])
+    distances_df.set_index("Market", inplace=True)
+
+    return distances_df
+
+
+def published_distances_layers(origin, rules):
+    """Return the arc, text and icon layer data for the map of an origin's published
+    distances.
+    """
+
+    destinations = [
+        (rules.airports_by_code[distance.destination], distance.distance or distance.old_distance)
+        for distance in origin.distances.values()
+    ]
+
+    arclayer_data = [
+        {
+            "tooltip": f'<div><strong>{destination.city}</strong> {destination.airport_code}</div><div style="font-size: .833rem">{destination.airport}<br />{distance} miles</div>',
+            "source_position": (origin.longitude, origin.latitude),
+            "target_position": (destination.longitude, destination.latitude),
+            "source_colour": MARKET_COLOURS.get(destination.market, (180, 180, 180)),
+            "target_colour": MARKET_COLOURS.get(destination.market, (180, 180, 180)),
+        }
+        for destination, distance in destinations
+    ]
+
+    textlayer_data = [
+        {
+            "tooltip": f'<div><strong>{destination.city}</strong> {destination.airport_code}</div><div style="font-size: .833rem">{destination.airport}<br />{distance} miles</div>',
+            "distance": distance,
+            "text": destination.airport_code,
+            "position": (destination.longitude, destination.latitude),
+        }
+        for destination, distance in destinations
+    ]
+
+    iconlayer_data = [
+        {
+            "tooltip": f'<div><strong>{origin.city}</strong> {origin.airport_code}</div><div style="font-size: .833rem">{origin.airport}</div>',
+            "marker": "airplane",
+            "position": (origin.longitude, origin.latitude),
+            "size": 48,
+        },
+        *[
+            {
+                "tooltip": f'<div><strong>{destination.city}</strong> {destination.airport_code}</div><div style="font-size: .833rem">{destination.airport}<br />{distance} miles</div>',
+                "marker": f"{destination.market.lower() if destination.market else 'int'}-airport",
+                "position": (destination.longitude, destination.latitude),
+                "size": 56,
+            }
+            for destination, distance in destinations
+        ],
+    ]
+
+    return arclayer_data, textlayer_data, iconlayer_data
+
+
+def distances_table_html(distances_df):
+    return distances_df.style.set_table_styles(DISTANCES_TABLE_STYLES).to_html()
+
+
+def map_deck(arclayer_data=None, textlayer_data=None, iconlayer_data=None, scatterlayer_data=None, ctr_lon=None, ctr_lat=None, zoom=None, get_width=6, height=400):
+    if not ctr_lon or not ctr_lat:
+        positions = [
+            pos for route_positions in (
+                (route["source_position"], route["target_position"])
+                for route in arclayer_data
+            ) for pos in route_positions
+        ]
+        min_lon = min(c[0] for c in positions)
+        max_lon = max(c[0] for c in positions)
+        min_lat = min(c[1] for c in positions)
+        max_lat = max(c[1] for c in positions)
+        ctr_lon = ctr_lon or ((min_lon + max_lon) / 2.0)
+        ctr_lat = ctr_lat or ((min_lat + max_lat) / 2.0)
+        rng_lon = abs(max_lon - min_lon)
+        rng_lat = abs(max_lat - min_lat)
+        zoom = zoom or (min(5, max(1, _get_zoom_level(max(rng_lon, rng_lat)))))
+
+    layers = []
+
+    if arclayer_data:
+        # https://deck.gl/docs/api-reference/geo-layers/great-circle-layer
+        layers.append(pdk.Layer(
+            "ArcLayer",
+            arclayer_data,
+            pickable=True,
+            greatCircle=True,
+            get_width=get_width,
+            get_height=0,
+            get_source_position="source_position",
+            get_target_position="target_position",
+            get_source_color="source_colour",
+            get_target_color="target_colour",
+            auto_highlight=True,
+        ))
+
+    if scatterlayer_data:
+        # https://deck.gl/docs/api-reference/layers/scatterplot-layer
+        layers.append(pdk.Layer(
+            "ScatterplotLayer",
+            scatterlayer_data,
+            pickable=True,
+            get_position="position",
+            get_fill_color="colour",
+            get_radius=20000,
+            radius_min_pixels=2,
+            radius_max_pixels=12,
+            auto_highlight=True,
+        ))
+
+    if iconlayer_data:
+        # https://deck.gl/docs/api-reference/layers/icon-layer
+        layers.append(pdk.Layer(
+            "IconLayer",
+            iconlayer_data,
+            pickable=True,
+            icon_atlas="https://raw.githubusercontent.com/kinghuang/ac-calc/master/icons/map-icons-sm.png",
+            icon_mapping={
+                "airplane": {"x": 0, "y": 0, "width": 64, "height": 64},
+                "small-airplane": {"x": 64, "y": 0, "width": 64, "height": 64},
+                "airplane-taking-off": {"x": 128, "y": 0, "width": 64, "height": 64},
+                "airplane-landing": {"x": 192, "y": 0, "width": 64, "height": 64},
+
+                "dom-airport": {"x": 0, "y": 128, "width": 64, "height": 64},
+                "tnb-airport": {"x": 64, "y": 128, "width": 64, "height": 64},
+                "sun-airport": {"x": 128, "y": 128, "width": 64, "height": 64},
+                "int-airport": {"x": 192, "y": 128, "width": 64, "height": 64},
+            },
+            get_icon="marker",
+            get_position="position",
+            get_size="size",
+        ))
+
+    if textlayer_data:
+        # https://deck.gl/docs/api-reference/layers/text-layer
+        layers.append(pdk.Layer(
+            "TextLayer",
+            textlayer_data,
+            pickable=True,
+            get_position="position",
+            get_text="text",
+            get_font_family='"Source Sans Pro", sans-serif',
+            get_size=18,
+            get_text_anchor=String("middle"),
+            get_alignment_baseline=String("center"),
+        ))
+
+    deck = pdk.Deck(
+        initial_view_state=pdk.ViewState(
+            latitude=ctr_lat,
+            longitude=ctr_lon,
+            zoom=zoom,
+            bearing=0,
+            pitch=0,
+            height=height,
+        ),
+        map_style="road",
+        layers=layers,
+        tooltip=MAP_TOOLTIP,
+    )
+    deck.picking_radius = 20
+
+    return deck
+
+
+class ExportedDeck(pdk.Deck):
+    """A map from the JSON that the export rendered, for st.pydeck_chart."""
+
+    def __init__(self, deck_json):
+        super().__init__(tooltip=MAP_TOOLTIP)
+        self.deck_json = deck_json
+
+    def to_json(self):
+        return self.deck_json
+
+
+def airline_header_html(airline):
+    return (
+        f'<div style="font-size:1.666rem">{html.escape(airline.name)}</div>\n'
+        f'<p><a href="{html.escape(airline.website)}">{html.escape(airline.website)}</a></p>\n<p>'
+        + ("⭐️ Star Alliance member" if airline.star_alliance_member else "✈️ Codeshare partner" if airline.codeshare_partner else "🧳 Aeroplan partner")
+        + " · " + ("👍 Earn Aeroplan points" if airline.earns_pts else "👎 No Aeroplan points")
+        + " · " + ("👍 Earn SQM" if airline.earns_sqm else "👎 No SQM")
+        + "</p>"
+    )
+
+
+def airport_header_html(airport):
+    return (
+        f'<div style="font-size:1.666rem">{html.escape(airport.airport)}</div>\n'
+        f"<p><strong>{html.escape(airport.city or '')}</strong>, "
+        + (f"{html.escape(airport.state)}, " if airport.state else "")
+        + f"{html.escape(airport.country or '')}</p>"
+    )
+
+
+def _write_page(path, text):
+    # Write to a temporary file and swap it in, so that a server never reads a partial page.
+    temp_path = path.with_name(f".{path.name}.tmp")
+    temp_path.write_text(text)
+    os.replace(temp_path, path)
+
+
+def _export_airline(output_dir, rules_version, airline_id):
+    rules = current_snapshot()
+    if rules.version != rules_version:
+        raise RuntimeError(f"Rules changed to {rules.version} while exporting {rules_version}.")
+
+    airline = rules.airlines_by_id[airline_id]
+    body = earning_rates_html(airline) if airline.earning_rates else ""
+    _write_page(output_dir / "airlines" / f"{airline_id}.body.html", body)
+    _write_page(output_dir / "airlines" / f"{airline_id}.html", PAGE_TEMPLATE.format(
+        title=html.escape(airline.name),
+        body=airline_header_html(airline) + "\n" + body,
+    ))
+
+
+def _export_airport(output_dir, rules_version, origin_code):
+    rules = current_snapshot()
+    if rules.version != rules_version:
+        raise RuntimeError(f"Rules changed to {rules.version} while exporting {rules_version}.")
+
+    origin = rules.airports_by_code[origin_code]
+    deck = map_deck(*published_distances_layers(origin, rules), ctr_lon=origin.longitude, ctr_lat=origin.latitude, zoom=4, get_width=2, height=540)
+    body = distances_table_html(published_distances(origin, rules))
+
+    directory = output_dir / "airports"
+    _write_page(directory / f"{origin_code}.json", deck.to_json())
+    _write_page(directory / f"{origin_code}.map.html", deck.to_html(as_string=True))
+    _write_page(directory / f"{origin_code}.body.html", body)
+    _write_page(directory / f"{origin_code}.html", PAGE_TEMPLATE.format(
+        title=html.escape(f"{origin.airport_code} {origin.airport}"),
+        body=airport_header_html(origin) + f'\n<iframe src="{origin_code}.map.html"></iframe>\n' + body,
+    ))
+
+
+def export_pages(output_dir, workers=None):
+    """Render the Browse Airlines page of every airline and the Browse Airports page of every
+    origin with published distances, in parallel processes, to static HTML in output_dir.
+
+    Each airline has <id>.html and the rates tables in <id>.body.html under airlines/. Each
+    origin has <code>.html, the map as <code>.map.html and as pydeck JSON in <code>.json, and
+    the distances table in <code>.body.html under airports/. The manifest, written last,
+    records the rules version, so that a partial or outdated export is never served. Returns
+    the manifest.
+    """
+
+    output_dir = Path(output_dir)
+    rules = current_snapshot()
+    airline_ids = [airline.id for airline in rules.airlines]
+    origin_codes = sorted(code for code in rules.distances if code in rules.airports_by_code)
+
+    for directory in (output_dir, output_dir / "airlines", output_dir / "airports"):
+        directory.mkdir(parents=True, exist_ok=True)
+    (output_dir / EXPORT_MANIFEST).unlink(missing_ok=True)
+
+    with ProcessPoolExecutor(workers) as executor:
+        list(executor.map(partial(_export_airline, output_dir, rules.version), airline_ids, chunksize=4))
+        list(executor.map(partial(_export_airport, output_dir, rules.version), origin_codes, chunksize=8))
+
+    _write_page(output_dir / "index.html", PAGE_TEMPLATE.format(title="AC Calculator", body="\n".join((
+        "<h2>Airlines</h2>",
+        "<ul>", *(f'<li><a href="airlines/{airline.id}.html">{html.escape(airline.name)}</a></li>' for airline in rules.airlines), "</ul>",
+        "<h2>Airports</h2>",
+        "<ul>", *(f'<li><a href="airports/{code}.html">{code} {html.escape(rules.airports_by_code[code].airport)}</a></li>' for code in origin_codes), "</ul>",
+    ))))
+
+    manifest = {"rules_version": rules.version, "airlines": airline_ids, "airports": origin_codes}
+    _write_page(output_dir / EXPORT_MANIFEST, json.dumps(manifest, indent=2))
+    return manifest
+
+
+@lru_cache(maxsize=8)
+def _manifest_rules_version(path, mtime):
+    return json.loads(Path(path).read_text())["rules_version"]
+
+
+@lru_cache(maxsize=1024)
+def _read_page(path, manifest_mtime):
+    try:
+        return Path(path).read_text()
+    except FileNotFoundError:
+        return None
+
+
+def exported_page(export_dir, rules_version, path):
+    """Return an exported page file, or None if export_dir has no complete export made with
+    the rules version. Pages are read once per export.
+    """
+
+    manifest_path = Path(export_dir) / EXPORT_MANIFEST
+    try:
+        manifest_mtime = manifest_path.stat().st_mtime_ns
+        if _manifest_rules_version(str(manifest_path), manifest_mtime) != rules_version:
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return _read_page(str(Path(export_dir) / path), manifest_mtime)
@@ -0,0 +1,183 @@
+from collections import namedtuple
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .aeroplan import AEROPLAN_STATUSES, FARE_BRANDS, FARE_BRANDS_BY_BASIS_CODE
+from .airlines import SegmentCalculation
+from .batch import ARROW_SCHEMA, CalculationBatch
+from .dedupe import FEED_FIELDS
+from .snapshot import current_snapshot
+
+
+ARROW_IPC_MAGIC = b"ARROW1"
+PARQUET_SUFFIXES = (".parquet", ".pq")
+# Booking classes are numbered as they're seen, up to this many.
+MAX_FARE_CLASSES = 1 << 16
+
+
+ColumnarStats = namedtuple("ColumnarStats", ("rows", "unique_rows", "invalid_rows", "seconds", "rows_per_second"))
+
+
+def read_feed(path, batch_size=65536, columns=FEED_FIELDS):
+    """Yield RecordBatches of the feed columns from a Parquet file, a row group at a time,
+    or from an Arrow IPC file or stream. Only the columns asked for are read from Parquet.
+    """
+
+    if str(path).endswith(PARQUET_SUFFIXES):
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=list(columns))
+        return
+
+    with open(path, "rb") as f:
+        is_file_format = f.read(len(ARROW_IPC_MAGIC)) == ARROW_IPC_MAGIC
+
+    with pa.memory_map(str(path)) as source:
+        if is_file_format:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+        else:
+            batches = pa.ipc.open_stream(source)
+        for batch in batches:
+            yield pa.RecordBatch.from_arrays([batch.column(batch.schema.get_field_index(name)) for name in columns], names=list(columns))
+
+
+class ColumnarScorer:
+    """Scores feed RecordBatches without a Python object per row. Each code column is
+    dictionary encoded and only its distinct values are looked up, so a row is a set of
+    integer indexes into the snapshot's airlines and airports, the fare brands, booking
+    classes and statuses. Distinct segments are calculated with Airline.calculate once per
+    scorer and reused by later batches.
+    """
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot or current_snapshot()
+        self.airports = tuple(self.snapshot.airports_by_code.values())
+        self._airline_indexes = {airline: index for index, airline in enumerate(self.snapshot.airlines)}
+        self._airport_indexes = {airport.airport_code: index for index, airport in enumerate(self.airports)}
+        self._fare_brand_indexes = {fare_brand.name: index for index, fare_brand in enumerate(FARE_BRANDS)}
+        self._status_indexes = {status.name.upper(): index for index, status in enumerate(AEROPLAN_STATUSES)}
+        self._fare_classes = {}
+        self._calculations = {}
+
+    def _airline(self, code):
+        airline = self.snapshot.airlines_by_code.get(code)
+        return -1 if airline is None else self._airline_indexes[airline]
+
+    def _fare_brand(self, code):
+        fare_brand = FARE_BRANDS_BY_BASIS_CODE.get(code)
+        return -1 if fare_brand is None else self._fare_brand_indexes[fare_brand.name]
+
+    def _fare_class(self, code):
+        if code not in self._fare_classes and len(self._fare_classes) >= MAX_FARE_CLASSES:
+            return -1
+        return self._fare_classes.setdefault(code, len(self._fare_classes))
+
+    def _indexes(self, array, lookup):
+        # Codes are case and whitespace insensitive, like dedupe.canonical_key.
+        if not pa.types.is_dictionary(array.type):
+            array = pc.dictionary_encode(array)
+        mapping = np.array([
+            -1 if value is None else lookup(value.strip().upper())
+            for value in array.dictionary.to_pylist()
+        ] + [-1], dtype=np.int64)
+        return mapping[pc.fill_null(array.indices, len(array.dictionary)).to_numpy()]
+
+    def score(self, batch):
+        """Return the CalculationBatch for the rows of a RecordBatch with the FEED_FIELDS
+        columns, a mask of the rows with unknown codes, whose calculations are zero, and
+        the number of distinct segments in the batch.
+        """
+
+        columns = (
+            self._indexes(batch.column(batch.schema.get_field_index("airline")), self._airline),
+            self._indexes(batch.column(batch.schema.get_field_index("origin")), lambda code: self._airport_indexes.get(code, -1)),
+            self._indexes(batch.column(batch.schema.get_field_index("destination")), lambda code: self._airport_indexes.get(code, -1)),
+            self._indexes(batch.column(batch.schema.get_field_index("fare_brand")), self._fare_brand),
+            self._indexes(batch.column(batch.schema.get_field_index("fare_class")), self._fare_class),
+            self._indexes(batch.column(batch.schema.get_field_index("aeroplan_status")), lambda name: self._status_indexes.get(name, -1)),
+        )
+        invalid = np.logical_or.reduce([codes < 0 for codes in columns])
+
+        # Pack each row's indexes into one integer key, with room for the unknown index.
+        keys = np.zeros(batch.num_rows, dtype=np.int64)
+        for codes, size in zip(columns, (len(self.snapshot.airlines), len(self.airports), len(self.airports), len(FARE_BRANDS), MAX_FARE_CLASSES, len(AEROPLAN_STATUSES))):
+            keys = keys * (size + 1) + codes + 1
+        keys[invalid] = -1
+
+        # Any row with a key will do for calculating it.
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        rows = np.zeros(len(unique_keys), dtype=np.int64)
+        rows[inverse] = np.arange(batch.num_rows)
+
+        fare_classes = tuple(self._fare_classes)
+        calculations = []
+        for key, row in zip(unique_keys.tolist(), rows.tolist()):
+            if (calc := self._calculations.get(key)) is None:
+                if key < 0:
+                    calc = SegmentCalculation(0, 0, 0, 0, 0, 0, 0, None, None)
+                else:
+                    airline, origin, destination, fare_brand, fare_class, status = (codes[row] for codes in columns)
+                    calc = self.snapshot.airlines[airline].calculate(
+                        self.airports[origin],
+                        self.airports[destination],
+                        FARE_BRANDS[fare_brand],
+                        fare_classes[fare_class],
+                        "",
+                        AEROPLAN_STATUSES[status],
+                    )
+                self._calculations[key] = calc
+            calculations.append(calc)
+
+        return CalculationBatch.from_calculations(calculations).take(inverse), invalid, len(unique_keys)
+
+
+def score_feed(path, output_dir, partition_by=("airline",), batch_size=65536, snapshot=None):
+    """Score a Parquet or Arrow IPC feed and write the feed columns with the SegmentCalculation
+    fields and an invalid flag as a Parquet dataset, hive partitioned by the partition_by
+    feed columns. Batches are read, scored and written one at a time, so memory is bounded
+    by the batch size and the distinct segments. Returns ColumnarStats, where unique_rows
+    is the number of distinct segments calculated.
+    """
+
+    start = time.perf_counter()
+    scorer = ColumnarScorer(snapshot)
+    stats = {"rows": 0, "invalid_rows": 0}
+
+    def scored_batches():
+        for batch in read_feed(path, batch_size):
+            calculations, invalid, _ = scorer.score(batch)
+            stats["rows"] += batch.num_rows
+            stats["invalid_rows"] += int(invalid.sum())
+
+            yield pa.RecordBatch.from_arrays([
+                *(column.cast(pa.string()) for column in batch.columns),
+                pa.array(invalid),
+                *(column.combine_chunks() for column in calculations.to_arrow().columns),
+            ], schema=schema)
+
+    schema = pa.schema([
+        *(pa.field(name, pa.string()) for name in FEED_FIELDS),
+        pa.field("invalid", pa.bool_()),
+        *ARROW_SCHEMA,
+    ])
+    ds.write_dataset(
+        scored_batches(),
+        output_dir,
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([schema.field(name) for name in partition_by]), flavor="hive"),
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    seconds = time.perf_counter() - start
+    return ColumnarStats(
+        stats["rows"],
+        sum(key >= 0 for key in scorer._calculations),
+        stats["invalid_rows"],
+        seconds,
+        stats["rows"] / seconds if seconds else 0.0,
+    )
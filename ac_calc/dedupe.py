@@ -0,0 +1,139 @@
+from collections import defaultdict, namedtuple
+import time
+
+import numpy as np
+
+from .aeroplan import AEROPLAN_STATUSES, AEROPLAN_STATUSES_BY_NAME, FARE_BRANDS_BY_BASIS_CODE, FARE_BRANDS_BY_NAME
+from .airlines import SegmentCalculation
+from .batch import CalculationBatch, calculate_from_origin
+from .snapshot import current_snapshot
+
+
+# Segment feed rows are codes, as exported by booking and statement systems.
+FEED_FIELDS = ("airline", "origin", "destination", "fare_brand", "fare_class", "aeroplan_status")
+ENGINES = ("calculate", "batch")
+
+
+SegmentKey = namedtuple("SegmentKey", (
+    "airline_id", "origin_code", "destination_code", "fare_brand_name", "fare_class", "aeroplan_status_name",
+))
+DedupeStats = namedtuple("DedupeStats", (
+    "rows", "unique_rows", "invalid_rows", "dedup_ratio", "seconds", "rows_per_second", "scored_rows_per_second",
+))
+DedupedScores = namedtuple("DedupedScores", ("calculations", "invalid", "stats"))
+
+
+AEROPLAN_STATUSES_BY_UPPER_NAME = {status.name.upper(): status for status in AEROPLAN_STATUSES}
+
+
+def canonical_key(snapshot, row):
+    """Return the SegmentKey of a feed row in FEED_FIELDS order. Codes are case and whitespace
+    insensitive, and airline codes and fare basis codes are resolved to the airline and fare
+    brand they stand for, so rows that earn the same share a key. Raises KeyError for codes
+    that the snapshot doesn't have, and ValueError for rows with the wrong number of fields.
+    """
+
+    if len(row) != len(FEED_FIELDS):
+        raise ValueError(f"Feed row has {len(row)} fields, expected {len(FEED_FIELDS)}.")
+    airline_code, origin_code, destination_code, fare_brand_code, fare_class, aeroplan_status_name = (value.strip().upper() for value in row)
+    origin_code = snapshot.airports_by_code[origin_code].airport_code
+    destination_code = snapshot.airports_by_code[destination_code].airport_code
+
+    return SegmentKey(
+        snapshot.airlines_by_code[airline_code].id,
+        origin_code,
+        destination_code,
+        FARE_BRANDS_BY_BASIS_CODE[fare_brand_code].name,
+        fare_class,
+        AEROPLAN_STATUSES_BY_UPPER_NAME[aeroplan_status_name].name,
+    )
+
+
+def _calculate_engine(snapshot, keys):
+    return CalculationBatch.from_calculations(
+        snapshot.airlines_by_id[key.airline_id].calculate(
+            snapshot.airports_by_code[key.origin_code],
+            snapshot.airports_by_code[key.destination_code],
+            FARE_BRANDS_BY_NAME[key.fare_brand_name],
+            key.fare_class,
+            "",
+            AEROPLAN_STATUSES_BY_NAME[key.aeroplan_status_name],
+        )
+        for key in keys
+    )
+
+
+def _batch_engine(snapshot, keys):
+    # Keys from the same origin with the same fare are calculated together.
+    groups = defaultdict(list)
+    for index, key in enumerate(keys):
+        groups[(key.airline_id, key.origin_code, key.fare_brand_name, key.fare_class, key.aeroplan_status_name)].append(index)
+
+    batches = []
+    order = []
+    for (airline_id, origin_code, fare_brand_name, fare_class, aeroplan_status_name), indexes in groups.items():
+        batches.append(calculate_from_origin(
+            snapshot.airlines_by_id[airline_id],
+            snapshot.airports_by_code[origin_code],
+            [snapshot.airports_by_code[keys[index].destination_code] for index in indexes],
+            FARE_BRANDS_BY_NAME[fare_brand_name],
+            fare_class,
+            "",
+            AEROPLAN_STATUSES_BY_NAME[aeroplan_status_name],
+        ))
+        order.extend(indexes)
+
+    # Put the grouped results back in key order.
+    positions = np.empty(len(keys), dtype=np.intp)
+    positions[np.array(order, dtype=np.intp)] = np.arange(len(keys))
+    return CalculationBatch.concatenate(batches).take(positions)
+
+
+def score_deduplicated(rows, engine="calculate", snapshot=None):
+    """Score feed rows in FEED_FIELDS order, calculating each distinct SegmentKey once.
+
+    engine is "calculate" for Airline.calculate per key, or "batch" for calculate_from_origin
+    per origin and fare. Returns DedupedScores with a CalculationBatch in row order, a mask of
+    the rows with unknown codes, whose calculations are zero, and DedupeStats. The scored
+    rate is the number of distinct keys calculated per second, which is about what scoring
+    every row would run at, so the ratio of the two rates is the throughput gained.
+    """
+
+    start = time.perf_counter()
+    snapshot = snapshot or current_snapshot()
+    score = {"calculate": _calculate_engine, "batch": _batch_engine}[engine]
+
+    # Feeds repeat rows verbatim too, so raw rows are only canonicalized once.
+    keys = {}
+    raw_keys = {}
+    row_keys = []
+    for row in rows:
+        if (index := raw_keys.get(row := tuple(row))) is None:
+            try:
+                index = keys.setdefault(canonical_key(snapshot, row), len(keys))
+            except (KeyError, ValueError):
+                index = -1
+            raw_keys[row] = index
+        row_keys.append(index)
+
+    scoring_start = time.perf_counter()
+    unique = score(snapshot, list(keys))
+    scoring_seconds = time.perf_counter() - scoring_start
+
+    # Invalid rows take the extra zero row at the end.
+    zero = CalculationBatch.from_calculations((SegmentCalculation(0, 0, 0, 0, 0, 0, 0, None, None),))
+    row_keys = np.array(row_keys, dtype=np.intp)
+    invalid = row_keys < 0
+    row_keys[invalid] = len(keys)
+    calculations = CalculationBatch.concatenate((unique, zero)).take(row_keys)
+
+    seconds = time.perf_counter() - start
+    return DedupedScores(calculations, invalid, DedupeStats(
+        len(row_keys),
+        len(keys),
+        int(invalid.sum()),
+        len(row_keys) / len(keys) if keys else 0.0,
+        seconds,
+        len(row_keys) / seconds if seconds else 0.0,
+        len(keys) / scoring_seconds if scoring_seconds else 0.0,
+    ))
@@ -0,0 +1,101 @@
+from collections import namedtuple
+from functools import lru_cache
+import string
+
+import numpy as np
+
+from .aeroplan import FARE_BRANDS, NoBrand
+from .airlines import LISBON_PORTO_CODES
+from .snapshot import current_snapshot
+
+
+# Regions only depend on the country and continent of each end of a segment, and on whether
+# it's a Lisbon or Porto airport.
+Place = namedtuple("Place", ("country", "continent", "lisbon_porto"))
+PartnerEarning = namedtuple("PartnerEarning", ("airline", "fare_brand", "region", "service", "rate"))
+EarningIndex = namedtuple("EarningIndex", ("places", "place_ids", "signatures", "partners", "airlines", "region_names", "region_codes"))
+
+
+FARE_CLASSES = tuple(string.ascii_uppercase)
+
+
+def airport_place(airport):
+    return Place(airport.country, airport.continent, airport.airport_code in LISBON_PORTO_CODES)
+
+
+def earning_index(snapshot=None):
+    """Return the index of the airlines that earn between each pair of places in each fare
+    class. Every place pair is mapped to the signature of regions it falls in across the
+    airlines, and each signature and fare class to the PartnerEarnings for it. The region
+    of each place pair for each of the airlines that earn is kept as codes into the
+    airline's region names.
+    """
+
+    return _earning_index(snapshot or current_snapshot())
+
+
+def _best_earning(airline, region, fare_class):
+    # Partners earn by booking class, and Air Canada by the fare brand the class is sold under.
+    fare_brands = [fare_brand for fare_brand in FARE_BRANDS[1:] if fare_class in fare_brand.fare_classes] if airline.id == "air-canada" else [NoBrand]
+    best = None
+    for fare_brand in fare_brands:
+        rate_region, service, rate = airline._rate_for_region(region, fare_brand, fare_class)
+        if rate and (best is None or rate > best.rate):
+            best = PartnerEarning(airline, fare_brand, rate_region, service, rate)
+    return best
+
+
+@lru_cache(maxsize=2)
+def _earning_index(snapshot):
+    representatives = {}
+    for airport in snapshot.airports:
+        representatives.setdefault(airport_place(airport), airport)
+    places = tuple(representatives)
+    place_ids = {place: index for index, place in enumerate(places)}
+
+    # Airlines without earning rates never earn, wherever they fly.
+    airlines = [airline for airline in snapshot.airlines if airline.compiled_earning_rates and (airline.earns_pts or airline.earns_sqm)]
+
+    # Number the distinct combinations of regions across the airlines one airline at a time.
+    airline_regions = []
+    signature_ids = np.zeros(len(places) * len(places), dtype=np.int64)
+    airports = tuple(representatives.values())
+    for airline in airlines:
+        names = {}
+        region_codes = np.array([
+            names.setdefault(region, len(names))
+            for origin in airports
+            for region in airline._regions_for_segments(origin, airports)
+        ], dtype=np.int8)
+        _, signature_ids = np.unique(signature_ids * len(names) + region_codes, return_inverse=True)
+        airline_regions.append((tuple(names), region_codes))
+
+    partners = {}
+    _, first_pairs = np.unique(signature_ids, return_index=True)
+    for signature_id, pair in enumerate(first_pairs):
+        regions = [names[region_codes[pair]] for names, region_codes in airline_regions]
+        for fare_class in FARE_CLASSES:
+            earnings = (_best_earning(airline, region, fare_class) for airline, region in zip(airlines, regions))
+            partners[(signature_id, fare_class)] = tuple(sorted(filter(None, earnings), key=lambda earning: -earning.rate))
+
+    return EarningIndex(
+        places,
+        place_ids,
+        signature_ids.reshape(len(places), len(places)),
+        partners,
+        tuple(airlines),
+        tuple(names for names, _ in airline_regions),
+        np.stack([region_codes for _, region_codes in airline_regions]).reshape(len(airlines), len(places), len(places)),
+    )
+
+
+def earning_partners(origin, destination, fare_class, snapshot=None):
+    """Return a PartnerEarning for each airline that earns points or SQM from the origin Place
+    to the destination Place in the fare class, with the best rate first. Air Canada's
+    earning is the best of the fare brands that sell the class.
+    """
+
+    index = earning_index(snapshot)
+    if (origin_id := index.place_ids.get(origin)) is None or (destination_id := index.place_ids.get(destination)) is None:
+        return ()
+    return index.partners.get((index.signatures[origin_id, destination_id], fare_class), ())
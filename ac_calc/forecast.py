@@ -0,0 +1,116 @@
+from collections import Counter, namedtuple
+import datetime
+
+import numpy as np
+
+from .aeroplan import AEROPLAN_STATUSES, DEFAULT_AEROPLAN_STATUS
+from .ledger import StatusLedger
+
+
+StatusForecast = namedtuple("StatusForecast", (
+    "aeroplan_status", "totals", "segments_per_day", "probabilities", "sqm", "sqs", "pts",
+))
+
+
+QUALIFYING_SQM = np.array([status.qualifying_sqm for status in AEROPLAN_STATUSES])
+QUALIFYING_SQS = np.array([status.qualifying_sqs for status in AEROPLAN_STATUSES])
+
+
+def _qualified_indexes(sqm, sqs):
+    # Tiers are in qualifying order, and a tier is reached on either SQM or SQS, like
+    # ledger._qualified_status.
+    return np.maximum(
+        np.searchsorted(QUALIFYING_SQM, sqm, side="right"),
+        np.searchsorted(QUALIFYING_SQS, sqs, side="right"),
+    ) - 1
+
+
+def _segment_key(segment):
+    return (segment.airline, segment.origin.airport_code, segment.destination.airport_code, segment.fare_brand.name, segment.fare_class, segment.ticket_number)
+
+
+def _earnings_tables(segments):
+    """Return the SQM and total points of each segment at every status, as segment x status
+    arrays.
+    """
+
+    sqm = np.zeros((len(segments), len(AEROPLAN_STATUSES)), dtype=np.int64)
+    pts = np.zeros((len(segments), len(AEROPLAN_STATUSES)), dtype=np.int64)
+    for row, segment in enumerate(segments):
+        for column, status in enumerate(AEROPLAN_STATUSES):
+            calc = segment.airline.calculate(segment.origin, segment.destination, segment.fare_brand, segment.fare_class, segment.ticket_number, status)
+            sqm[row, column] = calc.sqm
+            pts[row, column] = calc.pts + calc.pts_bonus
+    return sqm, pts
+
+
+def forecast_status(history, on=None, starting_status=DEFAULT_AEROPLAN_STATUS, scenarios=20000, lookback_days=365, min_pace_days=90, seed=None):
+    """Forecast the chance of a member reaching each tier by the end of the year.
+
+    History is the member's FlownSegments in the order they were flown, up to `on`, or today,
+    and may go back into earlier years. The segments flown this year are scored with a
+    StatusLedger from the status held at the start of the year. The rest of the year is
+    simulated as scenarios in which the member flies a Poisson number of segments, at their
+    pace over the lookback days, each drawn from the segments they flew in that time in
+    proportion to how often they flew them. Each distinct segment is calculated once at every
+    status, and the scenarios are advanced a segment at a time as arrays, upgrading their
+    status as they qualify.
+
+    The pace is measured from the start of the lookback days, or from the member's first
+    segment in the whole history if that's later, and over at least min_pace_days. A history
+    of flights can't tell a new member from one who rarely flies, so a single recent segment
+    gives a pace of one segment per min_pace_days rather than one a day.
+
+    Returns a StatusForecast with the status and totals to date, the pace, the probability
+    of having reached each of AEROPLAN_STATUSES at year end, and the year-end SQM, SQS and
+    total points of each scenario.
+    """
+
+    on = on or datetime.date.today()
+    history = [segment for segment in history if segment.flown_on <= on]
+    member_id = history[0].member_id if history else None
+    ledger = StatusLedger(on.year, {member_id: starting_status})
+    ledger.add(segment for segment in history if segment.flown_on.year == on.year)
+    member = ledger.member(member_id)
+
+    # The member's pace and the segments they fly, over the lookback days or as much of them
+    # as the history covers, and over at least min_pace_days.
+    since = on - datetime.timedelta(days=lookback_days - 1)
+    recent = [segment for segment in history if segment.flown_on >= since]
+    counts = Counter()
+    segments = {}
+    for segment in recent:
+        counts[key := _segment_key(segment)] += 1
+        segments.setdefault(key, segment)
+    covered_since = max(since, min((segment.flown_on for segment in history), default=on))
+    days = max((on - covered_since).days + 1, min(min_pace_days, lookback_days))
+    segments_per_day = len(recent) / days
+
+    rng = np.random.default_rng(seed)
+    remaining_days = (datetime.date(on.year, 12, 31) - on).days
+    num_segments = rng.poisson(segments_per_day * remaining_days, scenarios) if counts else np.zeros(scenarios, dtype=np.int64)
+
+    sqm_table, pts_table = _earnings_tables(list(segments.values()))
+    cumulative = np.cumsum(np.array([counts[key] for key in segments], dtype=np.float64))
+    cumulative /= cumulative[-1] if len(cumulative) else 1
+
+    sqm = np.full(scenarios, member.totals.sqm, dtype=np.int64)
+    sqs = np.full(scenarios, member.totals.sqs, dtype=np.int64)
+    pts = np.full(scenarios, member.totals.pts + member.totals.pts_bonus, dtype=np.int64)
+    statuses = np.full(scenarios, AEROPLAN_STATUSES.index(member.aeroplan_status), dtype=np.intp)
+
+    # The nth segment of every scenario that flies at least n segments is drawn together.
+    for n in range(int(num_segments.max(initial=0))):
+        flying = np.flatnonzero(num_segments > n)
+        drawn = np.searchsorted(cumulative, rng.random(len(flying)), side="right")
+        status = statuses[flying]
+        sqm[flying] += sqm_table[drawn, status]
+        sqs[flying] += 1
+        pts[flying] += pts_table[drawn, status]
+        statuses[flying] = np.maximum(status, _qualified_indexes(sqm[flying], sqs[flying]))
+
+    # A tier is reached on the year's totals, whatever status the member started with.
+    reached = np.bincount(_qualified_indexes(sqm, sqs), minlength=len(AEROPLAN_STATUSES))
+    probabilities = np.cumsum(reached[::-1])[::-1] / scenarios
+
+    return StatusForecast(member.aeroplan_status, member.totals, segments_per_day, probabilities, sqm, sqs, pts)
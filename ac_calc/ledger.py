@@ -0,0 +1,143 @@
+from collections import namedtuple
+from dataclasses import dataclass, field
+import datetime
+
+from .aeroplan import AEROPLAN_STATUSES, DEFAULT_AEROPLAN_STATUS, AeroplanStatus
+
+
+FlownSegment = namedtuple("FlownSegment", (
+    "member_id", "flown_on",
+    "airline", "origin", "destination", "fare_brand", "fare_class", "ticket_number",
+))
+LedgerTotals = namedtuple("LedgerTotals", ("sqm", "sqs", "pts", "pts_bonus"), defaults=(0, 0, 0, 0))
+StatusChange = namedtuple("StatusChange", ("flown_on", "aeroplan_status"))
+TierGap = namedtuple("TierGap", ("aeroplan_status", "sqm", "sqs", "qualified"))
+
+
+ROLLUPS = ("airline", "month", "region")
+
+
+def _add(totals, calc):
+    return LedgerTotals(
+        totals.sqm + calc.sqm,
+        totals.sqs + 1,
+        totals.pts + calc.pts,
+        totals.pts_bonus + calc.pts_bonus,
+    )
+
+
+def _qualified_status(totals):
+    return max(
+        (status for status in AEROPLAN_STATUSES if totals.sqm >= status.qualifying_sqm or totals.sqs >= status.qualifying_sqs),
+        key=lambda status: status.qualifying_sqm,
+    )
+
+
+def _tier_gaps(totals):
+    return tuple(
+        TierGap(
+            status,
+            max(status.qualifying_sqm - totals.sqm, 0),
+            max(status.qualifying_sqs - totals.sqs, 0),
+            totals.sqm >= status.qualifying_sqm or totals.sqs >= status.qualifying_sqs,
+        )
+        for status in AEROPLAN_STATUSES
+        if status.qualifying_sqm
+    )
+
+
+@dataclass
+class MemberLedger:
+
+    aeroplan_status: AeroplanStatus
+    totals: LedgerTotals = field(default_factory=LedgerTotals)
+    status_changes: list = field(default_factory=list)
+    rollups: dict = field(default_factory=lambda: {rollup: {} for rollup in ROLLUPS})
+
+
+class StatusLedger:
+    """Year-to-date SQM, SQS and points for many members, with rollups by airline, month and
+    region. Segments are appended in the order they were flown and each is scored once, so
+    adding a day's segments costs time proportional to the new segments, not the history.
+
+    A member's status starts at the one they held at the start of the year. When their
+    year-to-date SQM or SQS reach a higher tier, the new status applies to the segments
+    that follow.
+    """
+
+    def __init__(self, year, starting_statuses=None):
+        self.year = year
+        self.starting_statuses = dict(starting_statuses or {})
+        self.members = {}
+
+    def member(self, member_id):
+        """Return the member's ledger. A member without segments gets a fresh ledger at their
+        starting status, which isn't stored until add gives them a segment.
+        """
+
+        if (member := self.members.get(member_id)) is None:
+            member = MemberLedger(self.starting_statuses.get(member_id, DEFAULT_AEROPLAN_STATUS))
+        return member
+
+    def add(self, segments):
+        """Score and add flown segments. Returns the number of segments added."""
+
+        count = 0
+        for segment in segments:
+            if segment.flown_on.year != self.year:
+                raise ValueError(f"Segment flown on {segment.flown_on} is not in {self.year}.")
+
+            if (member := self.members.get(segment.member_id)) is None:
+                member = self.members[segment.member_id] = self.member(segment.member_id)
+            calc = segment.airline.calculate(
+                segment.origin,
+                segment.destination,
+                segment.fare_brand,
+                segment.fare_class,
+                segment.ticket_number,
+                member.aeroplan_status,
+            )
+
+            member.totals = _add(member.totals, calc)
+            for rollup, key in zip(ROLLUPS, (segment.airline.id, segment.flown_on.month, calc.region)):
+                rollup_totals = member.rollups[rollup]
+                rollup_totals[key] = _add(rollup_totals.get(key, LedgerTotals()), calc)
+
+            # Upgrade the member's status as soon as they qualify for a higher tier.
+            qualified_status = _qualified_status(member.totals)
+            if qualified_status.qualifying_sqm > member.aeroplan_status.qualifying_sqm:
+                member.aeroplan_status = qualified_status
+                member.status_changes.append(StatusChange(segment.flown_on, qualified_status))
+
+            count += 1
+
+        return count
+
+    def totals(self, member_id):
+        return self.member(member_id).totals
+
+    def rollup(self, member_id, by):
+        """Return the member's totals keyed by airline id, month number or region."""
+
+        if by not in ROLLUPS:
+            raise ValueError(f"Unknown rollup {by}, expected one of {ROLLUPS}.")
+        return dict(self.member(member_id).rollups[by])
+
+    def gaps(self, member_id):
+        """Return the SQM and SQS still needed to qualify for each tier."""
+
+        return _tier_gaps(self.member(member_id).totals)
+
+    def projection(self, member_id, on=None):
+        """Project the member's year-end totals by extrapolating their pace to date, and return
+        the tier gaps remaining at that pace. Pace is measured up to `on`, or today.
+        """
+
+        totals = self.member(member_id).totals
+        on = on or datetime.date.today()
+        start, end = datetime.date(self.year, 1, 1), datetime.date(self.year, 12, 31)
+        elapsed = (min(max(on, start), end) - start).days + 1
+        scale = ((end - start).days + 1) / elapsed
+
+        projected = LedgerTotals(*(int(value * scale) for value in totals))
+        return projected, _tier_gaps(projected)
@@ -1,10 +1,7 @@
 from collections import defaultdict, namedtuple
 import csv
+import io
 import json
-from functools import cache
-from importlib import resources
-
-import streamlit as st
 
 
 Airport = namedtuple("Airport", (
@@ -29,43 +26,36 @@ Airport = namedtuple("Airport", (
 Distance = namedtuple("Distance", ("origin,destination,old_distance,distance"))
 
 
-@st.experimental_singleton
-def aeroplan_distances():
-    with resources.open_text("ac_calc.locations", "aeroplan_distances.csv") as f:
-        reader = csv.reader(f)
-        assert(next(reader) == ["origin", "destination", "old_distance", "distance"])
-        distances = defaultdict(dict)
-        for distance in map(Distance._make, reader):
-            old_distance = int(distance.old_distance) if distance.old_distance else 0
-            new_distance = int(distance.distance) if distance.distance else 0
-
-            distances[distance.origin][distance.destination] = Distance(
-                distance.origin,
-                distance.destination,
-                old_distance,
-                new_distance,
-            )
-            distances[distance.destination][distance.origin] = Distance(
-                distance.destination,
-                distance.origin,
-                old_distance,
-                new_distance,
-            )
-
-    return distances
-
-
-@st.experimental_singleton
-def airports():
-    _distances = aeroplan_distances()
+def _parse_aeroplan_distances(distances_csv):
+    reader = csv.reader(io.StringIO(distances_csv))
+    assert(next(reader) == ["origin", "destination", "old_distance", "distance"])
+    distances = defaultdict(dict)
+    for distance in map(Distance._make, reader):
+        old_distance = int(distance.old_distance) if distance.old_distance else 0
+        new_distance = int(distance.distance) if distance.distance else 0
+
+        distances[distance.origin][distance.destination] = Distance(
+            distance.origin,
+            distance.destination,
+            old_distance,
+            new_distance,
+        )
+        distances[distance.destination][distance.origin] = Distance(
+            distance.destination,
+            distance.origin,
+            old_distance,
+            new_distance,
+        )
+
+    return dict(distances)
+
 
+def _parse_airports(airports_json, distances):
     # Load and return list of airports, including distances to other airports.
-    with resources.open_text("ac_calc.locations", "airports.json") as f:
-        airports_data = json.load(f)
-        airports = [
-            Airport(**airport_data, distances=_distances.get(airport_data["airport_code"], {}))
-            for airport_data in airports_data
-        ]
+    airports = [
+        Airport(**airport_data, distances=distances.get(airport_data["airport_code"], {}))
+        for airport_data in json.loads(airports_json)
+    ]
 
     # Sort the airports by city and country, starting with Canada and US.
     airports.sort(key=lambda airport:
@@ -74,12 +64,21 @@ def airports():
         else airport.city or f"ZZZ{airport.airport_code}"
     )
 
-    return airports
+    return tuple(airports)
+
+
+# The reference data comes from the current rules snapshot, which is swapped out when the
+# source files change. Look it up once per calculation rather than holding on to it.
+def aeroplan_distances():
+    from ..snapshot import current_snapshot
+    return current_snapshot().distances
+
+
+def airports():
+    from ..snapshot import current_snapshot
+    return current_snapshot().airports
 
 
-@st.experimental_singleton
 def airports_by_code():
-    return {
-        airport.airport_code: airport
-        for airport in airports()
-    }
+    from ..snapshot import current_snapshot
+    return current_snapshot().airports_by_code
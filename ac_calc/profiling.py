@@ -0,0 +1,132 @@
+from collections import Counter
+import cProfile
+import json
+import sys
+import threading
+import time
+
+
+PROFILE_MODES = ("sample", "cprofile")
+
+
+class SamplingProfiler:
+    """Samples the call stack of the thread that starts it from a background thread, every
+    interval seconds, without tracing each call. Stacks are counted, so a long run costs
+    memory in proportion to its distinct stacks.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self.seconds = 0.0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._target_id = None
+        self._start = None
+
+    def start(self):
+        self._target_id = threading.get_ident()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="ac-calc-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.seconds = time.perf_counter() - self._start
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Return the samples in the collapsed stack format read by flamegraph.pl, speedscope
+        and most flame graph viewers: a line per stack with its frames from the root,
+        separated by semicolons, and its sample count.
+        """
+
+        return "".join(
+            ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack) + f" {count}\n"
+            for stack, count in self.stacks.most_common()
+        )
+
+    def speedscope(self, name="ac-calc"):
+        """Return the samples as a speedscope sampled profile, weighted in seconds."""
+
+        frames = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.most_common():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "ac-calc",
+            "shared": {"frames": [{"name": name, "file": filename, "line": line} for name, filename, line in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+def profile_call(function, *args, mode="sample", interval=0.001, **kwargs):
+    """Call function under a profiler and return its result and the profiler, which is a
+    SamplingProfiler for the sample mode or a cProfile.Profile for the deterministic cprofile
+    mode. The profiler is stopped even if the call raises.
+    """
+
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode}, expected one of {PROFILE_MODES}.")
+
+    if mode == "sample":
+        profiler = SamplingProfiler(interval)
+        start, stop = profiler.start, profiler.stop
+    else:
+        profiler = cProfile.Profile()
+        start, stop = profiler.enable, profiler.disable
+
+    start()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        stop()
+
+    return result, profiler
+
+
+def write_profile(profiler, path_stem, name="ac-calc"):
+    """Write a profile next to path_stem: collapsed stacks and a speedscope file for a
+    SamplingProfiler, or a pstats file for a cProfile.Profile. Returns the paths written.
+    """
+
+    if isinstance(profiler, cProfile.Profile):
+        path = path_stem.with_suffix(".prof")
+        profiler.dump_stats(path)
+        return (path,)
+
+    collapsed_path = path_stem.with_suffix(".collapsed.txt")
+    collapsed_path.write_text(profiler.collapsed())
+    speedscope_path = path_stem.with_suffix(".speedscope.json")
+    speedscope_path.write_text(json.dumps(profiler.speedscope(name)))
+    return collapsed_path, speedscope_path
@@ -0,0 +1,78 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .aeroplan import FARE_BRANDS
+from .earning_partners import FARE_CLASSES
+from .snapshot import current_snapshot
+
+
+# Rates are keyed by booking class, and for Air Canada by fare brand.
+RATE_KEYS = (*FARE_CLASSES, *(fare_brand.name for fare_brand in FARE_BRANDS[1:]))
+RATE_INDEX_NAMES = ("airline", "region", "service")
+
+
+RateMatrix = namedtuple("RateMatrix", ("rates", "airlines", "regions", "airline_codes", "region_codes"))
+
+
+def rate_matrix(snapshot=None):
+    """Return the earning rates of every airline as one table, with a row per airline, region
+    and class of service, in the airline's order, and a column per RATE_KEYS. Keys without a
+    rate are NaN. The airline and region of each row are also kept as codes into airlines
+    and regions, for slicing without going through the index.
+    """
+
+    return _rate_matrix(snapshot or current_snapshot())
+
+
+@lru_cache(maxsize=2)
+def _rate_matrix(snapshot):
+    columns = {key: column for column, key in enumerate(RATE_KEYS)}
+    regions = {}
+    index = []
+    airline_codes = []
+    region_codes = []
+    rows = []
+    for airline_code, airline in enumerate(snapshot.airlines):
+        for region, services in (airline.earning_rates or {}).items():
+            for service, rates in services.items():
+                row = np.full(len(RATE_KEYS), np.nan)
+                for key, rate in rates.items():
+                    row[columns[key]] = rate
+                rows.append(row)
+                index.append((airline.name, region, service))
+                airline_codes.append(airline_code)
+                region_codes.append(regions.setdefault(region, len(regions)))
+
+    rates = pd.DataFrame(
+        np.stack(rows) if rows else np.zeros((0, len(RATE_KEYS))),
+        index=pd.MultiIndex.from_tuples(index, names=RATE_INDEX_NAMES),
+        columns=RATE_KEYS,
+    )
+    return RateMatrix(rates, snapshot.airlines, tuple(regions), np.array(airline_codes, dtype=np.intp), np.array(region_codes, dtype=np.intp))
+
+
+def compare_rates(keys=(), regions=(), airlines=(), snapshot=None):
+    """Return the slice of the rate matrix for the booking classes and fare brands in keys,
+    the regions and the airlines, each of which defaults to all of them. Rows without a rate
+    in any of the keys are dropped, and the rest are sorted by the first key's rate, best
+    first.
+    """
+
+    matrix = rate_matrix(snapshot)
+    mask = np.ones(len(matrix.rates), dtype=bool)
+    if regions:
+        mask &= np.isin(matrix.region_codes, [code for code, region in enumerate(matrix.regions) if region in set(regions)])
+    if airlines:
+        mask &= np.isin(matrix.airline_codes, [code for code, airline in enumerate(matrix.airlines) if airline in set(airlines)])
+
+    keys = list(keys or RATE_KEYS)
+    values = matrix.rates.to_numpy()[:, [RATE_KEYS.index(key) for key in keys]]
+    mask &= ~np.isnan(values).all(axis=1)
+
+    rows = np.flatnonzero(mask)
+    # Stable, so that rows with the same rate keep the airlines' order.
+    rows = rows[np.argsort(-np.nan_to_num(values[rows, 0], nan=-1.0), kind="stable")]
+    return pd.DataFrame(values[rows], index=matrix.rates.index[rows], columns=keys)
@@ -0,0 +1,172 @@
+from collections import namedtuple
+import csv
+from functools import lru_cache
+from pathlib import Path
+import tempfile
+import time
+import zlib
+
+from .aeroplan import AEROPLAN_STATUSES_BY_NAME, FARE_BRANDS_BY_BASIS_CODE
+from .snapshot import current_snapshot
+
+
+# Scored itineraries and posted statement lines are joined on ticket number and segment
+# (coupon) number.
+EXPECTED_FIELDS = ("ticket_number", "segment", "airline", "origin", "destination", "fare_class", "fare_brand", "aeroplan_status")
+STATEMENT_FIELDS = ("ticket_number", "segment", "distance", "pts", "pts_bonus", "sqm")
+
+DISCREPANCY_TYPES = ("distance", "rate", "bonus", "sqm", "missing", "unexpected", "duplicate", "invalid")
+
+
+Discrepancy = namedtuple("Discrepancy", ("type", "ticket_number", "segment", "expected", "posted"))
+ReconciliationStats = namedtuple("ReconciliationStats", (
+    "expected_rows", "statement_rows", "matched_rows", "discrepancies", "seconds", "rows_per_second",
+))
+
+
+@lru_cache(maxsize=65536)
+def _calculate(snapshot, airline_code, origin_code, destination_code, fare_class, fare_brand_code, aeroplan_status_name, ticket_number):
+    return snapshot.airlines_by_code[airline_code].calculate(
+        snapshot.airports_by_code[origin_code],
+        snapshot.airports_by_code[destination_code],
+        FARE_BRANDS_BY_BASIS_CODE[fare_brand_code],
+        fare_class,
+        ticket_number,
+        AEROPLAN_STATUSES_BY_NAME[aeroplan_status_name],
+    )
+
+
+def _key(row):
+    # Short rows are keyed with empty fields, and reported as invalid when they're compared.
+    return tuple((*row[:2], "", "")[:2])
+
+
+def _compare(snapshot, expected_row, posted_row, distance_tolerance):
+    """Yield a Discrepancy for each way the posted earnings differ from the expected ones."""
+
+    ticket_number, segment = _key(expected_row)
+    if len(expected_row) != len(EXPECTED_FIELDS):
+        yield Discrepancy("invalid", ticket_number, segment, f"Expected row has {len(expected_row)} fields", None)
+        return
+    try:
+        # Only the ticket stock (issuing airline prefix) matters for earning, and passing just
+        # the prefix lets repeated segments share a calculation.
+        calc = _calculate(snapshot, *expected_row[2:], ticket_number[:3])
+    except KeyError as e:
+        yield Discrepancy("invalid", ticket_number, segment, f"Unknown code {e}", None)
+        return
+
+    if len(posted_row) != len(STATEMENT_FIELDS):
+        yield Discrepancy("invalid", ticket_number, segment, None, f"Statement line has {len(posted_row)} fields")
+        return
+    try:
+        distance, pts, pts_bonus, sqm = (float(posted_row[2]), *(int(value) for value in posted_row[3:6]))
+    except ValueError as e:
+        yield Discrepancy("invalid", ticket_number, segment, None, f"Statement line {e}")
+        return
+
+    if abs(calc.distance - distance) > distance_tolerance:
+        yield Discrepancy("distance", ticket_number, segment, calc.distance, distance)
+    elif calc.pts != pts:
+        # With a matching distance, a points difference comes from the earning rate.
+        yield Discrepancy("rate", ticket_number, segment, calc.pts, pts)
+    if calc.pts_bonus != pts_bonus:
+        yield Discrepancy("bonus", ticket_number, segment, calc.pts_bonus, pts_bonus)
+    if calc.sqm != sqm:
+        yield Discrepancy("sqm", ticket_number, segment, calc.sqm, sqm)
+
+
+def _partition(key, partitions):
+    return zlib.crc32("\x1f".join(key).encode()) % partitions
+
+
+def _spill(rows, directory, name, partitions):
+    """Write rows to one CSV file per hash partition of their join key. Returns the row count."""
+
+    files = [open(directory / f"{name}-{index}.csv", "w", newline="") for index in range(partitions)]
+    writers = [csv.writer(f) for f in files]
+    try:
+        count = 0
+        for row in rows:
+            writers[_partition(_key(row), partitions)].writerow(row)
+            count += 1
+    finally:
+        for f in files:
+            f.close()
+
+    return count
+
+
+def _read_partition(directory, name, index):
+    with open(directory / f"{name}-{index}.csv", newline="") as f:
+        yield from csv.reader(f)
+
+
+def reconcile(
+    expected_rows,
+    statement_rows,
+    on_discrepancy,
+    partitions=16,
+    distance_tolerance=1.0,
+    temp_dir=None,
+):
+    """Compare expected earnings with posted statement lines, calling on_discrepancy with each
+    Discrepancy found.
+
+    expected_rows and statement_rows are iterables of sequences in EXPECTED_FIELDS and
+    STATEMENT_FIELDS order, such as csv.reader rows without the header. Both inputs are
+    streamed into hash partitions on disk, then each partition is joined in memory, so
+    memory use is bounded by the largest partition of statement lines. Expected rows are
+    scored with Airline.calculate, with repeated segments calculated once. The whole run
+    uses the rules snapshot that was current when it started.
+    """
+
+    start = time.perf_counter()
+    snapshot = current_snapshot()
+    matched_rows = discrepancies = 0
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        directory = Path(directory)
+        expected_count = _spill(expected_rows, directory, "expected", partitions)
+        statement_count = _spill(statement_rows, directory, "statement", partitions)
+
+        for index in range(partitions):
+            # A segment posted more than once is matched on its first line, and reported as
+            # a duplicate with the number of lines posted.
+            posted = {}
+            duplicates = {}
+            for row in _read_partition(directory, "statement", index):
+                if (key := _key(row)) in posted:
+                    duplicates[key] = duplicates.get(key, 1) + 1
+                else:
+                    posted[key] = row
+            for key, count in duplicates.items():
+                on_discrepancy(Discrepancy("duplicate", *key, 1, count))
+                discrepancies += 1
+
+            for expected_row in _read_partition(directory, "expected", index):
+                key = _key(expected_row)
+                if (posted_row := posted.pop(key, None)) is None:
+                    found = [Discrepancy("missing", *key, None, None)]
+                else:
+                    matched_rows += 1
+                    found = _compare(snapshot, expected_row, posted_row, distance_tolerance)
+
+                for discrepancy in found:
+                    on_discrepancy(discrepancy)
+                    discrepancies += 1
+
+            # Anything left was posted without a matching expected segment.
+            for key in posted:
+                on_discrepancy(Discrepancy("unexpected", *key, None, None))
+                discrepancies += 1
+
+    seconds = time.perf_counter() - start
+    return ReconciliationStats(
+        expected_count,
+        statement_count,
+        matched_rows,
+        discrepancies,
+        seconds,
+        (expected_count + statement_count) / seconds if seconds else 0.0,
+    )
@@ -0,0 +1,178 @@
+from collections import namedtuple
+from functools import lru_cache
+import heapq
+from itertools import count
+
+import numpy as np
+
+from .aeroplan import FARE_BRANDS_BY_NAME, NoBrand
+from .airlines import AirCanada
+from .batch import CalculationBatch
+from .snapshot import current_snapshot
+
+
+RouteNetwork = namedtuple("RouteNetwork", ("airports", "positions", "edge_origins", "edge_destinations", "adjacency"))
+Routing = namedtuple("Routing", ("airports", "airlines", "distance", "pts", "pts_bonus", "sqm"))
+
+
+ROUTING_METRICS = ("sqm", "pts")
+
+
+def route_network(snapshot=None):
+    """Return the network of published Aeroplan distance pairs, with an edge in each direction.
+    The adjacency lists hold (destination position, edge index) pairs.
+    """
+
+    return _route_network(snapshot or current_snapshot())
+
+
+@lru_cache(maxsize=2)
+def _route_network(snapshot):
+    _airports_by_code = snapshot.airports_by_code
+
+    airports = []
+    positions = {}
+    edge_origins, edge_destinations = [], []
+    for origin_code, destinations in snapshot.distances.items():
+        for destination_code in destinations:
+            if origin_code not in _airports_by_code or destination_code not in _airports_by_code:
+                continue
+            for code in (origin_code, destination_code):
+                if code not in positions:
+                    positions[code] = len(airports)
+                    airports.append(_airports_by_code[code])
+            edge_origins.append(positions[origin_code])
+            edge_destinations.append(positions[destination_code])
+
+    adjacency = tuple([] for _ in airports)
+    for edge, (origin, destination) in enumerate(zip(edge_origins, edge_destinations)):
+        adjacency[origin].append((destination, edge))
+
+    return RouteNetwork(
+        tuple(airports),
+        positions,
+        np.array(edge_origins, dtype=np.intp),
+        np.array(edge_destinations, dtype=np.intp),
+        tuple(map(tuple, adjacency)),
+    )
+
+
+# Airlines compare by id, so the snapshot is part of the key to keep edges calculated with
+# an older version's rates from being reused.
+@lru_cache(maxsize=256)
+def _edge_calculations(snapshot, airline, fare_brand_name, fare_class, aeroplan_status):
+    network = _route_network(snapshot)
+    return CalculationBatch.from_calculations(
+        airline.calculate(
+            network.airports[origin],
+            network.airports[destination],
+            FARE_BRANDS_BY_NAME[fare_brand_name],
+            fare_class,
+            "",
+            aeroplan_status,
+        )
+        for origin, destination in zip(network.edge_origins, network.edge_destinations)
+    )
+
+
+def edge_calculations(airline, fare_brand, fare_class, aeroplan_status, snapshot=None):
+    """Return the calculations for every edge in the route network when flown on airline.
+    Partner airlines don't sell Air Canada fare brands, so they're calculated without one.
+    """
+
+    fare_brand = fare_brand if airline == AirCanada else NoBrand
+    return _edge_calculations(snapshot or current_snapshot(), airline, fare_brand.name, fare_class, aeroplan_status)
+
+
+def best_routings(
+    origin_code,
+    destination_code,
+    airlines,
+    fare_brand,
+    fare_class,
+    aeroplan_status,
+    max_stops=1,
+    metric="sqm",
+    k=5,
+):
+    """Find the k routings from origin to destination over published Aeroplan distance pairs
+    that earn the most SQM or points (including bonus points), with at most max_stops
+    connections and no repeated airports. Each segment is flown on whichever of the eligible
+    airlines earns the most for it.
+
+    This is a best-first search where each partial routing is ranked by its earnings so far
+    plus an upper bound on what the remaining segments can earn, so routings come off the
+    queue in order and the search stops after the k-th.
+    """
+
+    if metric not in ROUTING_METRICS:
+        raise ValueError(f"Unknown routing metric {metric}, expected one of {ROUTING_METRICS}.")
+
+    snapshot = current_snapshot()
+    network = route_network(snapshot)
+    if origin_code not in network.positions or destination_code not in network.positions or not airlines:
+        return []
+    origin, destination = network.positions[origin_code], network.positions[destination_code]
+
+    # Pick the best airline for each edge.
+    calculations = [edge_calculations(airline, fare_brand, fare_class, aeroplan_status, snapshot) for airline in airlines]
+    values = np.stack([
+        calc.columns["sqm"] if metric == "sqm" else calc.columns["pts"] + calc.columns["pts_bonus"]
+        for calc in calculations
+    ])
+    best_airlines = values.argmax(axis=0)
+    edge_values = values.max(axis=0)
+
+    # bounds[h][node] is the most that any walk of at most h segments from node to the
+    # destination can earn, or -inf if the destination can't be reached. Routings end at
+    # the destination, so its bound is always zero.
+    max_segments = max_stops + 1
+    bounds = np.full((max_segments + 1, len(network.airports)), -np.inf)
+    bounds[0, destination] = 0
+    for hops in range(1, max_segments + 1):
+        reachable = edge_values + bounds[hops - 1][network.edge_destinations]
+        np.maximum.at(bounds[hops], network.edge_origins, reachable)
+        bounds[hops, destination] = 0
+
+    routings = []
+    tie_breaker = count()
+    queue = [(-bounds[max_segments][origin], next(tie_breaker), 0.0, (origin,), ())]
+    while queue and len(routings) < k:
+        _, _, earned, path, edges = heapq.heappop(queue)
+        node = path[-1]
+
+        if node == destination:
+            routings.append(_routing(network, airlines, calculations, best_airlines, path, edges))
+            continue
+
+        remaining = max_segments - len(edges) - 1
+        for next_node, edge in network.adjacency[node]:
+            if next_node in path or bounds[remaining][next_node] == -np.inf:
+                continue
+            next_earned = earned + edge_values[edge]
+            heapq.heappush(queue, (
+                -(next_earned + bounds[remaining][next_node]),
+                next(tie_breaker),
+                next_earned,
+                path + (next_node,),
+                edges + (edge,),
+            ))
+
+    return routings
+
+
+def _routing(network, airlines, calculations, best_airlines, path, edges):
+    segment_airlines = tuple(airlines[best_airlines[edge]] for edge in edges)
+    segment_calculations = [
+        calculations[best_airlines[edge]][edge]
+        for edge in edges
+    ]
+
+    return Routing(
+        tuple(network.airports[node].airport_code for node in path),
+        segment_airlines,
+        sum(calc.distance for calc in segment_calculations),
+        sum(calc.pts for calc in segment_calculations),
+        sum(calc.pts_bonus for calc in segment_calculations),
+        sum(calc.sqm for calc in segment_calculations),
+    )
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+from importlib import resources
+import logging
+from pathlib import Path
+import threading
+from types import MappingProxyType
+from typing import Mapping
+
+from .airlines import AirCanada, _parse_airline_partners
+from .locations import _parse_aeroplan_distances, _parse_airports
+
+
+logger = logging.getLogger(__name__)
+
+
+SOURCES = (
+    ("ac_calc.airlines", "partners.json"),
+    ("ac_calc.locations", "airports.json"),
+    ("ac_calc.locations", "aeroplan_distances.csv"),
+)
+RECENT_SNAPSHOTS = 2
+
+
+@dataclass(frozen=True, eq=False)
+class RulesSnapshot:
+    """An immutable, compiled version of the airline, airport and distance data, identified by
+    a hash of the source files. Snapshots compare and hash by version, so they can be used to
+    key caches that should be invalidated when the data changes.
+    """
+
+    version: str
+    airlines: tuple
+    airlines_by_id: Mapping
+    airlines_by_code: Mapping
+    airports: tuple
+    airports_by_code: Mapping
+    distances: Mapping
+
+    def __eq__(self, other):
+        if not isinstance(other, RulesSnapshot):
+            return NotImplemented
+        return self.version == other.version
+
+    def __hash__(self):
+        return hash(self.version)
+
+
+def read_sources(directory=None):
+    """Return the source file contents and their combined content hash. The files are read
+    from the package, or from directory if given, such as an archived program year.
+    """
+
+    data = {
+        name: (Path(directory) / name if directory else resources.files(package).joinpath(name)).read_bytes()
+        for package, name in SOURCES
+    }
+
+    return {name: value.decode("utf8") for name, value in data.items()}, rules_version(data)
+
+
+def rules_version(data):
+    """Return the version of the rules, a hash of the source file bytes keyed by file name."""
+
+    digest = hashlib.sha256()
+    for _, name in SOURCES:
+        digest.update(name.encode())
+        digest.update(hashlib.sha256(data[name]).digest())
+
+    return digest.hexdigest()[:12]
+
+
+def build_snapshot(contents, version):
+    airlines = (AirCanada,) + _parse_airline_partners(contents["partners.json"])
+    distances = _parse_aeroplan_distances(contents["aeroplan_distances.csv"])
+    airports = _parse_airports(contents["airports.json"], distances)
+
+    return RulesSnapshot(
+        version=version,
+        airlines=airlines,
+        airlines_by_id=MappingProxyType({airline.id: airline for airline in airlines}),
+        airlines_by_code=MappingProxyType({code: airline for airline in reversed(airlines) for code in airline.codes}),
+        airports=airports,
+        airports_by_code=MappingProxyType({airport.airport_code: airport for airport in airports}),
+        distances=MappingProxyType(distances),
+    )
+
+
+_current = None
+_recent = OrderedDict()
+_lock = threading.Lock()
+
+
+def _install(snapshot):
+    # Callers hold _lock.
+    global _current
+
+    _recent[snapshot.version] = snapshot
+    while len(_recent) > RECENT_SNAPSHOTS:
+        _recent.popitem(last=False)
+    _current = snapshot
+
+
+def _swap(snapshot):
+    with _lock:
+        _install(snapshot)
+
+
+def current_snapshot():
+    """Return the current rules snapshot, building it on first use. Hold on to the returned
+    snapshot for the length of a calculation, so that a reload doesn't change the data part
+    way through.
+    """
+
+    if (snapshot := _current) is None:
+        with _lock:
+            # Installed before the lock is released, so that threads waiting on it don't
+            # build the snapshot again.
+            if (snapshot := _current) is None:
+                snapshot = build_snapshot(*read_sources())
+                _install(snapshot)
+
+    return snapshot
+
+
+def snapshot(version):
+    """Return the current or a recently replaced snapshot by version, or None."""
+
+    return _recent.get(version)
+
+
+def reload():
+    """Rebuild the snapshot if the source files have changed and atomically swap it in.
+    Returns True if a new snapshot was swapped in.
+    """
+
+    contents, version = read_sources()
+    if _current is not None and _current.version == version:
+        return False
+
+    _swap(build_snapshot(contents, version))
+    logger.info("Swapped in rules snapshot %s.", version)
+    return True
+
+
+class SnapshotWatcher(threading.Thread):
+    """Background thread that checks the source files for changes every `interval` seconds and
+    reloads the snapshot. Errors, like a half-written file, leave the current snapshot in place.
+    """
+
+    def __init__(self, interval=5.0):
+        super().__init__(name="ac-calc-snapshot-watcher", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                reload()
+            except Exception:
+                logger.exception("Couldn't reload the rules snapshot.")
+
+    def stop(self):
+        self.stopped.set()
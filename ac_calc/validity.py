@@ -0,0 +1,153 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .aeroplan import AEROPLAN_STATUSES, FARE_BRANDS, FARE_BRANDS_BY_BASIS_CODE
+from .earning_partners import FARE_CLASSES, airport_place, earning_index
+from .snapshot import current_snapshot
+
+
+# Error categories in the order they're checked. Each invalid segment gets the first that
+# applies, and 0 means valid.
+VALIDATION_ERRORS = (
+    "unknown_airline",
+    "unknown_airport",
+    "unknown_fare_brand",
+    "unknown_aeroplan_status",
+    "invalid_fare_class",
+    "class_not_sold",
+    "no_earning_rate",
+)
+ALL_FARE_CLASSES_MASK = (1 << len(FARE_CLASSES)) - 1
+
+
+FareClassValidity = namedtuple("FareClassValidity", ("airlines", "sold_masks", "rate_masks"))
+ValidationResult = namedtuple("ValidationResult", ("errors", "counts"))
+
+
+def _fare_class_mask(fare_classes):
+    return sum(1 << FARE_CLASSES.index(fare_class) for fare_class in set(fare_classes) if fare_class in FARE_CLASSES)
+
+
+def fare_class_validity(snapshot=None):
+    """Return the compiled fare class bitsets, with a bit per booking class A to Z.
+
+    sold_masks[airline, fare_brand] has the classes that the airline sells under the fare
+    brand, indexed by position in snapshot.airlines and FARE_BRANDS. Only Air Canada sells
+    fare brands, so partners sell every class under any of them. rate_masks[airline, region,
+    fare_brand] has the classes with an earning rate, indexed by position in the earning
+    index's airlines and their region codes.
+    """
+
+    return _fare_class_validity(snapshot or current_snapshot())
+
+
+@lru_cache(maxsize=2)
+def _fare_class_validity(snapshot):
+    index = earning_index(snapshot)
+
+    sold_masks = np.full((len(snapshot.airlines), len(FARE_BRANDS)), ALL_FARE_CLASSES_MASK, dtype=np.uint32)
+    for row, airline in enumerate(snapshot.airlines):
+        if airline.id == "air-canada":
+            sold_masks[row] = [_fare_class_mask(fare_brand.fare_classes) for fare_brand in FARE_BRANDS]
+
+    max_regions = max((len(names) for names in index.region_names), default=0)
+    rate_masks = np.zeros((len(index.airlines), max_regions, len(FARE_BRANDS)), dtype=np.uint32)
+    for row, (airline, names) in enumerate(zip(index.airlines, index.region_names)):
+        for region_code, region in enumerate(names):
+            for column, fare_brand in enumerate(FARE_BRANDS):
+                rate_masks[row, region_code, column] = _fare_class_mask(
+                    fare_class for fare_class in FARE_CLASSES
+                    if airline._rate_for_region(region, fare_brand, fare_class)[2]
+                )
+
+    return FareClassValidity(snapshot.airlines, sold_masks, rate_masks)
+
+
+def _codes(values, lookup):
+    """Map string values to integer codes through lookup, which is only called once per
+    distinct value. Unknown values map to -1.
+    """
+
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(""))
+    mapping = np.array([lookup(str(value).strip().upper()) for value in uniques], dtype=np.int64)
+    return mapping[codes]
+
+
+def validate_segments(columns, snapshot=None):
+    """Check feed segments for unknown airlines, airports, fare brands and statuses, invalid
+    booking classes, classes that aren't sold under the fare brand and classes without an
+    earning rate for the segment's region.
+
+    columns maps each of FEED_FIELDS to a sequence of strings, such as a DataFrame chunk of a
+    feed. Each column is factorized and only its distinct values are looked up, and the
+    class checks are bit tests against the compiled FareClassValidity. Returns a
+    ValidationResult with an int8 error code per segment, 0 for valid or the 1-based index
+    into VALIDATION_ERRORS, and the count for each error.
+    """
+
+    snapshot = snapshot or current_snapshot()
+    validity = fare_class_validity(snapshot)
+    index = earning_index(snapshot)
+
+    airline_rows = {airline: row for row, airline in enumerate(validity.airlines)}
+    rated_rows = {airline: row for row, airline in enumerate(index.airlines)}
+    fare_brand_columns = {fare_brand.name: column for column, fare_brand in enumerate(FARE_BRANDS)}
+    status_names = {status.name.upper() for status in AEROPLAN_STATUSES}
+
+    def airline_code(code):
+        airline = snapshot.airlines_by_code.get(code)
+        return -1 if airline is None else airline_rows[airline]
+
+    def place_code(code):
+        airport = snapshot.airports_by_code.get(code)
+        return -1 if airport is None else index.place_ids[airport_place(airport)]
+
+    def fare_brand_code(code):
+        fare_brand = FARE_BRANDS_BY_BASIS_CODE.get(code)
+        return -1 if fare_brand is None else fare_brand_columns[fare_brand.name]
+
+    airline = _codes(columns["airline"], airline_code)
+    origin = _codes(columns["origin"], place_code)
+    destination = _codes(columns["destination"], place_code)
+    fare_brand = _codes(columns["fare_brand"], fare_brand_code)
+    status = _codes(columns["aeroplan_status"], lambda name: 0 if name in status_names else -1)
+    fare_class = _codes(columns["fare_class"], lambda code: FARE_CLASSES.index(code) if code in FARE_CLASSES else -1)
+
+    # Rows with an unknown value use code 0 for the lookups below, and get their error from
+    # an earlier check.
+    known = (airline >= 0) & (origin >= 0) & (destination >= 0) & (fare_brand >= 0) & (fare_class >= 0)
+
+    def safe(codes):
+        return np.where(known, codes, 0)
+
+    class_bits = np.left_shift(np.uint32(1), safe(fare_class).astype(np.uint32))
+
+    sold = (validity.sold_masks[safe(airline), safe(fare_brand)] & class_bits) != 0
+
+    # Airlines that never earn have no row in the rate masks, and neither do unknown rows.
+    rated_map = np.array([rated_rows.get(airline, -1) for airline in validity.airlines], dtype=np.int64)
+    rated = np.where(known, rated_map[safe(airline)], -1)
+    has_rate = np.zeros(len(airline), dtype=bool)
+    if len(index.airlines):
+        rated_safe = np.maximum(rated, 0)
+        region = index.region_codes[rated_safe, safe(origin), safe(destination)]
+        has_rate = (rated >= 0) & ((validity.rate_masks[rated_safe, region, safe(fare_brand)] & class_bits) != 0)
+
+    checks = (
+        airline < 0,
+        (origin < 0) | (destination < 0),
+        fare_brand < 0,
+        status < 0,
+        fare_class < 0,
+        ~sold,
+        ~has_rate,
+    )
+    errors = np.zeros(len(airline), dtype=np.int8)
+    for code, failed in reversed(list(enumerate(checks, 1))):
+        errors[failed] = code
+
+    counts = np.bincount(errors, minlength=len(VALIDATION_ERRORS) + 1)
+    return ValidationResult(errors, dict(zip(VALIDATION_ERRORS, counts[1:].tolist())))
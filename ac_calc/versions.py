@@ -0,0 +1,137 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .aeroplan import DEFAULT_AEROPLAN_STATUS
+from .airlines import haversine_distance
+from .batch import calculate_earnings
+
+
+RulesVersion = namedtuple("RulesVersion", ("name", "snapshot", "old_distances"), defaults=(False,))
+PlannedSegment = namedtuple("PlannedSegment", ("airline_code", "origin_code", "destination_code", "fare_brand", "fare_class"))
+VersionComparison = namedtuple("VersionComparison", (
+    "versions",
+    "distance", "pts", "pts_bonus", "sqm", "unresolved",
+))
+
+
+COMPARISON_METRICS = ("distance", "pts", "pts_bonus", "sqm")
+
+
+def _published_distance(origin, destination, old_distances):
+    if not (distance := origin.distances.get(destination.airport_code)):
+        return None
+    if old_distances:
+        return distance.old_distance or distance.distance
+    return distance.distance or distance.old_distance
+
+
+def compare_versions(itineraries, versions, aeroplan_status=DEFAULT_AEROPLAN_STATUS):
+    """Calculate the earnings of each itinerary under several versions of the rules, such as
+    last year's snapshot and distances against this year's.
+
+    Each itinerary is a sequence of PlannedSegments, identified by codes so that they can be
+    resolved in each version. Repeated segments are calculated once, the haversine distance
+    and region of each segment are shared by every version with the same airports, and the
+    earnings for all versions are calculated together. Returns a VersionComparison with
+    itinerary x version arrays, where unresolved counts the segments with an airline or
+    airport that the version doesn't have, which earn nothing.
+
+    Only the partners' earning rates, the airports and the distances come from a version's
+    rules files. Air Canada's earning rates are defined in ac_calc.airlines and shared by
+    every snapshot, so Air Canada segments only change between versions with the distance.
+    """
+
+    versions = tuple(versions)
+
+    unique_segments = {}
+    segment_rows = []
+    itinerary_indexes = []
+    num_itineraries = 0
+    for itinerary in itineraries:
+        for segment in itinerary:
+            key = (segment.airline_code, segment.origin_code, segment.destination_code, segment.fare_brand.name, segment.fare_class)
+            segment_rows.append(unique_segments.setdefault(key, (len(unique_segments), segment))[0])
+            itinerary_indexes.append(num_itineraries)
+        num_itineraries += 1
+
+    shape = (len(unique_segments), len(versions))
+    distance = np.zeros(shape)
+    earning_rate = np.zeros(shape)
+    earns_pts = np.zeros(shape, dtype=bool)
+    earns_sqm = np.zeros(shape, dtype=bool)
+    pts_bonus_factor = np.zeros(shape)
+    unresolved = np.zeros(shape, dtype=np.int64)
+
+    # Haversine distances and regions depend on the airports, not the version's earning rates.
+    haversine_distances = {}
+    regions = {}
+    for column, version in enumerate(versions):
+        snapshot = version.snapshot
+        rates = {}
+        for row, segment in unique_segments.values():
+            airline = snapshot.airlines_by_code.get(segment.airline_code)
+            origin = snapshot.airports_by_code.get(segment.origin_code)
+            destination = snapshot.airports_by_code.get(segment.destination_code)
+            if not (airline and origin and destination):
+                unresolved[row, column] = 1
+                continue
+
+            if (segment_distance := _published_distance(origin, destination, version.old_distances)) is None:
+                key = (origin.latitude, origin.longitude, destination.latitude, destination.longitude)
+                if (segment_distance := haversine_distances.get(key)) is None:
+                    segment_distance = haversine_distances[key] = haversine_distance(origin, destination)
+            distance[row, column] = segment_distance
+
+            key = (airline.id, origin.airport_code, origin.country, origin.continent, destination.airport_code, destination.country, destination.continent)
+            if (region := regions.get(key)) is None:
+                region = regions[key] = airline._region_for_segment(origin, destination)
+
+            key = (airline, region, segment.fare_brand.name, segment.fare_class)
+            if (rate := rates.get(key)) is None:
+                rate = rates[key] = airline._rate_for_region(region, segment.fare_brand, segment.fare_class)[2]
+
+            earning_rate[row, column] = rate
+            earns_pts[row, column] = airline.earns_pts
+            earns_sqm[row, column] = airline.earns_sqm
+            pts_bonus_factor[row, column] = airline._pts_bonus_factor(aeroplan_status)
+
+    pts, pts_bonus, sqm = calculate_earnings(
+        distance,
+        earning_rate,
+        earns_pts,
+        earns_sqm,
+        pts_bonus_factor,
+        aeroplan_status.min_earning_value,
+    )
+
+    # Expand the unique segments back out and sum them into their itineraries.
+    segment_rows = np.array(segment_rows, dtype=np.intp)
+    itinerary_indexes = np.array(itinerary_indexes, dtype=np.intp)
+    totals = []
+    for values in (distance, pts, pts_bonus, sqm, unresolved):
+        total = np.zeros((num_itineraries, len(versions)), dtype=values.dtype)
+        np.add.at(total, itinerary_indexes, values[segment_rows])
+        totals.append(total)
+
+    return VersionComparison(versions, *totals)
+
+
+def delta_table(comparison, labels=None, baseline=0):
+    """Return a DataFrame with a row per itinerary and, for each metric, a column per version
+    followed by the change from the baseline version for each of the others.
+    """
+
+    names = [version.name for version in comparison.versions]
+    columns = {}
+    for metric in COMPARISON_METRICS:
+        values = getattr(comparison, metric)
+        for column, name in enumerate(names):
+            columns[f"{metric} {name}"] = values[:, column]
+        for column, name in enumerate(names):
+            if column != baseline:
+                columns[f"{metric} Δ {name}"] = values[:, column] - values[:, baseline]
+    columns["unresolved"] = comparison.unresolved.sum(axis=1)
+
+    return pd.DataFrame(columns, index=labels)
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+
+from .snapshot import current_snapshot
+
+
+def _load_snapshot():
+    # Loads the locations and compiles the airlines' earning rates.
+    current_snapshot()
+
+
+def _build_route_network():
+    from .routes import route_network
+    route_network()
+
+
+def _build_earning_index():
+    from .earning_partners import earning_index
+    earning_index()
+
+
+def _build_rate_matrix():
+    from .rate_matrix import rate_matrix
+    rate_matrix()
+
+
+WARM_UP_TASKS = (
+    _load_snapshot,
+    _build_route_network,
+    _build_earning_index,
+    _build_rate_matrix,
+)
+
+
+_executor = ThreadPoolExecutor(thread_name_prefix="ac-calc-warm-up")
+_futures = []
+_lock = threading.Lock()
+
+
+def warm_up():
+    """Start loading the reference data and compiling the earning rates in background
+    threads. Only the first call starts the work; later calls return the same futures.
+    """
+
+    with _lock:
+        if not _futures:
+            _futures.extend(_executor.submit(task) for task in WARM_UP_TASKS)
+
+    return tuple(_futures)
+
+
+def is_ready():
+    """Return True once every warm-up task has finished without errors."""
+
+    futures = tuple(_futures)
+    return bool(futures) and all(future.done() and not future.exception() for future in futures)
+
+
+def wait_until_ready(timeout=None):
+    """Start the warm-up if needed and block until it finishes. Returns False if the timeout
+    expires first, and re-raises the first error from a failed task.
+    """
+
+    done, not_done = wait(warm_up(), timeout)
+    for future in done:
+        future.result()
+
+    return not not_done
@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .aeroplan import AEROPLAN_STATUSES, FARE_BRANDS
+from .batch import calculate_earnings
+
+
+WhatIfMatrix = namedtuple("WhatIfMatrix", (
+    "aeroplan_statuses", "fare_brands",
+    "distance", "pts", "pts_bonus", "sqm",
+))
+
+
+def what_if(itineraries, aeroplan_statuses=AEROPLAN_STATUSES, fare_brands=FARE_BRANDS):
+    """Calculate the earnings of each itinerary at every Aeroplan status and fare brand.
+
+    Each itinerary is a sequence of segments with airline, origin, destination and fare_class
+    attributes. The distance and region of each segment are worked out once, and the earnings
+    are broadcast across the statuses and fare brands. Returns a WhatIfMatrix with an
+    itinerary distance vector and itinerary x status x fare brand arrays of points, bonus
+    points and SQM.
+    """
+
+    segments = []
+    itinerary_indexes = []
+    num_itineraries = 0
+    for itinerary in itineraries:
+        for segment in itinerary:
+            segments.append(segment)
+            itinerary_indexes.append(num_itineraries)
+        num_itineraries += 1
+
+    shape = (len(segments), len(aeroplan_statuses), len(fare_brands))
+
+    distance = np.zeros((len(segments), 1, 1))
+    earning_rate = np.zeros((len(segments), 1, len(fare_brands)))
+    earns_pts = np.zeros((len(segments), 1, 1), dtype=bool)
+    earns_sqm = np.zeros((len(segments), 1, 1), dtype=bool)
+    pts_bonus_factor = np.zeros((len(segments), len(aeroplan_statuses), 1))
+    min_earning_value = np.array([status.min_earning_value for status in aeroplan_statuses])[None, :, None]
+
+    for row, segment in enumerate(segments):
+        airline = segment.airline
+        distance[row] = airline._distance(segment.origin, segment.destination)
+        region = airline._region_for_segment(segment.origin, segment.destination)
+        earning_rate[row, 0] = [
+            airline._rate_for_region(region, fare_brand, segment.fare_class)[2]
+            for fare_brand in fare_brands
+        ]
+        earns_pts[row] = airline.earns_pts
+        earns_sqm[row] = airline.earns_sqm
+        pts_bonus_factor[row, :, 0] = [airline._pts_bonus_factor(status) for status in aeroplan_statuses]
+
+    pts, pts_bonus, sqm = (
+        np.broadcast_to(values, shape)
+        for values in calculate_earnings(distance, earning_rate, earns_pts, earns_sqm, pts_bonus_factor, min_earning_value)
+    )
+
+    # Sum the segments into their itineraries.
+    itinerary_indexes = np.array(itinerary_indexes, dtype=np.intp)
+    totals = []
+    for values in (distance[:, 0, 0], pts, pts_bonus, sqm):
+        total = np.zeros((num_itineraries,) + values.shape[1:], dtype=values.dtype)
+        np.add.at(total, itinerary_indexes, values)
+        totals.append(total)
+
+    return WhatIfMatrix(tuple(aeroplan_statuses), tuple(fare_brands), *totals)
@@ -1,22 +1,37 @@
 from collections import namedtuple
-from itertools import groupby
+from datetime import datetime
+import json
+import os
+from pathlib import Path
 from PIL import ImageColor
 import re
 import string
+import sys
 from textwrap import dedent
+import time
 
-import pydeck as pdk
-from pydeck.types import String
+import numpy as np
 import pandas as pd
 import streamlit as st
-from streamlit.elements.map import _get_zoom_level
 
-from ac_calc.aeroplan import Flex, NoBrand, AEROPLAN_STATUSES, DEFAULT_AEROPLAN_STATUS, DEFAULT_FARE_BRAND_INDEX, FARE_BRANDS
-from ac_calc.airlines import AirCanada, AIRLINES
-from ac_calc.locations import airports, airports_by_code
+from ac_calc.aeroplan import AeroplanStatus, FareBrand, Flex, NoBrand, AEROPLAN_STATUSES, AEROPLAN_STATUSES_BY_NAME, DEFAULT_AEROPLAN_STATUS, DEFAULT_FARE_BRAND_INDEX, FARE_BRANDS, FARE_BRANDS_BY_BASIS_CODE, FARE_BRANDS_BY_NAME
+from ac_calc.airlines import AirCanada, Airline, AIRLINES
+from ac_calc.batch import CalculationBatch, calculate_from_origin
+from ac_calc.browse import ExportedDeck, distances_table_html, earning_rates_tables, exported_page, map_deck, published_distances, published_distances_layers
+from ac_calc.earning_partners import FARE_CLASSES, earning_index, earning_partners, airport_place
+from ac_calc.locations import Airport, airports, airports_by_code
+from ac_calc.profiling import PROFILE_MODES, profile_call, write_profile
+from ac_calc.rate_matrix import RATE_KEYS, compare_rates, rate_matrix
+from ac_calc.routes import best_routings, route_network
+from ac_calc.snapshot import current_snapshot, snapshot
+from ac_calc.warmup import wait_until_ready
+from ac_calc.whatif import what_if
 
 
 Segment = namedtuple("Segment", ("airline", "origin", "destination", "fare_brand", "fare_class", "colour"))
+# Segments are kept in the session state by code, which is small and doesn't hold on to the
+# reference data of a rules snapshot that has since been reloaded.
+SegmentRecord = namedtuple("SegmentRecord", ("airline_id", "origin_code", "destination_code", "fare_brand_index", "fare_class", "colour_index"))
 
 
 SEGMENT_KEYS = ("airline", "origin", "destination", "fare_brand", "fare_class", "colour")
@@ -29,12 +44,38 @@ SEGMENT_COLOURS = (
     "#fc9650",
     "#808080",
 )
-MARKET_COLOURS = {
-    "DOM": (202, 42, 54),
-    "TNB": (34, 132, 161),
-    "SUN": (253, 192, 68),
-    "INT": (100, 100, 100),
-}
+# Approximate bytes of session state each session may hold, not counting the shared reference
+# data. Zero turns off the limit.
+SESSION_STATE_LIMIT = int(os.environ.get("AC_CALC_SESSION_STATE_LIMIT", "262144"))
+# Profile each rerun of the profiled tools, with a mode from PROFILE_MODES, or with query to
+# only profile sessions that ask for it. The profile query parameter overrides the mode for a
+# session, and 1 means sample, but only when profiling is enabled here.
+PROFILE_MODE = os.environ.get("AC_CALC_PROFILE", "")
+PROFILE_DIR = Path(os.environ.get("AC_CALC_PROFILE_DIR", "/tmp/ac-calc-profiles"))
+# Number of profiled runs whose files are kept, oldest removed first. Zero keeps them all.
+PROFILE_KEEP = int(os.environ.get("AC_CALC_PROFILE_KEEP", "50"))
+PROFILED_TOOLS = ("Calculate Points and Miles", "Browse Airlines", "Browse Airports", "Compare Airlines")
+# Widget values saved with a profile, so that the run can be replayed.
+PROFILE_INPUT_KEYS = (
+    "ticket_number", "aeroplan_status", "segments_input_style", "route", "itinerary",
+    "browse_airline", "partners_origin", "partners_destination", "partners_fare_class",
+    "browse_origin", "browse_view",
+    "heatmap_airline", "heatmap_fare_brand", "heatmap_fare_class", "heatmap_metric", "heatmap_top",
+    "show_segments_map", "show_calculation_details", "show_earning_rates", "show_browse_map", "show_distances_table",
+    "compare_keys", "compare_regions", "compare_airlines",
+)
+# Cowculator itineraries are calculated this many lines at a time, updating the totals and
+# segments table at most every ITINERARY_UPDATE_SECONDS, and only the first ITINERARY_LIMIT
+# lines are calculated.
+ITINERARY_CHUNK_LINES = int(os.environ.get("AC_CALC_ITINERARY_CHUNK_LINES", "50"))
+ITINERARY_LIMIT = int(os.environ.get("AC_CALC_ITINERARY_LIMIT", "1000"))
+ITINERARY_UPDATE_SECONDS = 0.1
+ITINERARY_ERRORS_SHOWN = 10
+# Directory of the browse pages exported by scripts/export_browse_pages.py. The pages are
+# served from there while they match the rules version.
+EXPORT_DIR = os.environ.get("AC_CALC_EXPORT_DIR", "")
+# Reference data types that session state values share with every other session.
+SHARED_TYPES = (AeroplanStatus, Airline, Airport, FareBrand)
 
 
 def main():
@@ -48,10 +89,17 @@ def main():
         }
     )
 
+    # The warm-up is normally started by apps/serve.py before the first session arrives.
+    with st.spinner("Loading reference data…"):
+        wait_until_ready()
+
     tools = {
         "Calculate Points and Miles": calculate_points_miles,
+        "What-If Matrix": what_if_matrix,
+        "Best Mileage Run": best_mileage_run,
         "Browse Airlines": browse_airlines,
         "Browse Airports": browse_airports,
+        "Compare Airlines": compare_airlines,
     }
 
     with st.sidebar:
@@ -90,19 +138,189 @@ def main():
         )
 
     tool = tools[tool_title]
-    tool(tool_title)
+    if (profile_mode := _profile_mode()) and tool_title in PROFILED_TOOLS:
+        _profile_tool(tool, tool_title, profile_mode)
+    else:
+        tool(tool_title)
 
+    _remove_stale_keys(tool == calculate_points_miles)
 
-def calculate_points_miles(title):
+
+def _profile_mode():
+    if not PROFILE_MODE:
+        return None
+    mode = st.experimental_get_query_params().get("profile", [PROFILE_MODE])[0]
+    return "sample" if mode == "1" else mode if mode in PROFILE_MODES else None
+
+
+def _json_value(value):
+    # Reference data is saved by its code, id or name.
+    if isinstance(value, Airline):
+        return value.id
+    elif isinstance(value, Airport):
+        return value.airport_code
+    elif isinstance(value, (AeroplanStatus, FareBrand)):
+        return value.name
+    elif isinstance(value, (tuple, list)):
+        return [_json_value(item) for item in value]
+    return value
+
+
+def _profile_tool(tool, tool_title, mode):
+    _, profiler = profile_call(tool, tool_title, mode=mode)
+
+    inputs = {
+        "tool": tool_title,
+        "rules_version": current_snapshot().version,
+        "segments": [record._asdict() for record in st.session_state.get("segments", ())],
+        "widgets": {key: _json_value(st.session_state[key]) for key in PROFILE_INPUT_KEYS if key in st.session_state},
+    }
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = PROFILE_DIR / f"{datetime.now():%Y%m%d-%H%M%S-%f}-{tool.__name__}"
+    paths = write_profile(profiler, stem, tool_title)
+    inputs_path = stem.with_suffix(".inputs.json")
+    inputs_path.write_text(json.dumps(inputs, indent=2))
+    files = [(path.name, path.read_bytes()) for path in (*paths, inputs_path)]
+    _prune_profiles()
+
+    with st.sidebar:
+        st.markdown("<hr />", unsafe_allow_html=True)
+        st.caption(f"Profiled this run of {tool_title} in {mode} mode. Replay it with scripts/replay_profile.py.")
+        for name, data in files:
+            st.download_button(f"⬇️ {name.split('-', 3)[-1]}", data, file_name=name)
+
+
+def _prune_profiles():
+    # Each run's files start with its timestamp, so the oldest runs sort first.
+    if not PROFILE_KEEP:
+        return
+    runs = {}
+    for path in PROFILE_DIR.iterdir():
+        runs.setdefault(path.name[:len("YYYYmmdd-HHMMSS-ffffff")], []).append(path)
+    for run in sorted(runs)[:-PROFILE_KEEP]:
+        for path in runs[run]:
+            path.unlink(missing_ok=True)
+
+
+def _segment_record(segment):
+    return SegmentRecord(
+        segment.airline.id,
+        segment.origin.airport_code if segment.origin else None,
+        segment.destination.airport_code if segment.destination else None,
+        FARE_BRANDS.index(segment.fare_brand),
+        segment.fare_class,
+        SEGMENT_COLOURS.index(segment.colour),
+    )
+
+
+def _session_segments():
     # Get the stored segment data. We can't rely on the component session states,
     # because they are removed if the component isn't present anymore, like when
     # switching between tools.
     if not "segments" in st.session_state:
-        st.session_state["segments"] = segments = (Segment(
-            AirCanada, airports_by_code()["YYC"], airports_by_code()["YYZ"], Flex, "M", "#d62c35",
-        ),)
-    else:
-        segments = st.session_state["segments"]
+        st.session_state["segments"] = (SegmentRecord(AirCanada.id, "YYC", "YYZ", FARE_BRANDS.index(Flex), "M", 0),)
+
+    return _resolve_records(current_snapshot(), st.session_state["segments"])
+
+
+def _resolve_records(rules, records):
+    # Segments with an airline or airport that a reload removed are dropped.
+    return tuple(
+        Segment(
+            rules.airlines_by_id[record.airline_id],
+            rules.airports_by_code[record.origin_code],
+            rules.airports_by_code[record.destination_code],
+            FARE_BRANDS[record.fare_brand_index],
+            record.fare_class,
+            SEGMENT_COLOURS[record.colour_index],
+        )
+        for record in records
+        if record.airline_id in rules.airlines_by_id
+        and record.origin_code in rules.airports_by_code
+        and record.destination_code in rules.airports_by_code
+    )
+
+
+def _state_size(value):
+    """Return the approximate bytes held by a session state value, without the reference data
+    that it shares with other sessions.
+    """
+
+    if isinstance(value, SHARED_TYPES):
+        return 0
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list, set, frozenset)):
+        size += sum(_state_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_state_size(key) + _state_size(item) for key, item in value.items())
+    return size
+
+
+def session_state_size():
+    """Return the approximate bytes held by this session's state."""
+
+    return sum(_state_size(key) + _state_size(st.session_state[key]) for key in st.session_state)
+
+
+def _store_segments(segments):
+    """Store the segments for the next run, keeping as many as fit in the session's memory
+    limit, and return the stored segments.
+    """
+
+    # Segments with an airport code that isn't known, like a typo in a route, aren't stored.
+    if unknown := sum(not (segment.origin and segment.destination) for segment in segments):
+        st.warning(f"Left out {unknown} segment{'s' if unknown > 1 else ''} with an unknown airport.")
+        segments = tuple(segment for segment in segments if segment.origin and segment.destination)
+
+    records = tuple(_segment_record(segment) for segment in segments)
+    if SESSION_STATE_LIMIT:
+        st.session_state["segments"] = ()
+        available = SESSION_STATE_LIMIT - session_state_size()
+        kept = 0
+        for record in records:
+            available -= _state_size((record,)) - _state_size(())
+            if available < 0:
+                break
+            kept += 1
+        if kept < len(records):
+            st.warning(f"Only the first {kept} segments fit in this session's {SESSION_STATE_LIMIT // 1024} KB of memory.")
+            records = records[:kept]
+
+    st.session_state["segments"] = records
+    return segments[:len(records)]
+
+
+def _is_segment_input_key(key):
+    name, _, index = key.rpartition("-")
+    return key in SEGMENT_KEYS or key in ("route", "itinerary") or (name in SEGMENT_KEYS and index.isdigit())
+
+
+def _segment_input_keys(input_style, num_segments):
+    if input_style == "Simple Route":
+        return {*SEGMENT_KEYS, "route"}
+    elif input_style == "Detailed Route":
+        return {f"{key}-{index}" for key in SEGMENT_KEYS for index in range(num_segments)}
+    elif input_style == "Cowculator":
+        return {"itinerary"}
+    return set()
+
+
+def _remove_stale_keys(segments_input_shown):
+    # The segment inputs are unpacked from the stored segments whenever their keys are
+    # missing, so the keys of input styles and segments that aren't shown are removed rather
+    # than kept around in every idle session.
+    live_keys = set()
+    if segments_input_shown:
+        live_keys = _segment_input_keys(st.session_state["segments_input_style"], len(st.session_state.get("segments", ())))
+
+    for key in list(st.session_state):
+        if _is_segment_input_key(key) and key not in live_keys:
+            del st.session_state[key]
+
+
+def calculate_points_miles(title):
+    segments = _session_segments()
 
     st.markdown("""
         <style>
@@ -114,6 +332,7 @@ def calculate_points_miles(title):
 
     # Reserve space for the calculation summary and segments map.
     summary_col, map_col = st.columns([10, 18])
+    summary = summary_col.empty()
 
     # Iterate through the segments and present input widgets for the fields.
     # Collect the return field values and construct modified Segment tuples
@@ -126,8 +345,8 @@ def calculate_points_miles(title):
 
         if input_style == "Simple Route":
             # Unpack the segment data into the session state, if needed.
-            first_segment_dict = segments[0]._asdict()
-            for key in Segment._fields:
+            first_segment_dict = segments[0]._asdict() if segments else {}
+            for key in first_segment_dict:
                 if key == "route":
                     continue
                 if not key in st.session_state:
@@ -300,211 +519,292 @@ def calculate_points_miles(title):
                 help="Flight itinerary with airline,origin,destination,fare class,brand code per line.",
             )
 
-            # Form new Segments from the itinerary.
-            for line in itinerary.strip().split("\n"):
-                line = line.strip()
-                if not line:
-                    continue
-
-                parts = line.split(",")
-                if len(parts) == 5:
-                    airline_code, origin_airport_code, destination_airport_code, fare_class, fare_brand_code = parts
-                elif len(parts) == 4:
-                    airline_code, origin_airport_code, destination_airport_code, fare_class = parts
-                    fare_brand_code = ""
-                else:
-                    st.error(f"Line does not have 4 or 5 parts: {line}")
-
+            # Form new Segments from the itinerary, up to the limit of lines per rerun. Lines
+            # that can't be parsed are collected and shown together.
+            lines = [(number, line.strip()) for number, line in enumerate(itinerary.split("\n"), 1) if line.strip()]
+            errors = []
+            for number, line in lines[:ITINERARY_LIMIT]:
                 try:
-                    modified_segments.append(Segment(
-                        next(filter(lambda airline: airline_code in airline.codes, AIRLINES)),
-                        airports_by_code()[origin_airport_code],
-                        airports_by_code()[destination_airport_code],
-                        next(filter(lambda fare_brand: fare_brand_code in fare_brand.basis_codes, FARE_BRANDS)),
-                        fare_class,
-                        SEGMENT_COLOURS[len(modified_segments) % len(SEGMENT_COLOURS)],
-                    ))
-                except:
-                    st.error(f"Error parsing line: {line}")
+                    modified_segments.append(_parse_itinerary_line(line, len(modified_segments)))
+                except ValueError as e:
+                    errors.append(f"Line {number}: {e}: `{line}`")
+            if len(lines) > ITINERARY_LIMIT:
+                errors.append(f"Only the first {ITINERARY_LIMIT} lines are calculated, {len(lines) - ITINERARY_LIMIT} more were skipped.")
+            _itinerary_errors(errors)
+
+            # Filled in as the segments are calculated.
+            segments_table = st.empty()
 
         # Store the modified segments for the next loop.
-        segments = tuple(modified_segments)
-        st.session_state["segments"] = segments
+        segments = _store_segments(tuple(modified_segments))
 
         # If a segment was added or removed, rerun the app to update the input components.
         if should_rerun:
             st.experimental_rerun()
 
     # Calculate all the things for the segments.
-    calculations = [
+    records = st.session_state["segments"]
+    rules_version = current_snapshot().version
+    if input_style == "Cowculator":
+        calculations = _stream_calculations(rules_version, records, summary, segments_table)
+    else:
+        calculations = _calculate_segments(rules_version, records, st.session_state.ticket_number, st.session_state.aeroplan_status.name)
+
+    # The map and the calculation details are only built when they're shown.
+    show_map = st.checkbox("🗺 Show Map", key="show_segments_map")
+
+    # Show the calculation summary.
+    if len(segments) < 1:
+        summary.info("No segments.")
+        return
+
+    summary.markdown(_summary_html(*calculations.totals(), len(segments)), unsafe_allow_html=True)
+
+    # Show the map.
+    if show_map:
+        with map_col:
+            _render_map(*_segments_map_layers(rules_version, records, tuple(calc.distance for calc in calculations)), height=340)
+
+    # Show the calculation details.
+    if st.checkbox("📋 Show Calculation Details", key="show_calculation_details"):
+        st.markdown(_calculation_details_html(rules_version, records, st.session_state.ticket_number, st.session_state.aeroplan_status.name), unsafe_allow_html=True)
+
+
+def _parse_itinerary_line(line, index):
+    """Return the Segment for a Cowculator itinerary line, or raise ValueError."""
+
+    rules = current_snapshot()
+    parts = [part.strip() for part in line.split(",")]
+    if len(parts) not in (4, 5):
+        raise ValueError("Line does not have 4 or 5 parts")
+    airline_code, origin_airport_code, destination_airport_code, fare_class, fare_brand_code = (*parts, "")[:5]
+
+    if (airline := rules.airlines_by_code.get(airline_code)) is None:
+        raise ValueError(f"Unknown airline {airline_code}")
+    if (origin := rules.airports_by_code.get(origin_airport_code)) is None:
+        raise ValueError(f"Unknown airport {origin_airport_code}")
+    if (destination := rules.airports_by_code.get(destination_airport_code)) is None:
+        raise ValueError(f"Unknown airport {destination_airport_code}")
+    if (fare_brand := FARE_BRANDS_BY_BASIS_CODE.get(fare_brand_code)) is None:
+        raise ValueError(f"Unknown brand code {fare_brand_code}")
+
+    return Segment(airline, origin, destination, fare_brand, fare_class, SEGMENT_COLOURS[index % len(SEGMENT_COLOURS)])
+
+
+def _itinerary_errors(errors):
+    if not errors:
+        return
+
+    shown = errors[:ITINERARY_ERRORS_SHOWN]
+    more = f"\n\n…and {len(errors) - len(shown)} more." if len(errors) > len(shown) else ""
+    st.error(f"{len(errors)} itinerary lines could not be calculated:\n\n" + "\n".join(f"- {error}" for error in shown) + more)
+
+
+def _stream_calculations(rules_version, records, summary, segments_table):
+    """Calculate the segments a chunk of ITINERARY_CHUNK_LINES at a time, showing the running
+    totals in the summary and the calculated segments in the table as they're done. Chunks
+    are cached on their own, so an edit only recalculates the chunks it touches, and a rerun
+    for newer input stops the calculation at the next update.
+    """
+
+    ticket_number = st.session_state.ticket_number
+    aeroplan_status_name = st.session_state.aeroplan_status.name
+    batches = []
+    updated_at = time.perf_counter()
+    for start in range(0, len(records), ITINERARY_CHUNK_LINES):
+        batches.append(_calculate_segments(rules_version, records[start:start + ITINERARY_CHUNK_LINES], ticket_number, aeroplan_status_name))
+
+        # Cached chunks come back quickly, so only the slow ones are worth showing partly done.
+        # Records that don't resolve have no calculation, so the table gets the records covered
+        # so far rather than as many as were calculated.
+        covered = start + ITINERARY_CHUNK_LINES
+        if covered < len(records) and time.perf_counter() - updated_at >= ITINERARY_UPDATE_SECONDS:
+            calculations = CalculationBatch.concatenate(batches)
+            summary.markdown(_summary_html(*calculations.totals(), len(calculations)), unsafe_allow_html=True)
+            segments_table.dataframe(_segments_frame(rules_version, records[:covered], calculations))
+            updated_at = time.perf_counter()
+
+    calculations = CalculationBatch.concatenate(batches)
+    if records:
+        segments_table.dataframe(_segments_frame(rules_version, records, calculations))
+    else:
+        segments_table.empty()
+    return calculations
+
+
+def _segments_frame(rules_version, records, calculations):
+    rules = snapshot(rules_version) or current_snapshot()
+    segments = _resolve_records(rules, records)
+    segments_df = pd.DataFrame({
+        "Airline": [segment.airline.codes[0] for segment in segments],
+        "Route": [f"{segment.origin.airport_code}–{segment.destination.airport_code}" for segment in segments],
+        "Class": [segment.fare_class for segment in segments],
+        "Brand": [segment.fare_brand.name if segment.airline == AirCanada else "" for segment in segments],
+        "Distance": calculations.columns["distance"].round().astype(int),
+        "SQM": calculations.columns["sqm"],
+        "Points": calculations.columns["pts"],
+        "Bonus Points": calculations.columns["pts_bonus"],
+    })
+    segments_df.index += 1
+    return segments_df
+
+
+# The heavy sections are cached by the stored segment records and the rules version, so that
+# showing them again, or rerunning with the same segments, is free.
+@st.experimental_memo(max_entries=256, show_spinner=False)
+def _calculate_segments(rules_version, records, ticket_number, aeroplan_status_name):
+    rules = snapshot(rules_version) or current_snapshot()
+    return CalculationBatch.from_calculations(
         segment.airline.calculate(
             segment.origin,
             segment.destination,
             segment.fare_brand,
             segment.fare_class,
-            st.session_state.ticket_number,
-            st.session_state.aeroplan_status,
+            ticket_number,
+            AEROPLAN_STATUSES_BY_NAME[aeroplan_status_name],
         )
-        for segment in segments
-    ]
+        for segment in _resolve_records(rules, records)
+    )
 
-    total_distance = sum((calc.distance for calc in calculations))
-    base_pts = sum((calc.pts for calc in calculations))
-    bonus_pts = sum((calc.pts_bonus for calc in calculations))
-    total_sqm = sum((calc.sqm for calc in calculations))
 
-    # Show the calculation summary.
-    with summary_col:
-        if len(segments) < 1:
-            st.info("No segments.")
-            return
+@st.experimental_memo(max_entries=256, show_spinner=False)
+def _summary_html(total_distance, base_pts, bonus_pts, total_sqm, num_segments):
+    summary_code = dedent("""
+    <style>
+        #calc-summary { position: relative; height: 340px }
+
+        #sqx { display: flex; flex-direction: row; justify-content: space-around; max-height: 180px }
+        #sqx > div:before { content: ""; float: left; padding-top: 100% }
+        #sqx > div {
+            display: flex; flex: 1 0 auto; margin: 0 3%;
+            width: 28%; height: auto;
+            align-items: center; justify-content: center; text-align: center;
+            border: .375rem solid #d62c35; border-radius: 50%;
+            background-color: #f9f8f6;
+            font-size: 1.666vw; line-height: 1.125; font-weight: 600;
+        }
+        #sqx abbr { display: block; font-weight: 500; font-size: .833vw; text-decoration: none }
+    </style>
+    """)
+
+    summary_code += '<div id="calc-summary">'
+
+    summary_code += dedent(f"""
+    <div id="sqx">
+        <div><div>{total_sqm} <abbr title="Status Qualifying Miles">SQM</abbr></div></div>
+        <div><div>{num_segments} <abbr title="Status Qualifying Segments">SQS</abbr></div></div>
+        <div><div>0 <abbr title="Status Qualifying Dollars">SQD</abbr></div></div>
+    </div>
+    """)
+
+    summary_df = pd.DataFrame(((
+        f"{total_distance} miles",
+        base_pts,
+        bonus_pts,
+        f"{base_pts + bonus_pts} points",
+    )), index=(
+        "Total Distance",
+        "Aeroplan Base Points",
+        "Bonus Points Select Privilege",
+        "Aeroplan Base + Bonus Points"
+    ))
+    summary_df = summary_df.style.set_table_styles((
+        {
+            "selector": "",  # table
+            "props": "position: absolute; bottom: 0; width: 100%",
+        },
+        {
+            "selector": "thead",
+            "props": "display: none",
+        },
+        {
+            "selector": "tbody th",
+            "props": "border: 0; padding: .25rem .5rem; background-color: #4a4f55; color: #f8fafd; font-weight: 500"
+        },
+        {
+            "selector": "tbody td",
+            "props": "border-color: #dbdfe5; padding: .25rem .5rem; color: #333; text-align: right"
+        },
+        {
+            "selector": "tbody td.row0",
+            "props": "color: #000; font-weight: 600; background-color: #f9f8f6"
+        },
+        {
+            "selector": "tbody td.row3",
+            "props": "color: #000; font-weight: 600; background-color: #efefef"
+        },
 
-        summary_code = dedent("""
-        <style>
-            #calc-summary { position: relative; height: 340px }
-
-            #sqx { display: flex; flex-direction: row; justify-content: space-around; max-height: 180px }
-            #sqx > div:before { content: ""; float: left; padding-top: 100% }
-            #sqx > div {
-                display: flex; flex: 1 0 auto; margin: 0 3%;
-                width: 28%; height: auto;
-                align-items: center; justify-content: center; text-align: center;
-                border: .375rem solid #d62c35; border-radius: 50%;
-                background-color: #f9f8f6;
-                font-size: 1.666vw; line-height: 1.125; font-weight: 600;
-            }
-            #sqx abbr { display: block; font-weight: 500; font-size: .833vw; text-decoration: none }
-        </style>
-        """)
-
-        summary_code += '<div id="calc-summary">'
-
-        summary_code += dedent(f"""
-        <div id="sqx">
-            <div><div>{total_sqm} <abbr title="Status Qualifying Miles">SQM</abbr></div></div>
-            <div><div>{len(segments)} <abbr title="Status Qualifying Segments">SQS</abbr></div></div>
-            <div><div>0 <abbr title="Status Qualifying Dollars">SQD</abbr></div></div>
-        </div>
-        """)
-
-        summary_df = pd.DataFrame(((
-            f"{total_distance} miles",
-            base_pts,
-            bonus_pts,
-            f"{base_pts + bonus_pts} points",
-        )), index=(
-            "Total Distance",
-            "Aeroplan Base Points",
-            "Bonus Points Select Privilege",
-            "Aeroplan Base + Bonus Points"
-        ))
-        summary_df = summary_df.style.set_table_styles((
-            {
-                "selector": "",  # table
-                "props": "position: absolute; bottom: 0; width: 100%",
-            },
-            {
-                "selector": "thead",
-                "props": "display: none",
-            },
-            {
-                "selector": "tbody th",
-                "props": "border: 0; padding: .25rem .5rem; background-color: #4a4f55; color: #f8fafd; font-weight: 500"
-            },
-            {
-                "selector": "tbody td",
-                "props": "border-color: #dbdfe5; padding: .25rem .5rem; color: #333; text-align: right"
-            },
-            {
-                "selector": "tbody td.row0",
-                "props": "color: #000; font-weight: 600; background-color: #f9f8f6"
-            },
-            {
-                "selector": "tbody td.row3",
-                "props": "color: #000; font-weight: 600; background-color: #efefef"
-            },
+    ))
+    summary_code += summary_df.to_html()
 
-        ))
-        summary_code += summary_df.to_html()
+    summary_code += "</div>"
 
-        summary_code += "</div>"
+    return summary_code
 
-        st.markdown(summary_code, unsafe_allow_html=True)
 
-    # Show the map.
-    with map_col:
-        arclayer_and_textlayer_data = [
+@st.experimental_memo(max_entries=256, show_spinner=False)
+def _segments_map_layers(rules_version, records, distances):
+    segments = _resolve_records(snapshot(rules_version) or current_snapshot(), records)
+    arclayer_and_textlayer_data = [
+        {
+            "tooltip": f'<div><strong>{segment.destination.city}</strong> {segment.destination.airport_code}</div><div style="font-size: .833rem">{segment.destination.airport}<br />{distance} miles</div>',
+            "source_position": (segment.origin.longitude, segment.origin.latitude),
+            "target_position": (segment.destination.longitude, segment.destination.latitude),
+            "source_colour": ImageColor.getrgb(segment.colour),
+            "target_colour": [c * .85 for c in ImageColor.getrgb(segment.colour)],
+            "text": segment.destination.airport_code,
+            "position": (segment.destination.longitude, segment.destination.latitude),
+        }
+        for segment, distance in zip(segments, distances)
+    ]
+
+    first_segment = segments[0]
+    iconlayer_data = [
+        {
+            "tooltip": f'<div><strong>{first_segment.origin.city}</strong> {first_segment.origin.airport_code}</div><div style="font-size: .833rem">{first_segment.origin.airport}</div>',
+            "marker": "airplane",
+            "position": (first_segment.origin.longitude, first_segment.origin.latitude),
+            "size": 48,
+        },
+        *[
             {
-                "tooltip": f'<div><strong>{segment.destination.city}</strong> {segment.destination.airport_code}</div><div style="font-size: .833rem">{segment.destination.airport}<br />{calc.distance} miles</div>',
-                "source_position": (segment.origin.longitude, segment.origin.latitude),
-                "target_position": (segment.destination.longitude, segment.destination.latitude),
-                "source_colour": ImageColor.getrgb(segment.colour),
-                "target_colour": [c * .85 for c in ImageColor.getrgb(segment.colour)],
-                "text": segment.destination.airport_code,
+                "tooltip": f'<div><strong>{segment.destination.city}</strong> {segment.destination.airport_code}</div><div style="font-size: .833rem">{segment.destination.airport}<br />{distance} miles</div>',
+                "marker": f"{segment.destination.market.lower() if segment.destination.market else 'int'}-airport",
                 "position": (segment.destination.longitude, segment.destination.latitude),
+                "size": 56,
             }
-            for segment, calc in zip(segments, calculations)
+            for segment, distance in zip(segments, distances)
         ]
+    ]
 
-        first_segment = segments[0]
-        iconlayer_data = [
-            {
-                "tooltip": f'<div><strong>{first_segment.origin.city}</strong> {first_segment.origin.airport_code}</div><div style="font-size: .833rem">{first_segment.origin.airport}</div>',
-                "marker": "airplane",
-                "position": (first_segment.origin.longitude, first_segment.origin.latitude),
-                "size": 48,
-            },
-            *[
-                {
-                    "tooltip": f'<div><strong>{segment.destination.city}</strong> {segment.destination.airport_code}</div><div style="font-size: .833rem">{segment.destination.airport}<br />{calc.distance} miles</div>',
-                    "marker": f"{segment.destination.market.lower() if segment.destination.market else 'int'}-airport",
-                    "position": (segment.destination.longitude, segment.destination.latitude),
-                    "size": 56,
-                }
-                for segment, calc in zip(segments, calculations)
-            ]
-        ]
+    return arclayer_and_textlayer_data, arclayer_and_textlayer_data, iconlayer_data
 
-        _render_map(arclayer_and_textlayer_data, arclayer_and_textlayer_data, iconlayer_data, height=340)
 
-    # Show the calculation details.
-    calculations_data = [
-        (
-            segment.airline.name,
-            f"{segment.origin.airport_code}–{segment.destination.airport_code}",
-            "" if calc.region == "*" else calc.region,
-            calc.distance,
-            segment.fare_brand.name if segment.fare_brand != NoBrand else calc.service,
-            segment.fare_class,
-            f"{round(calc.sqm_earning_rate * 100)}%",
-            calc.sqm,
-            0,
-            f"{round(calc.pts_earning_rate * 100)}%",
-            calc.pts,
-            f"{round(calc.pts_bonus_factor * 100)}%",
-            calc.pts_bonus,
-            calc.pts + calc.pts_bonus,
-        )
-        for segment, calc in zip(segments, calculations)
-    ]
-    calculations_cols = pd.MultiIndex.from_tuples([
-        ("Flight", "Airline"),
-        ("Flight", "Route"),
-        ("Flight", "Region"),
-        ("Flight", "Distance"),
-        ("Fare", "Service"),
-        ("Fare", "Class"),
-        ("Status Qualifying", "Rate"),
-        ("Status Qualifying", "Miles"),
-        ("Status Qualifying", "Dollars"),
-        ("Aeroplan", "Rate"),
-        ("Aeroplan", "Points"),
-        ("Aeroplan", "Bonus Rate"),
-        ("Aeroplan", "Bonus Points"),
-        ("Aeroplan", "Total Points"),
-    ])
-
-    calculations_df = pd.DataFrame(calculations_data, columns=calculations_cols)
+@st.experimental_memo(max_entries=256, show_spinner=False)
+def _calculation_details_html(rules_version, records, ticket_number, aeroplan_status_name):
+    segments = _resolve_records(snapshot(rules_version) or current_snapshot(), records)
+    calculations = _calculate_segments(rules_version, records, ticket_number, aeroplan_status_name)
+
+    calculations_df = calculations.to_pandas()
+    calculations_df = pd.DataFrame({
+        ("Flight", "Airline"): [segment.airline.name for segment in segments],
+        ("Flight", "Route"): [f"{segment.origin.airport_code}–{segment.destination.airport_code}" for segment in segments],
+        ("Flight", "Region"): calculations_df["region"].cat.rename_categories(lambda region: "" if region == "*" else region),
+        ("Flight", "Distance"): [calc.distance for calc in calculations],
+        ("Fare", "Service"): [
+            segment.fare_brand.name if segment.fare_brand != NoBrand else service
+            for segment, service in zip(segments, calculations_df["service"])
+        ],
+        ("Fare", "Class"): [segment.fare_class for segment in segments],
+        ("Status Qualifying", "Rate"): _format_rates(calculations_df["sqm_earning_rate"]),
+        ("Status Qualifying", "Miles"): calculations_df["sqm"],
+        ("Status Qualifying", "Dollars"): 0,
+        ("Aeroplan", "Rate"): _format_rates(calculations_df["pts_earning_rate"]),
+        ("Aeroplan", "Points"): calculations_df["pts"],
+        ("Aeroplan", "Bonus Rate"): _format_rates(calculations_df["pts_bonus_factor"]),
+        ("Aeroplan", "Bonus Points"): calculations_df["pts_bonus"],
+        ("Aeroplan", "Total Points"): calculations_df["pts"] + calculations_df["pts_bonus"],
+    })
 
     calculations_df.index += 1
     calculations_df = calculations_df.style.set_table_styles((
@@ -573,7 +873,127 @@ def calculate_points_miles(title):
         ],
     ))
 
-    st.markdown(calculations_df.to_html(), unsafe_allow_html=True)
+    return calculations_df.to_html()
+
+
+def what_if_matrix(title):
+    segments = _session_segments()
+    if len(segments) < 1:
+        st.info("No segments. Add segments with the Calculate Points and Miles tool.")
+        return
+
+    route = ", ".join(
+        f"{segment.airline.codes[0]} {segment.origin.airport_code}–{segment.destination.airport_code} {segment.fare_class}"
+        for segment in segments
+    )
+    st.markdown(f'<div style="font-size:1.666rem">{route}</div>', unsafe_allow_html=True)
+    st.markdown("Earnings for the segments from **Calculate Points and Miles** at each Aeroplan status and fare brand. Fare brands only apply to Air Canada flights.")
+
+    matrix = what_if((segments,))
+    index = [status.name for status in matrix.aeroplan_statuses]
+    columns = [fare_brand.name for fare_brand in matrix.fare_brands]
+
+    st.markdown("#### Aeroplan Base + Bonus Points")
+    st.table(pd.DataFrame(matrix.pts[0] + matrix.pts_bonus[0], index=index, columns=columns))
+
+    st.markdown("#### Status Qualifying Miles")
+    st.table(pd.DataFrame(matrix.sqm[0], index=index, columns=columns))
+
+
+def best_mileage_run(title):
+    network_airports = sorted(route_network().airports, key=lambda airport: (airport.city or "", airport.airport_code))
+    airport_label = lambda airport: f"{airport.city} {airport.airport_code}" if airport.city else airport.airport_code
+    airport_index = lambda code: next(index for index, airport in enumerate(network_airports) if airport.airport_code == code)
+
+    origin_col, destination_col, stops_col, metric_col, k_col = st.columns((24, 24, 12, 24, 12))
+    origin = origin_col.selectbox(
+        "Origin 🛫",
+        network_airports,
+        index=airport_index("YYC"),
+        format_func=airport_label,
+        help="Airports with published Aeroplan distances.",
+    )
+    destination = destination_col.selectbox(
+        "Destination 🛬",
+        network_airports,
+        index=airport_index("YYZ"),
+        format_func=airport_label,
+        help="Airports with published Aeroplan distances.",
+    )
+    max_stops = stops_col.number_input("Max Stops", min_value=0, max_value=4, value=2)
+    metric = metric_col.selectbox(
+        "Maximize 📈",
+        ("sqm", "pts"),
+        format_func=lambda metric: "Status Qualifying Miles" if metric == "sqm" else "Aeroplan Base + Bonus Points",
+    )
+    k = k_col.number_input("Routings", min_value=1, max_value=25, value=5)
+
+    airlines_col, fare_brand_col, fare_class_col = st.columns((60, 24, 12))
+    airlines = airlines_col.multiselect(
+        "Airlines ✈️",
+        AIRLINES,
+        default=[AirCanada],
+        format_func=lambda airline: airline.name,
+        help="Eligible operating airlines. Each segment uses whichever earns the most.",
+    )
+    fare_brand = fare_brand_col.selectbox(
+        "Service 🍷",
+        FARE_BRANDS,
+        index=DEFAULT_FARE_BRAND_INDEX,
+        format_func=lambda brand: brand.name,
+        help="Air Canada fare brand. Partner airlines are calculated by class only.",
+    )
+    fare_class = fare_class_col.selectbox(
+        "Class 🎫",
+        list(string.ascii_uppercase) if fare_brand == NoBrand else fare_brand.fare_classes,
+    )
+
+    routings = best_routings(
+        origin.airport_code,
+        destination.airport_code,
+        airlines,
+        fare_brand,
+        fare_class,
+        st.session_state.aeroplan_status,
+        max_stops=max_stops,
+        metric=metric,
+        k=k,
+    )
+    if not routings:
+        st.info("No routings over published Aeroplan distances.")
+        return
+
+    arclayer_data = [
+        {
+            "tooltip": f"<div><strong>{'–'.join(routing.airports)}</strong></div><div style=\"font-size: .833rem\">{routing.sqm} SQM<br />{routing.pts + routing.pts_bonus} points</div>",
+            "source_position": (segment_origin.longitude, segment_origin.latitude),
+            "target_position": (segment_destination.longitude, segment_destination.latitude),
+            "source_colour": ImageColor.getrgb(SEGMENT_COLOURS[index % len(SEGMENT_COLOURS)]),
+            "target_colour": [c * .85 for c in ImageColor.getrgb(SEGMENT_COLOURS[index % len(SEGMENT_COLOURS)])],
+        }
+        for index, routing in reversed(list(enumerate(routings)))
+        for segment_origin, segment_destination in zip(
+            (airports_by_code()[code] for code in routing.airports[:-1]),
+            (airports_by_code()[code] for code in routing.airports[1:]),
+        )
+    ]
+    _render_map(arclayer_data, height=400)
+
+    routings_df = pd.DataFrame({
+        "Routing": ["–".join(routing.airports) for routing in routings],
+        "Airlines": [", ".join(airline.codes[0] for airline in routing.airlines) for routing in routings],
+        "Distance": [routing.distance for routing in routings],
+        "SQM": [routing.sqm for routing in routings],
+        "Points": [routing.pts for routing in routings],
+        "Bonus Points": [routing.pts_bonus for routing in routings],
+        "Total Points": [routing.pts + routing.pts_bonus for routing in routings],
+    })
+    routings_df.index += 1
+    st.table(routings_df)
+
+
+def _format_rates(rates):
+    return (rates * 100).round().astype(int).astype(str) + "%"
 
 
 def browse_airlines(title):
@@ -583,6 +1003,7 @@ def browse_airlines(title):
         index=0,
         format_func=lambda airline: airline.name,
         help="Operating airline.",
+        key="browse_airline",
     )
 
     st.markdown(f'<div style="font-size:1.666rem">{airline.name}</div>', unsafe_allow_html=True)
@@ -602,53 +1023,105 @@ def browse_airlines(title):
             st.markdown(f"Earn Aeroplan points on flights operated by **{airline.name}** with a **4-digit Air Canada flight number**. See **Air Canada** for accrual details.")
         else:
             st.markdown("Redeem Aeroplan points only.")
+    elif st.checkbox("🎫 Show Earning Rates", value=True, key="show_earning_rates"):
+        if (rates_html := _exported_page(f"airlines/{airline.id}.body.html")) is not None:
+            st.markdown(rates_html, unsafe_allow_html=True)
+        else:
+            _earning_rates_tables(airline)
+
+    _earning_partners_panel()
+
+
+def _earning_rates_tables(airline):
+    tables = _earning_rates_html(current_snapshot().version, airline.id)
+    for col, (region, table_html) in zip(st.columns(max(len(tables), 2)), tables):
+        col.markdown("#### " + ("All Regions" if region == "*" else region) + "\n" + table_html, unsafe_allow_html=True)
+
+
+@st.experimental_memo(max_entries=64, show_spinner=False)
+def _earning_rates_html(rules_version, airline_id):
+    return earning_rates_tables((snapshot(rules_version) or current_snapshot()).airlines_by_id[airline_id])
+
+
+def _exported_page(path):
+    return exported_page(EXPORT_DIR, current_snapshot().version, path) if EXPORT_DIR else None
+
+
+def compare_airlines(title):
+    matrix = rate_matrix()
+    region_label = lambda region: "All Regions" if region == "*" else region
+
+    keys_col, regions_col = st.columns((36, 60))
+    keys = keys_col.multiselect(
+        "Class 🎫",
+        RATE_KEYS,
+        default=["J"],
+        help="Booking classes, and Air Canada fare brands. Airlines are sorted by the first one.",
+        key="compare_keys",
+    )
+    regions = regions_col.multiselect(
+        "Regions 🌎",
+        matrix.regions,
+        format_func=region_label,
+        help="Regions of each airline's earning rates. Leave empty for all of them.",
+        key="compare_regions",
+    )
+    airlines = st.multiselect(
+        "Airlines ✈️",
+        [airline for airline in matrix.airlines if airline.earning_rates],
+        format_func=lambda airline: airline.name,
+        help="Operating airlines. Leave empty for all of them.",
+        key="compare_airlines",
+    )
+
+    rates = compare_rates(keys, regions, airlines)
+    if rates.empty:
+        st.info("No earning rates for the classes, regions and airlines.")
         return
 
-    for col, earning_rates_item in zip(st.columns(max(len(airline.earning_rates), 2)), airline.earning_rates.items()):
-        region, services = earning_rates_item
-
-        with col:
-            rates = []
-            for service, fare_classes in services.items():
-                rates.extend([
-                    (service, ", ".join(code[0] for code in codes), f"{int(rate * 100)}%")
-                    for rate, codes in groupby(fare_classes.items(), key=lambda item: item[1])
-                ])
-
-            rates_df = pd.DataFrame(rates, columns=(
-                "Class of service", "Eligible booking classes", "Rate",
-            ))
-            rates_df = rates_df.set_index(["Class of service"])
-            rates_df.index.rename(None, inplace=True)
-            rates_df = rates_df.rename_axis("Class of Service", axis=1)
-            rates_df = rates_df.style.set_table_styles((
-                {
-                    "selector": "",  # table
-                    "props": "width: 100%",
-                },
-                {
-                    "selector": "th",
-                    "props": "border-color: #a8afb8; padding: .25rem .5rem",
-                },
-                {
-                    "selector": "td",
-                    "props": "border-color: #dbdfe5; padding: .25rem .5rem; color: #333",
-                },
-                {
-                    "selector": "thead th.level0",
-                    "props": "background-color: #4a4f55; color: #f8fafd; font-weight: 500; border-right: 1px solid #6f767f; padding: 1rem .5rem .25rem .5rem",
-                },
-                {
-                    "selector": "tbody th",
-                    "props": "background-color: #6f767f; color: #f8fafd; font-weight: 500",
-                },
-                {
-                    "selector": "tbody td.col1",
-                    "props": "text-align: right",
-                }
-            ))
-
-            st.markdown("#### " +  ("All Regions" if region == "*" else region) + "\n" + rates_df.to_html(), unsafe_allow_html=True)
+    rates = rates.rename(index=region_label, level="region").reset_index()
+    rates.columns = ["Airline", "Region", "Service", *rates.columns[3:]]
+    st.dataframe(
+        rates.style.format("{:.0%}", subset=list(rates.columns[3:]), na_rep=""),
+        height=min(38 + 35 * len(rates), 700),
+    )
+
+
+def _place_label(place):
+    label = f"{place.country or 'Unknown'} ({place.continent or 'Unknown'})"
+    return f"{label} Lisbon or Porto" if place.lisbon_porto else label
+
+
+def _earning_partners_panel():
+    st.markdown("<hr />", unsafe_allow_html=True)
+    st.markdown("#### Earning Partners by Route")
+
+    places = sorted(earning_index().places, key=lambda place: (place.country or "~", place.continent or "", place.lisbon_porto))
+    default_origin = places.index(airport_place(airports_by_code()["YYZ"]))
+    default_destination = places.index(airport_place(airports_by_code()["NRT"]))
+
+    origin_col, destination_col, fare_class_col = st.columns((32, 32, 12))
+    origin = origin_col.selectbox("From 🛫", places, index=default_origin, format_func=_place_label, key="partners_origin")
+    destination = destination_col.selectbox("To 🛬", places, index=default_destination, format_func=_place_label, key="partners_destination")
+    fare_class = fare_class_col.selectbox("Class 🎫", FARE_CLASSES, index=FARE_CLASSES.index("J"), key="partners_fare_class")
+
+    partners = earning_partners(origin, destination, fare_class)
+    if not partners:
+        st.info("No partners earn in this class between these places.")
+        return
+
+    partners_df = pd.DataFrame(((
+        partner.airline.name,
+        "All Regions" if partner.region == "*" else partner.region,
+        "" if partner.service == "*" else partner.service,
+        partner.fare_brand.name if partner.fare_brand != NoBrand else "",
+        f"{int(partner.rate * 100)}%",
+        "👍" if partner.airline.earns_pts else "👎",
+        "👍" if partner.airline.earns_sqm else "👎",
+    ) for partner in partners), columns=(
+        "Airline", "Region", "Class of Service", "Fare Brand", "Rate", "Points", "SQM",
+    ))
+    st.table(partners_df.set_index("Airline"))
 
 
 def browse_airports(title):
@@ -656,172 +1129,158 @@ def browse_airports(title):
         filter(lambda e: e[1].airport_code == "YYC", enumerate(airports()))
     )
 
-    origin = st.selectbox(
+    origin_col, view_col = st.columns((56, 24))
+    origin = origin_col.selectbox(
         "Origin 🛫",
         airports(),
         index=DEFAULT_ORIGIN_AIRPORT_INDEX,
         format_func=lambda airport: f"{airport.city} {airport.airport_code}" if airport.city else airport.airport_code,
         help="Flight origin airport code.",
+        key="browse_origin",
+    )
+    view = view_col.selectbox(
+        "View 🗺",
+        ("Published Distances", "Earnings Heatmap"),
+        help="Show the published Aeroplan distances, or the earnings to every airport.",
+        key="browse_view",
     )
 
     st.markdown(f"<div style='font-size:1.666rem'>{origin.airport}</div>\n\n**{origin.city}**, " + (f"{origin.state}, " if origin.state else "") + origin.country, unsafe_allow_html=True)
 
-    distances_data = []
-    destination_airports = []
-
-    for _, distance in origin.distances.items():
-        destination_airport = airports_by_code()[distance.destination]
-        destination_airports.append(destination_airport)
-
-        distances_data.append((
-            destination_airport.market,
-            destination_airport.airport,
-            destination_airport.airport_code,
-            destination_airport.country,
-            distance.old_distance,
-            distance.distance,
-            distance.distance or distance.old_distance,
-        ))
-
-    distances_df = pd.DataFrame(distances_data, columns=(
-        "Market", "Airport", "Code", "Country", "Distance (Old)", "Distance (New)", "Distance (Combined)",
-    ))
-    distances_df["Market"] = distances_df["Market"].astype(pd.CategoricalDtype(("DOM", "TNB", "SUN", "INT"), ordered=True))
-    distances_df = distances_df.sort_values(["Market", "Distance (Combined)"])
-    distances_df.set_index("Market", inplace=True)
+    if view == "Earnings Heatmap":
+        _earnings_heatmap(origin)
+        return
 
-    arclayer_data = [
-        {
-            "tooltip": f'<div><strong>{destination.city}</strong> {destination.airport_code}</div><div style="font-size: .833rem">{destination.airport}<br />{data[-1] or data[-2]} miles</div>',
-            "source_position": (origin.longitude, origin.latitude),
-            "target_position": (destination.longitude, destination.latitude),
-            "source_colour": MARKET_COLOURS.get(destination.market, (180, 180, 180)),
-            "target_colour": MARKET_COLOURS.get(destination.market, (180, 180, 180)),
-        }
-        for destination, data in zip(destination_airports, distances_data)
-    ]
+    # The map and the table of every destination are only built when they're shown.
+    rules_version = current_snapshot().version
+    if st.checkbox("🗺 Show Map", value=True, key="show_browse_map"):
+        if (deck_json := _exported_page(f"airports/{origin.airport_code}.json")) is not None:
+            st.pydeck_chart(ExportedDeck(deck_json))
+        else:
+            _render_map(*_published_distances_layers(rules_version, origin.airport_code), ctr_lon=origin.longitude, ctr_lat=origin.latitude, zoom=4, get_width=2, height=540)
+    if st.checkbox("📋 Show Distances Table", key="show_distances_table"):
+        # The same Styler HTML whether it comes from the export or is rendered live.
+        if (table_html := _exported_page(f"airports/{origin.airport_code}.body.html")) is None:
+            table_html = _distances_table_html(rules_version, origin.airport_code)
+        st.markdown(table_html, unsafe_allow_html=True)
 
-    textlayer_data = [
-        {
-            "tooltip": f'<div><strong>{destination.city}</strong> {destination.airport_code}</div><div style="font-size: .833rem">{destination.airport}<br />{data[-1] or data[-2]} miles</div>',
-            "distance": data[-1] or data[-2],
-            "text": destination.airport_code,
-            "position": (destination.longitude, destination.latitude),
-        }
-        for destination, data in zip(destination_airports, distances_data)
-    ]
 
-    iconlayer_data = [
-        {
-            "tooltip": f'<div><strong>{origin.city}</strong> {origin.airport_code}</div><div style="font-size: .833rem">{origin.airport}</div>',
-            "marker": "airplane",
-            "position": (origin.longitude, origin.latitude),
-            "size": 48,
-        },
-        *[
-            {
-                "tooltip": f'<div><strong>{destination.city}</strong> {destination.airport_code}</div><div style="font-size: .833rem">{destination.airport}<br />{data[-1] or data[-2]} miles</div>',
-                "marker": f"{destination.market.lower() if destination.market else 'int'}-airport",
-                "position": (destination.longitude, destination.latitude),
-                "size": 56,
-            }
-            for destination, data in zip(destination_airports, distances_data)
-        ],
-    ]
+@st.experimental_memo(max_entries=64, show_spinner=False)
+def _distances_table_html(rules_version, origin_code):
+    rules = snapshot(rules_version) or current_snapshot()
+    return distances_table_html(published_distances(rules.airports_by_code[origin_code], rules))
 
-    _render_map(arclayer_data, textlayer_data, iconlayer_data, ctr_lon=origin.longitude, ctr_lat=origin.latitude, zoom=4, get_width=2, height=540)
-    st.table(distances_df)
 
+@st.experimental_memo(max_entries=64, show_spinner=False)
+def _published_distances_layers(rules_version, origin_code):
+    rules = snapshot(rules_version) or current_snapshot()
+    return published_distances_layers(rules.airports_by_code[origin_code], rules)
 
-def _render_map(arclayer_data=None, textlayer_data=None, iconlayer_data=None, ctr_lon=None, ctr_lat=None, zoom=None, get_width=6, height=400):
-    if not ctr_lon or not ctr_lat:
-        positions = [
-            pos for route_positions in (
-                (route["source_position"], route["target_position"])
-                for route in arclayer_data
-            ) for pos in route_positions
-        ]
-        min_lon = min(c[0] for c in positions)
-        max_lon = max(c[0] for c in positions)
-        min_lat = min(c[1] for c in positions)
-        max_lat = max(c[1] for c in positions)
-        ctr_lon = ctr_lon or ((min_lon + max_lon) / 2.0)
-        ctr_lat = ctr_lat or ((min_lat + max_lat) / 2.0)
-        rng_lon = abs(max_lon - min_lon)
-        rng_lat = abs(max_lat - min_lat)
-        zoom = zoom or (min(5, max(1, _get_zoom_level(max(rng_lon, rng_lat)))))
-
-    layers = []
-
-    if arclayer_data:
-        # https://deck.gl/docs/api-reference/geo-layers/great-circle-layer
-        layers.append(pdk.Layer(
-            "ArcLayer",
-            arclayer_data,
-            pickable=True,
-            greatCircle=True,
-            get_width=get_width,
-            get_height=0,
-            get_source_position="source_position",
-            get_target_position="target_position",
-            get_source_color="source_colour",
-            get_target_color="target_colour",
-            auto_highlight=True,
-        ))
-
-    if iconlayer_data:
-        # https://deck.gl/docs/api-reference/layers/icon-layer
-        layers.append(pdk.Layer(
-            "IconLayer",
-            iconlayer_data,
-            pickable=True,
-            icon_atlas="https://raw.githubusercontent.com/kinghuang/ac-calc/master/icons/map-icons-sm.png",
-            icon_mapping={
-                "airplane": {"x": 0, "y": 0, "width": 64, "height": 64},
-                "small-airplane": {"x": 64, "y": 0, "width": 64, "height": 64},
-                "airplane-taking-off": {"x": 128, "y": 0, "width": 64, "height": 64},
-                "airplane-landing": {"x": 192, "y": 0, "width": 64, "height": 64},
-
-                "dom-airport": {"x": 0, "y": 128, "width": 64, "height": 64},
-                "tnb-airport": {"x": 64, "y": 128, "width": 64, "height": 64},
-                "sun-airport": {"x": 128, "y": 128, "width": 64, "height": 64},
-                "int-airport": {"x": 192, "y": 128, "width": 64, "height": 64},
-            },
-            get_icon="marker",
-            get_position="position",
-            get_size="size",
-        ))
-
-    if textlayer_data:
-        # https://deck.gl/docs/api-reference/layers/text-layer
-        layers.append(pdk.Layer(
-            "TextLayer",
-            textlayer_data,
-            pickable=True,
-            get_position="position",
-            get_text="text",
-            get_font_family='"Source Sans Pro", sans-serif',
-            get_size=18,
-            get_text_anchor=String("middle"),
-            get_alignment_baseline=String("center"),
-        ))
-
-    deck = pdk.Deck(
-        initial_view_state=pdk.ViewState(
-            latitude=ctr_lat,
-            longitude=ctr_lon,
-            zoom=zoom,
-            bearing=0,
-            pitch=0,
-            height=height,
-        ),
-        map_style="road",
-        layers=layers,
-        tooltip={"html": "{tooltip}"},
+
+def _earnings_heatmap(origin):
+    airline_col, fare_brand_col, fare_class_col, metric_col, top_col = st.columns((24, 24, 12, 24, 12))
+
+    airline = airline_col.selectbox(
+        "Airline ✈️",
+        AIRLINES,
+        format_func=lambda airline: airline.name,
+        help="Operating airline.",
+        key="heatmap_airline",
+    )
+
+    if airline == AirCanada:
+        fare_brand = fare_brand_col.selectbox(
+            "Service 🍷",
+            FARE_BRANDS,
+            index=DEFAULT_FARE_BRAND_INDEX,
+            format_func=lambda brand: brand.name,
+            help="Air Canada fare brand.",
+            key="heatmap_fare_brand",
+        )
+    else:
+        fare_brand = NoBrand
+
+    fare_class = fare_class_col.selectbox(
+        "Class 🎫",
+        list(string.ascii_uppercase) if fare_brand == NoBrand else fare_brand.fare_classes,
+        key="heatmap_fare_class",
+    )
+
+    metric = metric_col.selectbox(
+        "Colour By 🎨",
+        ("Total Points", "SQM"),
+        help="Earnings shown on the map.",
+        key="heatmap_metric",
+    )
+
+    top_n = top_col.number_input("Top", min_value=1, max_value=500, value=25, key="heatmap_top")
+
+    earnings_df = _earnings_to_airports(
+        current_snapshot().version,
+        origin.airport_code,
+        airline.id,
+        fare_brand.name,
+        fare_class,
+        st.session_state.aeroplan_status.name,
     )
-    deck.picking_radius = 20
 
-    st.pydeck_chart(deck)
+    # Shade each airport from grey to red by its share of the best earnings.
+    values = earnings_df[metric].to_numpy()
+    shares = values / max(values.max(), 1)
+    low, high = np.array((180, 180, 180)), np.array(ImageColor.getrgb(SEGMENT_COLOURS[0]))
+    colours = (low + (high - low) * shares[:, None]).astype(int)
+
+    scatterlayer_data = [
+        {
+            "tooltip": f'<div><strong>{city or ""}</strong> {code}</div><div style="font-size: .833rem">{distance:.0f} miles<br />{total_pts} points, {sqm} SQM</div>',
+            "position": (longitude, latitude),
+            "colour": colour,
+        }
+        for code, city, longitude, latitude, distance, total_pts, sqm, colour in zip(
+            earnings_df["Code"], earnings_df["City"], earnings_df["Longitude"], earnings_df["Latitude"],
+            earnings_df["Distance"], earnings_df["Total Points"], earnings_df["SQM"], colours.tolist(),
+        )
+        if code != origin.airport_code
+    ]
+
+    _render_map(scatterlayer_data=scatterlayer_data, ctr_lon=origin.longitude, ctr_lat=origin.latitude, zoom=2, height=540)
+
+    top_df = earnings_df.nlargest(top_n, metric).drop(columns=["Longitude", "Latitude"])
+    st.dataframe(top_df.set_index("Code"))
+
+
+@st.experimental_memo(max_entries=64)
+def _earnings_to_airports(rules_version, origin_code, airline_id, fare_brand_name, fare_class, aeroplan_status_name):
+    # The rules version keys the cache, so a reload doesn't serve earnings from the old rules.
+    rules = snapshot(rules_version) or current_snapshot()
+    _airports = rules.airports
+    calculations = calculate_from_origin(
+        rules.airlines_by_id[airline_id],
+        rules.airports_by_code[origin_code],
+        _airports,
+        FARE_BRANDS_BY_NAME[fare_brand_name],
+        fare_class,
+        "",
+        AEROPLAN_STATUSES_BY_NAME[aeroplan_status_name],
+    ).to_pandas()
+
+    return pd.DataFrame({
+        "Code": [airport.airport_code for airport in _airports],
+        "City": [airport.city for airport in _airports],
+        "Country": [airport.country for airport in _airports],
+        "Longitude": [airport.longitude for airport in _airports],
+        "Latitude": [airport.latitude for airport in _airports],
+        "Region": calculations["region"],
+        "Distance": calculations["distance"],
+        "Points": calculations["pts"],
+        "Bonus Points": calculations["pts_bonus"],
+        "Total Points": calculations["pts"] + calculations["pts_bonus"],
+        "SQM": calculations["sqm"],
+    })
+
+
+def _render_map(arclayer_data=None, textlayer_data=None, iconlayer_data=None, scatterlayer_data=None, ctr_lon=None, ctr_lat=None, zoom=None, get_width=6, height=400):
+    st.pydeck_chart(map_deck(arclayer_data, textlayer_data, iconlayer_data, scatterlayer_data, ctr_lon, ctr_lat, zoom, get_width, height))
 
 
 if __name__ == "__main__":
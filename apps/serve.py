@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+import os
+from pathlib import Path
+import threading
+
+from streamlit import bootstrap
+
+from ac_calc.snapshot import SnapshotWatcher
+from ac_calc.warmup import wait_until_ready, warm_up
+
+
+APP_FILE = Path(__file__).with_name("ac-calc.py")
+READY_FILE = Path(os.environ.get("AC_CALC_READY_FILE", "/tmp/ac-calc.ready"))
+# Seconds between checks for changed reference data. Zero turns off hot reloading.
+WATCH_INTERVAL = float(os.environ.get("AC_CALC_WATCH_INTERVAL", "5"))
+
+
+def _mark_ready():
+    # Health checks hold traffic until this file exists.
+    if wait_until_ready():
+        READY_FILE.touch()
+
+
+def main():
+    READY_FILE.unlink(missing_ok=True)
+
+    # Start loading the reference data in the server process, so that the caches are
+    # populated before the first session arrives.
+    warm_up()
+    threading.Thread(target=_mark_ready, daemon=True).start()
+
+    if WATCH_INTERVAL > 0:
+        SnapshotWatcher(WATCH_INTERVAL).start()
+
+    bootstrap.run(str(APP_FILE), f"streamlit run {APP_FILE}", [], {})
+
+
+if __name__ == "__main__":
+    main()
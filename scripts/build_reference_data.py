@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import hashlib
+import os
+from pathlib import Path
+import time
+from typing import Optional
+
+import srsly
+import typer
+
+import extract_locations
+import extract_partners
+from ac_calc.locations import Airport
+from ac_calc.snapshot import build_snapshot, rules_version
+
+
+# Fields written by extract_partners.parse_partner, which are the Airline constructor arguments.
+PARTNER_FIELDS = (
+    "id", "codes", "name", "region", "website", "logo",
+    "star_alliance_member", "codeshare_partner", "earns_pts", "earns_sqm", "earning_rates",
+)
+
+
+def _hash_files(*paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(path).encode())
+        digest.update(hashlib.sha256(Path(path).read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    # Write to a temporary file and swap it in, so that a running server watching for changes
+    # never reads a partial file.
+    temp_path = path.with_name(f".{path.name}.tmp")
+    srsly.write_json(temp_path, data)
+    os.replace(temp_path, path)
+
+
+def validate_airports(airports):
+    codes = set()
+    for airport in airports:
+        if unknown := set(airport) - set(Airport._fields):
+            raise ValueError(f"Airport {airport.get('airport_code')} has unknown fields {sorted(unknown)}.")
+        code = airport.get("airport_code")
+        if not isinstance(code, str) or len(code) != 3:
+            raise ValueError(f"Invalid airport code {code!r}.")
+        if code in codes:
+            # The Air Canada data has a few of these, and the last one wins in the app.
+            typer.echo(f"Duplicate airport code {code}.", err=True)
+        if not (-90 <= airport["latitude"] <= 90 and -180 <= airport["longitude"] <= 180):
+            raise ValueError(f"Airport {code} has an invalid position.")
+        codes.add(code)
+
+
+def validate_partners(partners):
+    ids = set()
+    for partner in partners:
+        if tuple(partner) != PARTNER_FIELDS:
+            raise ValueError(f"Partner {partner.get('id')} has fields {list(partner)}, expected {list(PARTNER_FIELDS)}.")
+        if partner["id"] in ids:
+            raise ValueError(f"Duplicate partner {partner['id']}.")
+        ids.add(partner["id"])
+
+        for region, services in (partner["earning_rates"] or {}).items():
+            for service, rates in services.items():
+                for key, rate in rates.items():
+                    if not isinstance(rate, float) or not 0 <= rate <= 5:
+                        raise ValueError(f"Partner {partner['id']} has an invalid rate {rate!r} for {region} {service} {key}.")
+
+
+def build_airports(inputs, output_file):
+    airports = extract_locations.build_airports(*inputs)
+    validate_airports(airports)
+    _write_json(output_file, airports)
+
+
+def build_partners(inputs, output_file, parser, workers):
+    partners = extract_partners.read_partners(*inputs)
+
+    # Parsing the earning rate tables dominates, and each partner is independent.
+    with ProcessPoolExecutor(workers) as executor:
+        parsed_partners = list(executor.map(partial(extract_partners.parse_partner, parser=parser), partners, chunksize=4))
+
+    validate_partners(parsed_partners)
+    _write_json(output_file, parsed_partners)
+
+
+def main(
+    locations_file: Path = typer.Option("/project/ac_data/location.json", help="Locations data file."),
+    partners_file: Path = typer.Option("/project/ac_data/airline-en.json", help="Airline partners data file."),
+    airports_csv_file: Path = typer.Option("/project/ac_calc/locations/airports.csv"),
+    country_continents_file: Path = typer.Option("/project/ac_calc/locations/country_continents.csv"),
+    distances_file: Path = typer.Option("/project/ac_calc/locations/aeroplan_distances.csv"),
+    airports_file: Path = typer.Option("/project/ac_calc/locations/airports.json"),
+    partners_output_file: Path = typer.Option("/project/ac_calc/airlines/partners.json"),
+    manifest_file: Path = typer.Option("/project/ac_data/build-manifest.json", help="Hashes of the last build's inputs and outputs."),
+    parser: str = typer.Option("lxml", help="BeautifulSoup parser for the earning rate tables."),
+    workers: Optional[int] = typer.Option(None, help="Processes for parsing partners. Defaults to the number of CPUs."),
+    force: bool = typer.Option(False, help="Rebuild every stage, even if its inputs haven't changed."),
+):
+    """Build airports.json and partners.json, skipping a stage when the hashes of its inputs,
+    code and outputs match the last build, then compile the rules snapshot that the app will
+    load from them and count its published distance edges.
+    """
+
+    manifest = srsly.read_json(manifest_file) if manifest_file.exists() and not force else {}
+    stages = manifest.setdefault("stages", {})
+
+    # Each stage's key includes the code that builds it and its options, so parser changes
+    # trigger a rebuild.
+    for name, inputs, output_file, build, code_module, options in (
+        (
+            "airports",
+            (locations_file, airports_csv_file, country_continents_file),
+            airports_file,
+            build_airports,
+            extract_locations,
+            "",
+        ),
+        (
+            "partners",
+            (partners_file,),
+            partners_output_file,
+            partial(build_partners, parser=parser, workers=workers),
+            extract_partners,
+            parser,
+        ),
+    ):
+        input_hash = f"{_hash_files(*inputs, __file__, code_module.__file__)}:{options}"
+
+        stage = stages.get(name, {})
+        if stage.get("inputs") == input_hash and output_file.exists() and stage.get("output") == _hash_files(output_file):
+            typer.echo(f"{name}: unchanged, skipped.")
+            continue
+
+        start = time.perf_counter()
+        build(inputs, output_file)
+        stages[name] = {"inputs": input_hash, "output": _hash_files(output_file)}
+        typer.echo(f"{name}: built {output_file} in {time.perf_counter() - start:.1f}s.")
+
+    # Compile the sources the way the app will, which checks that the rates compile and the
+    # distances and airports join up.
+    data = {
+        "partners.json": partners_output_file.read_bytes(),
+        "airports.json": airports_file.read_bytes(),
+        "aeroplan_distances.csv": distances_file.read_bytes(),
+    }
+    version = rules_version(data)
+    snapshot = build_snapshot({name: value.decode("utf8") for name, value in data.items()}, version)
+    # Counted like routes.route_network's edges, which would pull numpy into the extract
+    # environment.
+    edges = sum(
+        origin_code in snapshot.airports_by_code and destination_code in snapshot.airports_by_code
+        for origin_code, destinations in snapshot.distances.items()
+        for destination_code in destinations
+    )
+    manifest["rules_version"] = version
+    typer.echo(
+        f"Rules {version}: {len(snapshot.airlines)} airlines, {len(snapshot.airports)} airports, "
+        f"{edges} published distance edges."
+    )
+
+    srsly.write_json(manifest_file, manifest)
+
+
+if __name__ == "__main__":
+    typer.run(main)
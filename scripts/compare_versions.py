@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import csv
+from itertools import groupby
+from pathlib import Path
+from typing import List
+
+import typer
+
+from ac_calc.aeroplan import AEROPLAN_STATUSES_BY_NAME, FARE_BRANDS_BY_BASIS_CODE
+from ac_calc.snapshot import build_snapshot, current_snapshot, read_sources
+from ac_calc.versions import PlannedSegment, RulesVersion, compare_versions, delta_table
+
+
+ITINERARY_FIELDS = ("itinerary", "airline", "origin", "destination", "fare_brand", "fare_class")
+
+
+def _itineraries(path):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        if (header := next(reader, None)) != list(ITINERARY_FIELDS):
+            raise ValueError(f"{path} has columns {header}, expected {list(ITINERARY_FIELDS)}.")
+
+        # Segments of an itinerary are on consecutive rows.
+        for label, rows in groupby(reader, key=lambda row: row[0]):
+            segments = []
+            for _, airline, origin, destination, fare_brand, fare_class in rows:
+                if fare_brand not in FARE_BRANDS_BY_BASIS_CODE:
+                    raise ValueError(f"{path} itinerary {label} has an unknown fare brand code {fare_brand!r}.")
+                segments.append(PlannedSegment(airline, origin, destination, FARE_BRANDS_BY_BASIS_CODE[fare_brand], fare_class))
+            yield label, segments
+
+
+def main(
+    itineraries_file: Path = typer.Argument(..., help="Itineraries CSV with columns " + ",".join(ITINERARY_FIELDS) + "."),
+    output_file: Path = typer.Argument("version-deltas.csv", help="Delta table CSV to write."),
+    rules: List[Path] = typer.Option([], help="Directory with partners.json, airports.json and aeroplan_distances.csv for another rules version. Can be repeated. Air Canada's own earning rates are built into the code, so every version uses the current ones."),
+    old_distances: bool = typer.Option(True, help="Also compare the current rules with last year's published distances."),
+    aeroplan_status: str = typer.Option("None", help="Aeroplan status to calculate with."),
+):
+    current = current_snapshot()
+    versions = [RulesVersion("current", current)]
+    if old_distances:
+        versions.append(RulesVersion("old-distances", current, True))
+    for directory in rules:
+        versions.append(RulesVersion(directory.name, build_snapshot(*read_sources(directory))))
+
+    rows = list(_itineraries(itineraries_file))
+    labels = [label for label, _ in rows]
+    itineraries = [itinerary for _, itinerary in rows]
+    comparison = compare_versions(itineraries, versions, AEROPLAN_STATUSES_BY_NAME[aeroplan_status])
+    delta_table(comparison, labels).to_csv(output_file, index_label="itinerary")
+
+    typer.echo(f"Compared {len(labels)} itineraries under {len(versions)} rules versions.")
+
+
+if __name__ == "__main__":
+    typer.run(main)
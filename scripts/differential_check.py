@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+
+from collections import defaultdict, namedtuple
+import csv
+import importlib
+from pathlib import Path
+import random
+import sys
+import time
+from typing import List, Optional
+
+import typer
+
+from ac_calc.aeroplan import AEROPLAN_STATUSES, AEROPLAN_STATUSES_BY_NAME, FARE_BRANDS, FARE_BRANDS_BY_NAME, NoBrand
+from ac_calc.airlines import LISBON_PORTO_CODES, SegmentCalculation
+from ac_calc.batch import calculate_from_origin
+from ac_calc.snapshot import current_snapshot
+from ac_calc.versions import PlannedSegment, RulesVersion, compare_versions
+from ac_calc.whatif import what_if
+
+
+# Runs alternative scoring engines against Airline.calculate over a golden corpus covering
+# every airline, region branch, fare brand and class, and status, plus random segments, and
+# reports the first mismatch. An engine is a function that takes a list of GoldenCases and
+# returns a result per case with at least distance, pts, pts_bonus and sqm attributes, or
+# None for cases it doesn't support. Any other SegmentCalculation fields it returns are
+# compared too.
+
+
+GoldenCase = namedtuple("GoldenCase", (
+    "airline", "origin", "destination", "fare_brand", "fare_class", "ticket_number", "aeroplan_status",
+))
+Earnings = namedtuple("Earnings", ("distance", "pts", "pts_bonus", "sqm"))
+
+
+CASE_FIELDS = GoldenCase._fields
+# Booking classes that no fare brand or partner sells, to cover segments without a rate.
+UNSOLD_FARE_CLASSES = ("X",)
+
+
+def _representative_airports(airports):
+    # Regions depend on the country and continent, and on Lisbon and Porto for TAP, so one
+    # airport for each combination reaches every region branch.
+    representatives = {}
+    for airport in airports:
+        representatives.setdefault((airport.country, airport.continent, airport.airport_code in LISBON_PORTO_CODES), airport)
+    return tuple(representatives.values())
+
+
+def golden_cases(snapshot, pairs_per_region=2):
+    """Return cases for every airline and region it has, at every fare brand and class and
+    every status, plus a zero distance and a published distance segment.
+    """
+
+    representatives = _representative_airports(snapshot.airports)
+    published = next(
+        (snapshot.airports_by_code[origin_code], snapshot.airports_by_code[destination_code])
+        for origin_code, destinations in snapshot.distances.items()
+        for destination_code in destinations
+        if origin_code in snapshot.airports_by_code and destination_code in snapshot.airports_by_code
+    )
+
+    cases = []
+    for airline in snapshot.airlines:
+        pairs_by_region = defaultdict(list)
+        for origin in representatives:
+            for destination, region in zip(representatives, airline._regions_for_segments(origin, representatives)):
+                if len(pairs := pairs_by_region[region]) < pairs_per_region:
+                    pairs.append((origin, destination))
+
+        pairs = [pair for region_pairs in pairs_by_region.values() for pair in region_pairs]
+        pairs += [(representatives[0], representatives[0]), published]
+
+        for origin, destination in pairs:
+            for fare_brand in FARE_BRANDS:
+                for fare_class in (*fare_brand.fare_classes, *UNSOLD_FARE_CLASSES):
+                    for aeroplan_status in AEROPLAN_STATUSES:
+                        cases.append(GoldenCase(airline, origin, destination, fare_brand, fare_class, "014", aeroplan_status))
+
+    return cases
+
+
+def random_cases(snapshot, count, seed):
+    """Return random segments, with the fare brands each airline sells."""
+
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(count):
+        airline = rng.choice(snapshot.airlines)
+        fare_brand = rng.choice(FARE_BRANDS) if airline.id == "air-canada" else NoBrand
+        cases.append(GoldenCase(
+            airline,
+            rng.choice(snapshot.airports),
+            rng.choice(snapshot.airports),
+            fare_brand,
+            rng.choice((*fare_brand.fare_classes, *UNSOLD_FARE_CLASSES)),
+            rng.choice(("014", "016", "220")),
+            rng.choice(AEROPLAN_STATUSES),
+        ))
+
+    return cases
+
+
+def reference_engine(cases):
+    return [case.airline.calculate(*case[1:]) for case in cases]
+
+
+def batch_engine(cases):
+    groups = defaultdict(list)
+    for index, case in enumerate(cases):
+        groups[(case.airline, case.origin.airport_code, case.fare_brand.name, case.fare_class, case.ticket_number, case.aeroplan_status)].append(index)
+
+    results = [None] * len(cases)
+    for (airline, _, _, fare_class, ticket_number, aeroplan_status), indexes in groups.items():
+        case = cases[indexes[0]]
+        batch = calculate_from_origin(
+            airline,
+            case.origin,
+            [cases[index].destination for index in indexes],
+            case.fare_brand,
+            fare_class,
+            ticket_number,
+            aeroplan_status,
+        )
+        for index, calc in zip(indexes, batch):
+            results[index] = calc
+
+    return results
+
+
+def what_if_engine(cases):
+    # Each distinct segment is calculated at every status and fare brand in one matrix.
+    segments = {}
+    for case in cases:
+        segments.setdefault((case.airline, case.origin.airport_code, case.destination.airport_code, case.fare_class), case)
+
+    keys = list(segments)
+    matrix = what_if([[segments[key]] for key in keys])
+    rows = {key: row for row, key in enumerate(keys)}
+    statuses = {status: column for column, status in enumerate(matrix.aeroplan_statuses)}
+    fare_brands = {fare_brand.name: column for column, fare_brand in enumerate(matrix.fare_brands)}
+
+    results = []
+    for case in cases:
+        row = rows[(case.airline, case.origin.airport_code, case.destination.airport_code, case.fare_class)]
+        status, fare_brand = statuses[case.aeroplan_status], fare_brands[case.fare_brand.name]
+        results.append(Earnings(
+            matrix.distance[row].item(),
+            matrix.pts[row, status, fare_brand].item(),
+            matrix.pts_bonus[row, status, fare_brand].item(),
+            matrix.sqm[row, status, fare_brand].item(),
+        ))
+
+    return results
+
+
+def versions_engine(cases):
+    # Segments are planned by airline code, so airlines that share or lack a code aren't
+    # supported.
+    snapshot = current_snapshot()
+    versions = [RulesVersion("current", snapshot)]
+
+    groups = defaultdict(list)
+    for index, case in enumerate(cases):
+        if case.airline.codes and snapshot.airlines_by_code.get(case.airline.codes[0]) is case.airline:
+            groups[case.aeroplan_status].append(index)
+
+    results = [None] * len(cases)
+    for aeroplan_status, indexes in groups.items():
+        comparison = compare_versions([
+            [PlannedSegment(case.airline.codes[0], case.origin.airport_code, case.destination.airport_code, case.fare_brand, case.fare_class)]
+            for case in (cases[index] for index in indexes)
+        ], versions, aeroplan_status)
+        for row, index in enumerate(indexes):
+            results[index] = Earnings(*(getattr(comparison, field)[row, 0].item() for field in Earnings._fields))
+
+    return results
+
+
+ENGINES = {
+    "reference": reference_engine,
+    "batch": batch_engine,
+    "what-if": what_if_engine,
+    "versions": versions_engine,
+}
+
+
+def _engine(name):
+    if name in ENGINES:
+        return ENGINES[name]
+    module_name, _, function_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _first_mismatch(cases, expected, actual):
+    """Return the number of cases compared and the first mismatch, or None."""
+
+    compared = 0
+    for case, expected_calc, actual_calc in zip(cases, expected, actual):
+        if actual_calc is None:
+            continue
+        compared += 1
+        for field in SegmentCalculation._fields:
+            if hasattr(actual_calc, field) and getattr(actual_calc, field) != getattr(expected_calc, field):
+                return compared, (case, field, expected_calc, actual_calc)
+
+    return compared, None
+
+
+def _describe(case):
+    return ", ".join(f"{field}={value}" for field, value in zip(CASE_FIELDS, (
+        case.airline.id, case.origin.airport_code, case.destination.airport_code,
+        case.fare_brand.name, case.fare_class, case.ticket_number, case.aeroplan_status.name,
+    )))
+
+
+def write_golden(path, cases, results):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CASE_FIELDS + SegmentCalculation._fields)
+        for case, calc in zip(cases, results):
+            writer.writerow((
+                case.airline.id, case.origin.airport_code, case.destination.airport_code,
+                case.fare_brand.name, case.fare_class, case.ticket_number, case.aeroplan_status.name,
+                # repr round trips floats exactly.
+                *("" if value is None else repr(value) if isinstance(value, float) else str(value) for value in calc),
+            ))
+
+
+def read_golden(path, snapshot):
+    """Return the cases and results recorded in a golden corpus file."""
+
+    cases, results = [], []
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        if (header := next(reader, None)) != list(CASE_FIELDS + SegmentCalculation._fields):
+            raise ValueError(f"{path} has columns {header}, expected {list(CASE_FIELDS + SegmentCalculation._fields)}.")
+
+        for row in reader:
+            airline_id, origin_code, destination_code, fare_brand_name, fare_class, ticket_number, aeroplan_status_name = row[:7]
+            cases.append(GoldenCase(
+                snapshot.airlines_by_id[airline_id],
+                snapshot.airports_by_code[origin_code],
+                snapshot.airports_by_code[destination_code],
+                FARE_BRANDS_BY_NAME[fare_brand_name],
+                fare_class,
+                ticket_number,
+                AEROPLAN_STATUSES_BY_NAME[aeroplan_status_name],
+            ))
+            distance, pts, pts_earning_rate, pts_bonus_factor, pts_bonus, sqm, sqm_earning_rate, region, service = row[7:]
+            results.append(SegmentCalculation(
+                float(distance) if "." in distance or "e" in distance else int(distance),
+                int(pts),
+                float(pts_earning_rate),
+                float(pts_bonus_factor),
+                int(pts_bonus),
+                int(sqm),
+                float(sqm_earning_rate),
+                region or None,
+                service or None,
+            ))
+
+    return cases, results
+
+
+def main(
+    engines: List[str] = typer.Option(["batch", "what-if", "versions"], "--engine", help="Engine to check, by name or as module:function. Can be repeated."),
+    golden: Optional[Path] = typer.Option(None, help="Golden corpus CSV to check the reference implementation against."),
+    write: bool = typer.Option(False, help="Write the generated golden corpus to --golden instead of checking it."),
+    random_segments: int = typer.Option(20000, help="Number of random segments to add to the corpus."),
+    seed: int = typer.Option(0, help="Random seed for the random segments."),
+):
+    snapshot = current_snapshot()
+
+    if golden and not write:
+        cases, expected = read_golden(golden, snapshot)
+        compared, mismatch = _first_mismatch(cases, expected, reference_engine(cases))
+        typer.echo(f"reference: {compared} golden cases checked.")
+        if mismatch:
+            case, field, expected_calc, actual_calc = mismatch
+            typer.echo(f"First mismatch in {field} for {_describe(case)}:\n  golden    {expected_calc}\n  reference {actual_calc}")
+            sys.exit(1)
+    else:
+        cases = golden_cases(snapshot) + random_cases(snapshot, random_segments, seed)
+        expected = reference_engine(cases)
+        if golden:
+            write_golden(golden, cases, expected)
+            typer.echo(f"Wrote {len(cases)} golden cases to {golden}.")
+
+    failed = False
+    for name in engines:
+        start = time.perf_counter()
+        actual = _engine(name)(cases)
+        seconds = time.perf_counter() - start
+
+        compared, mismatch = _first_mismatch(cases, expected, actual)
+        typer.echo(f"{name}: {compared} of {len(cases)} cases compared in {seconds:.1f}s.")
+        if mismatch:
+            case, field, expected_calc, actual_calc = mismatch
+            typer.echo(f"First mismatch in {field} for {_describe(case)}:\n  expected {expected_calc}\n  actual   {actual_calc}")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+from collections import namedtuple
+import csv
+from itertools import groupby
+from pathlib import Path
+
+import typer
+
+from ac_calc.aeroplan import AEROPLAN_STATUSES_BY_NAME, FARE_BRANDS_BY_BASIS_CODE
+from ac_calc.alternatives import Alternative, explore_alternatives
+from ac_calc.routes import ROUTING_METRICS
+from ac_calc.snapshot import current_snapshot
+
+
+# The same itineraries CSV as compare_versions.py.
+ITINERARY_FIELDS = ("itinerary", "airline", "origin", "destination", "fare_brand", "fare_class")
+
+
+ItinerarySegment = namedtuple("ItinerarySegment", ("airline", "origin", "destination", "fare_brand", "fare_class"))
+
+
+def _itineraries(path, snapshot):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        if (header := next(reader, None)) != list(ITINERARY_FIELDS):
+            raise ValueError(f"{path} has columns {header}, expected {list(ITINERARY_FIELDS)}.")
+
+        # Segments of an itinerary are on consecutive rows.
+        for label, rows in groupby(reader, key=lambda row: row[0]):
+            yield label, [
+                ItinerarySegment(
+                    snapshot.airlines_by_code[airline],
+                    snapshot.airports_by_code.get(origin),
+                    snapshot.airports_by_code.get(destination),
+                    FARE_BRANDS_BY_BASIS_CODE[fare_brand],
+                    fare_class,
+                )
+                for _, airline, origin, destination, fare_brand, fare_class in rows
+            ]
+
+
+def main(
+    itineraries_file: Path = typer.Argument(..., help="Itineraries CSV with columns " + ",".join(ITINERARY_FIELDS) + "."),
+    output_file: Path = typer.Argument("alternatives.csv", help="Ranked alternatives CSV to write."),
+    metric: str = typer.Option("sqm", help="Earnings to rank by: " + " or ".join(ROUTING_METRICS) + "."),
+    k: int = typer.Option(5, help="Number of alternatives to keep per itinerary."),
+    nearby: bool = typer.Option(True, help="Also swap in nearby airports, not just those sharing a city code."),
+    aeroplan_status: str = typer.Option("None", help="Aeroplan status to calculate with."),
+):
+    snapshot = current_snapshot()
+
+    count = 0
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("itinerary", "rank", *Alternative._fields))
+
+        for label, itinerary in _itineraries(itineraries_file, snapshot):
+            for rank, alternative in enumerate(explore_alternatives(
+                itinerary,
+                AEROPLAN_STATUSES_BY_NAME[aeroplan_status],
+                metric,
+                k,
+                nearby,
+                snapshot,
+            ), 1):
+                writer.writerow((label, rank, "-".join(alternative.airports), *alternative[1:]))
+            count += 1
+
+    typer.echo(f"Explored alternatives for {count} itineraries.")
+
+
+if __name__ == "__main__":
+    typer.run(main)
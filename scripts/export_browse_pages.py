@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+from pathlib import Path
+import time
+from typing import Optional
+
+import typer
+
+from ac_calc.browse import export_pages
+
+
+def main(
+    output_dir: Path = typer.Argument("browse-pages", help="Directory to write the pages to. Point AC_CALC_EXPORT_DIR at it to serve them from the app."),
+    workers: Optional[int] = typer.Option(None, help="Processes for rendering pages. Defaults to the number of CPUs."),
+):
+    """Pre-render the Browse Airlines page of every airline and the Browse Airports page of
+    every origin with published distances to static HTML and map JSON.
+    """
+
+    start = time.perf_counter()
+    manifest = export_pages(output_dir, workers)
+    typer.echo(
+        f"Exported {len(manifest['airlines'])} airlines and {len(manifest['airports'])} airports "
+        f"for rules {manifest['rules_version']} to {output_dir} in {time.perf_counter() - start:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    typer.run(main)
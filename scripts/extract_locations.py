@@ -15,12 +15,9 @@ import typer
 # https://www.aircanada.com/
 
 
-def main(
-    locations_file: Path = typer.Argument("/project/ac_data/location.json", help="Locations data file."),
-    airports_file: Path = typer.Argument("/project/ac_calc/locations/airports.csv"),
-    country_continents_file: Path = typer.Argument("/project/ac_calc/locations/country_continents.csv"),
-    output_file: Optional[Path] = typer.Argument("/project/ac_calc/locations/airports.json"),
-):
+def build_airports(locations_file, airports_file, country_continents_file):
+    """Combine the Air Canada locations data with airports.csv into the airports.json format."""
+
     location_data = srsly.read_json(locations_file)
 
     with open(airports_file) as f:
@@ -100,6 +97,17 @@ def main(
                 "country": airport_data[0],
             })
 
+    return airports
+
+
+def main(
+    locations_file: Path = typer.Argument("/project/ac_data/location.json", help="Locations data file."),
+    airports_file: Path = typer.Argument("/project/ac_calc/locations/airports.csv"),
+    country_continents_file: Path = typer.Argument("/project/ac_calc/locations/country_continents.csv"),
+    output_file: Optional[Path] = typer.Argument("/project/ac_calc/locations/airports.json"),
+):
+    airports = build_airports(locations_file, airports_file, country_continents_file)
+
     if output_file:
         srsly.write_json(output_file, airports)
 
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+from collections import defaultdict
+import csv
+import datetime
+from pathlib import Path
+import time
+from typing import Optional
+
+import numpy as np
+import typer
+
+from ac_calc.aeroplan import AEROPLAN_STATUSES, AEROPLAN_STATUSES_BY_NAME, DEFAULT_AEROPLAN_STATUS, FARE_BRANDS_BY_BASIS_CODE
+from ac_calc.forecast import forecast_status
+from ac_calc.ledger import FlownSegment
+from ac_calc.snapshot import current_snapshot
+
+
+HISTORY_FIELDS = ("member_id", "flown_on", "airline", "origin", "destination", "fare_brand", "fare_class", "ticket_number")
+STATUS_FIELDS = ("member_id", "aeroplan_status")
+
+
+def _rows(path, fields):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        if (header := next(reader, None)) != list(fields):
+            raise ValueError(f"{path} has columns {header}, expected {list(fields)}.")
+        yield from reader
+
+
+def _histories(path, snapshot):
+    histories = defaultdict(list)
+    for member_id, flown_on, airline_code, origin_code, destination_code, fare_brand_code, fare_class, ticket_number in _rows(path, HISTORY_FIELDS):
+        histories[member_id].append(FlownSegment(
+            member_id,
+            datetime.date.fromisoformat(flown_on),
+            snapshot.airlines_by_code[airline_code],
+            snapshot.airports_by_code[origin_code],
+            snapshot.airports_by_code[destination_code],
+            FARE_BRANDS_BY_BASIS_CODE[fare_brand_code],
+            fare_class,
+            ticket_number,
+        ))
+
+    for history in histories.values():
+        history.sort(key=lambda segment: segment.flown_on)
+    return histories
+
+
+def main(
+    history_file: Path = typer.Argument(..., help="Flown segments CSV with columns " + ",".join(HISTORY_FIELDS) + "."),
+    output_file: Path = typer.Argument("status-forecast.csv", help="Forecast CSV to write, with the chance of reaching each tier by member."),
+    statuses_file: Optional[Path] = typer.Option(None, help="CSV with columns " + ",".join(STATUS_FIELDS) + " of the statuses held at the start of the year."),
+    on: Optional[str] = typer.Option(None, help="Date to forecast from, as YYYY-MM-DD. Defaults to today."),
+    scenarios: int = typer.Option(20000, help="Number of scenarios to simulate per member."),
+    lookback_days: int = typer.Option(365, help="Days of history that the pace and segments are drawn from."),
+    min_pace_days: int = typer.Option(90, help="Fewest days that the pace is measured over, for members with a short history."),
+    seed: Optional[int] = typer.Option(None, help="Random seed for the scenarios."),
+):
+    on = datetime.date.fromisoformat(on) if on else datetime.date.today()
+    histories = _histories(history_file, current_snapshot())
+    starting_statuses = {
+        member_id: AEROPLAN_STATUSES_BY_NAME[status_name]
+        for member_id, status_name in (_rows(statuses_file, STATUS_FIELDS) if statuses_file else ())
+    }
+
+    seconds = []
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow((
+            "member_id", "aeroplan_status", "sqm", "sqs", "segments_per_day", "median_sqm",
+            *(status.name for status in AEROPLAN_STATUSES if status.qualifying_sqm),
+        ))
+
+        for member_id, history in histories.items():
+            start = time.perf_counter()
+            forecast = forecast_status(
+                history,
+                on,
+                starting_statuses.get(member_id, DEFAULT_AEROPLAN_STATUS),
+                scenarios=scenarios,
+                lookback_days=lookback_days,
+                min_pace_days=min_pace_days,
+                seed=seed,
+            )
+            seconds.append(time.perf_counter() - start)
+
+            writer.writerow((
+                member_id,
+                forecast.aeroplan_status.name,
+                forecast.totals.sqm,
+                forecast.totals.sqs,
+                f"{forecast.segments_per_day:.3f}",
+                int(np.median(forecast.sqm)),
+                *(f"{probability:.4f}" for status, probability in zip(AEROPLAN_STATUSES, forecast.probabilities) if status.qualifying_sqm),
+            ))
+
+    if seconds:
+        typer.echo(f"Forecast {len(seconds)} members with {scenarios} scenarios each, in {np.mean(seconds):.2f}s on average and {max(seconds):.2f}s at most.")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+
+import asyncio
+from pathlib import Path
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+import typer
+
+
+# Drives many concurrent headless sessions of the app over the same websocket protocol as the
+# browser, through the tools, Detailed Route editing, Cowculator pasting and airport browsing.
+# Reports the rerun latency percentiles, the server's CPU and memory per session, and the
+# number of sessions after which latency or throughput stops keeping up.
+
+
+APP_FILE = Path(__file__).parent.parent / "apps" / "ac-calc.py"
+# Newer Streamlit versions serve the websocket under _stcore.
+STREAM_PATHS = ("_stcore/stream", "stream")
+ITINERARY = "\n".join((
+    "AC,YYC,YYZ,M,FL",
+    "AC,YYZ,LHR,K,TG",
+    "LH,LHR,FRA,Y",
+    "UA,FRA,SFO,B",
+))
+WIDGET_TYPES = ("button", "multiselect", "number_input", "radio", "selectbox", "text_area", "text_input")
+# Airlines picked when editing Detailed Route segments.
+AIRLINE_NAMES = ("Air Canada", "United", "Lufthansa", "ANA", "SWISS", "Turkish Airlines")
+
+
+class Session:
+    """A headless app session. Widgets are found by label, and every rerun sends the values of
+    the widgets this session has set, like the browser does.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.widgets = []
+        self.values = {}
+        self.cache = {}
+        self.latencies = []
+        self.errors = []
+
+    @classmethod
+    async def connect(cls, url):
+        for path in STREAM_PATHS:
+            try:
+                return cls(await websocket_connect(f"{url}/{path}", max_message_size=256 * 1024 * 1024))
+            except Exception as e:
+                error = e
+        raise error
+
+    def _widget(self, label):
+        # Repeated widgets, like a segment's airline, are edited in the last segment.
+        for widget_type, widget in reversed(self.widgets):
+            if widget.label == label:
+                return widget_type, widget
+        raise KeyError(f"No {label} widget.")
+
+    def options(self, label):
+        _, widget = self._widget(label)
+        return list(widget.options)
+
+    async def select(self, label, index=None, option=None):
+        """Select an option by index, by its label, or at random."""
+
+        _, widget = self._widget(label)
+        if option is not None:
+            index = list(widget.options).index(option)
+        elif index is None:
+            index = random.randrange(len(widget.options))
+        self.values[widget.id] = ("int_value", index)
+        await self.rerun()
+
+    async def type(self, label, text):
+        _, widget = self._widget(label)
+        self.values[widget.id] = ("string_value", text)
+        await self.rerun()
+
+    async def click(self, label):
+        _, widget = self._widget(label)
+        await self.rerun(trigger=widget.id)
+
+    async def rerun(self, trigger=None):
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        live_ids = {widget.id for _, widget in self.widgets}
+        for widget_id, (field, value) in self.values.items():
+            if widget_id in live_ids:
+                state = msg.rerun_script.widget_states.widgets.add()
+                state.id = widget_id
+                setattr(state, field, value)
+        if trigger:
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = trigger
+            state.trigger_value = True
+
+        start = time.perf_counter()
+        await self.connection.write_message(msg.SerializeToString(), binary=True)
+        await self._read_run()
+        self.latencies.append(time.perf_counter() - start)
+
+    async def _read_run(self):
+        widgets = []
+        while True:
+            data = await self.connection.read_message()
+            if data is None:
+                raise ConnectionError("The server closed the session.")
+
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            if msg.hash:
+                self.cache[msg.hash] = msg
+            if msg.ref_hash:
+                msg = self.cache[msg.ref_hash]
+
+            msg_type = msg.WhichOneof("type")
+            if msg_type == "new_session":
+                # Sent at the start of every script run, including after experimental_rerun.
+                widgets = []
+            elif msg_type == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                if (element_type := element.WhichOneof("type")) in WIDGET_TYPES:
+                    widgets.append((element_type, getattr(element, element_type)))
+                elif element_type == "exception":
+                    self.errors.append(f"{element.exception.type}: {element.exception.message}")
+            elif msg_type == "session_event" and msg.session_event.HasField("script_compilation_exception"):
+                exception = msg.session_event.script_compilation_exception
+                self.errors.append(f"{exception.type}: {exception.message}")
+                return
+            elif msg_type == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # The app called experimental_rerun, so wait for the run that follows.
+                    continue
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    # The error follows in a session event.
+                    continue
+                self.widgets = widgets
+                return
+
+    def close(self):
+        self.connection.close()
+
+
+async def flow(session):
+    """One pass through the app the way a user might."""
+
+    # Tools are selected by label, so every tool is visited whatever the order.
+    for tool in session.options("Tool:"):
+        await session.select("Tool:", option=tool)
+
+    await session.select("Tool:", option="Calculate Points and Miles")
+    await session.select("Segments Input Style:", option="Detailed Route")
+    await session.click("Add Segment")
+    await session.select("Airline ✈️", option=random.choice(AIRLINE_NAMES))
+    await session.select("Destination 🛬")
+
+    await session.select("Segments Input Style:", option="Cowculator")
+    await session.type("Itinerary", ITINERARY)
+
+    await session.select("Tool:", option="Browse Airports")
+    await session.select("Origin 🛫")
+    await session.select("View 🗺", option="Earnings Heatmap")
+    await session.select("View 🗺", option="Published Distances")
+
+    await session.select("Tool:", option="Calculate Points and Miles")
+    await session.select("Segments Input Style:", option="Simple Route")
+
+
+def _process_usage(pid):
+    """Return the CPU seconds and resident memory in bytes of a process, from /proc."""
+
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/statm") as f:
+        rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu_seconds, rss
+
+
+async def run_level(url, num_sessions, flows, pid):
+    sessions = [await Session.connect(url) for _ in range(num_sessions)]
+    try:
+        # Load the app in every session before measuring.
+        await asyncio.gather(*(session.rerun() for session in sessions))
+        for session in sessions:
+            session.latencies.clear()
+
+        usage_before = _process_usage(pid) if pid else None
+        start = time.perf_counter()
+
+        async def run_flows(session):
+            for _ in range(flows):
+                try:
+                    await flow(session)
+                except KeyError as e:
+                    # The app failed part way through, so start the flow again from the top.
+                    session.errors.append(str(e))
+                    await session.rerun()
+
+        await asyncio.gather(*(run_flows(session) for session in sessions))
+        seconds = time.perf_counter() - start
+        usage_after = _process_usage(pid) if pid else None
+    finally:
+        for session in sessions:
+            session.close()
+
+    latencies = np.concatenate([session.latencies for session in sessions])
+    errors = sum(len(session.errors) for session in sessions)
+    return latencies, errors, seconds, usage_before, usage_after
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_for_server(url, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            session = await Session.connect(url)
+            session.close()
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+async def load_test(url, pid, levels, flows, p95_budget):
+    _, idle_rss = _process_usage(pid) if pid else (None, None)
+
+    header = f"{'sessions':>8} {'reruns':>7} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'reruns/s':>9}"
+    if pid:
+        header += f" {'CPU s/session':>14} {'CPU %':>6} {'RSS MB/session':>15}"
+    typer.echo(header)
+
+    results = []
+    for num_sessions in levels:
+        latencies, errors, seconds, usage_before, usage_after = await run_level(url, num_sessions, flows, pid)
+        p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) * 1000
+        throughput = len(latencies) / seconds
+
+        line = f"{num_sessions:>8} {len(latencies):>7} {errors:>6} {p50:>8.0f} {p95:>8.0f} {p99:>8.0f} {throughput:>9.1f}"
+        if pid:
+            cpu_seconds = usage_after[0] - usage_before[0]
+            line += f" {cpu_seconds / num_sessions:>14.2f} {100 * cpu_seconds / seconds:>6.0f} {(usage_after[1] - idle_rss) / num_sessions / 2 ** 20:>15.1f}"
+        typer.echo(line)
+        results.append((num_sessions, p95, throughput))
+
+    # The server is saturated once p95 latency exceeds the budget or adding sessions stops
+    # adding throughput.
+    saturation = None
+    for (num_sessions, p95, throughput), previous in zip(results, [None] + results[:-1]):
+        if p95 > p95_budget * 1000 or (previous and throughput < previous[2] * 1.1):
+            saturation = num_sessions
+            break
+
+    if saturation:
+        typer.echo(f"Saturated at {saturation} concurrent sessions.")
+    else:
+        typer.echo(f"Not saturated at {levels[-1]} concurrent sessions.")
+
+
+def main(
+    sessions: str = typer.Option("1,2,4,8,16,32", help="Comma separated numbers of concurrent sessions to ramp through."),
+    flows: int = typer.Option(2, help="Number of passes through the app each session makes per level."),
+    url: Optional[str] = typer.Option(None, help="Base URL of a running app. By default a server is started."),
+    server_pid: Optional[int] = typer.Option(None, help="Process id of the running app's server, for CPU and memory."),
+    p95_budget: float = typer.Option(1.0, help="p95 rerun latency in seconds above which the server counts as saturated."),
+    seed: int = typer.Option(0, help="Random seed for the widget values."),
+):
+    random.seed(seed)
+    levels = [int(level) for level in sessions.split(",")]
+
+    server = None
+    if not url:
+        port = _free_port()
+        # The app starts the warm-up itself, and the first load in each level isn't measured.
+        server = subprocess.Popen([
+            sys.executable, "-m", "streamlit", "run", str(APP_FILE),
+            "--server.headless", "true",
+            "--server.port", str(port),
+            "--browser.gatherUsageStats", "false",
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url, server_pid = f"ws://127.0.0.1:{port}", server.pid
+    else:
+        url = url.replace("http", "ws", 1).rstrip("/")
+
+    try:
+        asyncio.run(_wait_for_server(url, 60))
+        asyncio.run(load_test(url, server_pid, levels, flows, p95_budget))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    typer.run(main)
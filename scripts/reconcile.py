@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import csv
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+from ac_calc.reconcile import EXPECTED_FIELDS, STATEMENT_FIELDS, Discrepancy, reconcile
+
+
+def _rows(path, fields):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        if (header := next(reader, None)) != list(fields):
+            raise ValueError(f"{path} has columns {header}, expected {list(fields)}.")
+        yield from reader
+
+
+def main(
+    expected_file: Path = typer.Argument(..., help="Scored itineraries CSV with columns " + ",".join(EXPECTED_FIELDS) + "."),
+    statement_file: Path = typer.Argument(..., help="Posted statement export CSV with columns " + ",".join(STATEMENT_FIELDS) + "."),
+    output_file: Path = typer.Argument("discrepancies.csv", help="Discrepancies CSV to write."),
+    partitions: int = typer.Option(16, help="Number of hash partitions spilled to disk."),
+    distance_tolerance: float = typer.Option(1.0, help="Allowed distance difference in miles."),
+    temp_dir: Optional[Path] = typer.Option(None, help="Directory for the spilled partitions."),
+):
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(Discrepancy._fields)
+
+        stats = reconcile(
+            _rows(expected_file, EXPECTED_FIELDS),
+            _rows(statement_file, STATEMENT_FIELDS),
+            writer.writerow,
+            partitions=partitions,
+            distance_tolerance=distance_tolerance,
+            temp_dir=temp_dir,
+        )
+
+    typer.echo(
+        f"{stats.expected_rows} expected and {stats.statement_rows} posted rows, {stats.matched_rows} matched, "
+        f"{stats.discrepancies} discrepancies in {stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s)."
+    )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import json
+from pathlib import Path
+
+import typer
+
+from ac_calc.aeroplan import AEROPLAN_STATUSES_BY_NAME, FARE_BRANDS, FARE_BRANDS_BY_NAME, NoBrand
+from ac_calc.batch import CalculationBatch, calculate_from_origin
+from ac_calc.earning_partners import Place, earning_partners
+from ac_calc.profiling import PROFILE_MODES, profile_call, write_profile
+from ac_calc.rate_matrix import compare_rates
+from ac_calc.snapshot import current_snapshot
+from ac_calc.warmup import wait_until_ready
+
+
+# Replays the reference data work of a rerun profiled by the app, from the inputs file saved
+# with the profile, and profiles it again without Streamlit.
+
+
+def _calculate_points_miles(snapshot, inputs):
+    widgets = inputs["widgets"]
+    return CalculationBatch.from_calculations(
+        snapshot.airlines_by_id[segment["airline_id"]].calculate(
+            snapshot.airports_by_code[segment["origin_code"]],
+            snapshot.airports_by_code[segment["destination_code"]],
+            FARE_BRANDS[segment["fare_brand_index"]],
+            segment["fare_class"],
+            widgets.get("ticket_number", ""),
+            AEROPLAN_STATUSES_BY_NAME[widgets.get("aeroplan_status", "None")],
+        )
+        for segment in inputs["segments"]
+    ).totals()
+
+
+def _browse_airlines(snapshot, inputs):
+    widgets = inputs["widgets"]
+    return earning_partners(
+        Place(*widgets["partners_origin"]),
+        Place(*widgets["partners_destination"]),
+        widgets["partners_fare_class"],
+        snapshot,
+    )
+
+
+def _browse_airports(snapshot, inputs):
+    widgets = inputs["widgets"]
+    origin = snapshot.airports_by_code[widgets["browse_origin"]]
+    if widgets.get("browse_view") != "Earnings Heatmap":
+        return [snapshot.airports_by_code[distance.destination] for distance in origin.distances.values()]
+
+    airline = snapshot.airlines_by_id[widgets["heatmap_airline"]]
+    return calculate_from_origin(
+        airline,
+        origin,
+        snapshot.airports,
+        FARE_BRANDS_BY_NAME[widgets["heatmap_fare_brand"]] if airline.id == "air-canada" else NoBrand,
+        widgets["heatmap_fare_class"],
+        "",
+        AEROPLAN_STATUSES_BY_NAME[widgets.get("aeroplan_status", "None")],
+    ).to_pandas()
+
+
+def _compare_airlines(snapshot, inputs):
+    widgets = inputs["widgets"]
+    return compare_rates(
+        widgets.get("compare_keys", ["J"]),
+        widgets.get("compare_regions", []),
+        [snapshot.airlines_by_id[airline_id] for airline_id in widgets.get("compare_airlines", []) if airline_id in snapshot.airlines_by_id],
+        snapshot,
+    )
+
+
+REPLAYS = {
+    "Calculate Points and Miles": _calculate_points_miles,
+    "Browse Airlines": _browse_airlines,
+    "Browse Airports": _browse_airports,
+    "Compare Airlines": _compare_airlines,
+}
+
+
+def main(
+    inputs_file: Path = typer.Argument(..., help="Inputs JSON saved with a profile by the app."),
+    mode: str = typer.Option("sample", help="Profiler: " + " or ".join(PROFILE_MODES) + "."),
+    repeat: int = typer.Option(100, help="Number of times to replay the run, for enough samples."),
+    interval: float = typer.Option(0.001, help="Seconds between samples."),
+):
+    inputs = json.loads(inputs_file.read_text())
+    replay = REPLAYS[inputs["tool"]]
+
+    # The app profiles with the reference data loaded and compiled.
+    wait_until_ready()
+    snapshot = current_snapshot()
+    if snapshot.version != inputs["rules_version"]:
+        typer.echo(f"Replaying with rules {snapshot.version}, but the profile was taken with {inputs['rules_version']}.")
+
+    def replay_all():
+        for _ in range(repeat):
+            replay(snapshot, inputs)
+
+    _, profiler = profile_call(replay_all, mode=mode, interval=interval)
+    stem = inputs_file.with_name(inputs_file.name.replace(".inputs.json", "-replay"))
+    for path in write_profile(profiler, stem, f"{inputs['tool']} replay"):
+        typer.echo(f"Wrote {path}.")
+
+
+if __name__ == "__main__":
+    typer.run(main)
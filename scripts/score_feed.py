@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+import csv
+from pathlib import Path
+from typing import List
+
+import typer
+
+from ac_calc.columnar import score_feed
+from ac_calc.dedupe import ENGINES, FEED_FIELDS, score_deduplicated
+
+
+# Feeds in these formats are scored a batch at a time into a partitioned Parquet dataset.
+COLUMNAR_SUFFIXES = (".parquet", ".pq", ".arrow", ".arrows", ".feather", ".ipc")
+
+
+def _rows(path):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        if (header := next(reader, None)) != list(FEED_FIELDS):
+            raise ValueError(f"{path} has columns {header}, expected {list(FEED_FIELDS)}.")
+        yield from reader
+
+
+def main(
+    feed_file: Path = typer.Argument(..., help="Segment feed CSV, Parquet or Arrow IPC file with columns " + ",".join(FEED_FIELDS) + "."),
+    output_file: Path = typer.Argument("scores.csv", help="Calculations CSV to write, in feed order, or the dataset directory for a Parquet or Arrow feed."),
+    engine: str = typer.Option("calculate", help="Engine for the distinct segments of a CSV feed: " + " or ".join(ENGINES) + "."),
+    partition_by: List[str] = typer.Option(["airline"], help="Feed column to partition a Parquet or Arrow feed's dataset by. Can be repeated."),
+    batch_size: int = typer.Option(65536, help="Rows read and scored at a time from a Parquet or Arrow feed."),
+):
+    if feed_file.suffix.lower() in COLUMNAR_SUFFIXES:
+        stats = score_feed(feed_file, output_file, partition_by, batch_size)
+        typer.echo(
+            f"{stats.rows} rows, {stats.unique_rows} distinct, {stats.invalid_rows} invalid, "
+            f"in {stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s)."
+        )
+        return
+
+    scores = score_deduplicated(_rows(feed_file), engine)
+
+    df = scores.calculations.to_pandas()
+    df.insert(0, "invalid", scores.invalid)
+    df.to_csv(output_file, index_label="row")
+
+    stats = scores.stats
+    typer.echo(
+        f"{stats.rows} rows, {stats.unique_rows} distinct ({stats.dedup_ratio:.1f}x dedup), {stats.invalid_rows} invalid, "
+        f"in {stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s, against {stats.scored_rows_per_second:,.0f} scored/s)."
+    )
+
+
+if __name__ == "__main__":
+    typer.run(main)
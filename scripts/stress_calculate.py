@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ThreadPoolExecutor
+import random
+import sys
+
+import typer
+
+from ac_calc.aeroplan import AEROPLAN_STATUSES, FARE_BRANDS, NoBrand
+from ac_calc.airlines import AIRLINES, AirCanada
+from ac_calc.locations import airports
+
+
+# Hammers Airline.calculate from many threads with shared airline objects, and checks that
+# every thread gets the same results as a single-threaded reference run.
+
+
+def _workload(size, seed):
+    rng = random.Random(seed)
+    _airports = airports()
+
+    workload = []
+    for _ in range(size):
+        airline = rng.choice(AIRLINES)
+        fare_brand = rng.choice(FARE_BRANDS) if airline == AirCanada else NoBrand
+        fare_class = rng.choice(fare_brand.fare_classes)
+        workload.append((
+            airline,
+            rng.choice(_airports),
+            rng.choice(_airports),
+            fare_brand,
+            fare_class,
+            "014",
+            rng.choice(AEROPLAN_STATUSES),
+        ))
+
+    return workload
+
+
+def _calculate_all(workload):
+    # Key the results by the airline itself to exercise hashing from many threads.
+    results = {}
+    for index, (airline, *args) in enumerate(workload):
+        results.setdefault(airline, []).append((index, airline.calculate(*args)))
+    return results
+
+
+def main(
+    threads: int = typer.Option(32, help="Number of concurrent threads."),
+    rounds: int = typer.Option(8, help="Number of times each thread scores the workload."),
+    size: int = typer.Option(5000, help="Number of segments in the workload."),
+    seed: int = typer.Option(0, help="Random seed for the workload."),
+):
+    workload = _workload(size, seed)
+    reference = _calculate_all(workload)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(_calculate_all, workload) for _ in range(threads * rounds)]
+        mismatches = sum(future.result() != reference for future in futures)
+
+    typer.echo(f"{len(futures)} runs of {size} segments on {threads} threads, {mismatches} mismatched.")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+from pathlib import Path
+import time
+
+import numpy as np
+import pandas as pd
+import typer
+
+from ac_calc.dedupe import FEED_FIELDS
+from ac_calc.snapshot import current_snapshot
+from ac_calc.validity import VALIDATION_ERRORS, validate_segments
+
+
+def main(
+    feed_file: Path = typer.Argument(..., help="Segment feed CSV with columns " + ",".join(FEED_FIELDS) + "."),
+    output_file: Path = typer.Argument("validation-errors.csv", help="CSV of the invalid segments and their errors."),
+    chunk_size: int = typer.Option(1_000_000, help="Number of segments validated at a time."),
+):
+    start = time.perf_counter()
+    snapshot = current_snapshot()
+
+    header = pd.read_csv(feed_file, nrows=0).columns.tolist()
+    if header != list(FEED_FIELDS):
+        raise ValueError(f"{feed_file} has columns {header}, expected {list(FEED_FIELDS)}.")
+
+    rows = 0
+    counts = dict.fromkeys(VALIDATION_ERRORS, 0)
+    with open(output_file, "w", newline="") as f:
+        f.write(",".join(("row", "error", *FEED_FIELDS)) + "\n")
+
+        for chunk in pd.read_csv(feed_file, dtype=str, keep_default_na=False, chunksize=chunk_size):
+            result = validate_segments(chunk, snapshot)
+            for error, count in result.counts.items():
+                counts[error] += count
+
+            invalid = np.flatnonzero(result.errors)
+            report = chunk.iloc[invalid]
+            report.insert(0, "error", np.array(VALIDATION_ERRORS)[result.errors[invalid] - 1])
+            report.to_csv(f, header=False, index_label="row")
+            rows += len(chunk)
+
+    seconds = time.perf_counter() - start
+    typer.echo(f"{rows} segments, {sum(counts.values())} invalid, in {seconds:.1f}s ({rows / seconds:,.0f} segments/s).")
+    for error, count in counts.items():
+        typer.echo(f"  {error}: {count}")
+
+
+if __name__ == "__main__":
+    typer.run(main)